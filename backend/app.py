@@ -1,4 +1,6 @@
 from flask import Flask, request, send_from_directory
+from flask.cli import AppGroup
+import click
 from database.db import db
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
@@ -7,7 +9,17 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 from utils.logger import Logger
-from utils.location_service import init_location_service
+from utils.location_service import init_location_service, get_location_service
+from utils.api_key_cache import init_api_key_cache
+from utils.api_key_usage import init_api_key_usage_tracker
+from utils.rate_limiter import init_rate_limiter
+from utils.ttl_cache import configure_sweep_interval
+from utils.log.context import init_request_logging
+from utils.request_metrics import init_request_metrics
+from utils.query_inspector import init_query_inspector
+from utils.otp_store import init_otp_store
+from utils.email_queue import init_email_queue, get_email_queue
+from utils.otp_email_service import OTPEmailService
 
 # Cargar variables de entorno
 load_dotenv()
@@ -78,6 +90,62 @@ def create_app():
     app.config['LOCATION_CACHE_TTL_CITIES'] = int(os.environ.get('LOCATION_CACHE_TTL_CITIES', 60 * 60 * 4))
     app.config['LOCATION_DB_PATH'] = os.environ.get('LOCATION_DB_PATH', os.path.join(os.path.dirname(__file__), 'data', 'countries.db'))
     app.config['LOCATION_CITIES_ARCHIVE_PATH'] = os.environ.get('LOCATION_CITIES_ARCHIVE_PATH', os.path.join(os.path.dirname(__file__), 'data', 'cities.sqlite3.gz'))
+    app.config['LOCATION_SQLITE_MMAP_SIZE'] = int(os.environ.get('LOCATION_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['LOCATION_SEARCH_INDEX'] = os.environ.get('LOCATION_SEARCH_INDEX', 'true').lower() == 'true'
+    app.config['LOCATION_CACHE_MAX_SIZE'] = int(os.environ.get('LOCATION_CACHE_MAX_SIZE', 2048))
+    app.config['LOCATION_RESPONSE_CACHE_MAX_SIZE'] = int(os.environ.get('LOCATION_RESPONSE_CACHE_MAX_SIZE', 512))
+    app.config['LOCATION_HTTP_MAX_AGE'] = int(os.environ.get('LOCATION_HTTP_MAX_AGE', 60 * 60))  # Cache-Control del catálogo
+    app.config['API_KEY_CACHE_TTL'] = int(os.environ.get('API_KEY_CACHE_TTL', 300))
+    app.config['API_KEY_CACHE_MAX_SIZE'] = int(os.environ.get('API_KEY_CACHE_MAX_SIZE', 1024))
+    app.config['API_KEY_USAGE_FLUSH_INTERVAL'] = float(os.environ.get('API_KEY_USAGE_FLUSH_INTERVAL', 30))
+    
+    app.config['TICKET_STATS_CACHE_TTL'] = int(os.environ.get('TICKET_STATS_CACHE_TTL', 15))
+    # Barrido periódico de entradas vencidas de los cachés en memoria (utils/ttl_cache.py)
+    app.config['CACHE_SWEEP_INTERVAL'] = float(os.environ.get('CACHE_SWEEP_INTERVAL', 60))
+    
+    # Logs: formato (LOG_FORMAT=text|json) y niveles (LOG_LEVEL, LOG_LEVEL_<CATEGORIA>) se leen del entorno en utils/log
+    app.config['LOG_REQUESTS'] = os.environ.get('LOG_REQUESTS', 'false').lower() in ('true', '1', 'yes')  # una línea por request en api.log
+    
+    # Métricas por endpoint en /metrics (formato Prometheus, agregadas entre workers vía METRICS_DIR)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', os.path.join(os.path.dirname(__file__), 'instance', 'metrics'))
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 15))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Bearer opcional para el scraper de Prometheus
+    
+    # Inspector de consultas SQL (desarrollo/staging): N+1, consultas lentas con EXPLAIN y presupuestos por endpoint
+    app.config['QUERY_INSPECTOR_ENABLED'] = os.environ.get('QUERY_INSPECTOR_ENABLED', 'false').lower() in ('true', '1', 'yes')
+    app.config['QUERY_SLOW_MS'] = float(os.environ.get('QUERY_SLOW_MS', 200))
+    app.config['QUERY_N1_THRESHOLD'] = int(os.environ.get('QUERY_N1_THRESHOLD', 5))
+    app.config['QUERY_EXPLAIN'] = os.environ.get('QUERY_EXPLAIN', 'true').lower() in ('true', '1', 'yes')
+    app.config['QUERY_BUDGETS'] = os.environ.get('QUERY_BUDGETS', '')  # ej: admin_empresas.listar_empresas=5,admin_usuarios.listar_usuarios=4
+    app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() in ('true', '1', 'yes')  # error 500 al exceder (en TESTING siempre)
+    
+    # Rate limiting (token bucket) para endpoints con API Key
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    app.config['RATE_LIMIT_DEFAULT'] = os.environ.get('RATE_LIMIT_DEFAULT', '60:1')  # ráfaga:tokens_por_segundo
+    app.config['RATE_LIMIT_RULES'] = os.environ.get('RATE_LIMIT_RULES', '')  # ej: SOPORTE=30:0.5,LICENCIA=120:2
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory | sqlite
+    app.config['RATE_LIMIT_SQLITE_PATH'] = os.environ.get('RATE_LIMIT_SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'instance', 'rate_limit.sqlite3'))
+    
+    # Códigos OTP por email compartidos entre workers (utils/otp_store.py)
+    app.config['OTP_STORE'] = os.environ.get('OTP_STORE', 'sql')  # memory | sql | redis
+    app.config['OTP_REDIS_URL'] = os.environ.get('OTP_REDIS_URL', 'redis://localhost:6379/0')
+    app.config['OTP_MAX_CODES'] = int(os.environ.get('OTP_MAX_CODES', 10000))
+    app.config['OTP_SWEEP_INTERVAL'] = float(os.environ.get('OTP_SWEEP_INTERVAL', 60))
+    
+    # Envío de emails en segundo plano (utils/email_queue.py)
+    app.config['EMAIL_BACKEND'] = os.environ.get('EMAIL_BACKEND', 'smtp')  # smtp | fake (sumidero en memoria para tests)
+    app.config['SMTP_SERVER'] = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+    app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 587))
+    app.config['SMTP_USERNAME'] = os.environ.get('SMTP_USERNAME', '')
+    app.config['SMTP_PASSWORD'] = os.environ.get('SMTP_PASSWORD', '')
+    app.config['SENDER_EMAIL'] = os.environ.get('SENDER_EMAIL', '')
+    app.config['SENDER_NAME'] = os.environ.get('SENDER_NAME', 'Tratios Compraventa')
+    app.config['EMAIL_QUEUE_WORKERS'] = int(os.environ.get('EMAIL_QUEUE_WORKERS', 1))  # hilos por worker; 0 = solo `flask email worker`
+    app.config['EMAIL_QUEUE_POLL_INTERVAL'] = float(os.environ.get('EMAIL_QUEUE_POLL_INTERVAL', 5))
+    app.config['EMAIL_MAX_ATTEMPTS'] = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    app.config['EMAIL_RETRY_BASE_SECONDS'] = float(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 30))
+    app.config['EMAIL_RETRY_MAX_SECONDS'] = float(os.environ.get('EMAIL_RETRY_MAX_SECONDS', 3600))
     
     # Configuración de carga de archivos
     app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'uploads'))
@@ -156,13 +224,26 @@ def create_app():
     # Registrar health check endpoint
     from routes.health import health
     app.route('/health')(health)
+    from routes.metrics import metrics
+    app.route('/metrics')(metrics)
 
+    configure_sweep_interval(app.config['CACHE_SWEEP_INTERVAL'])
+    init_request_logging(app)
+    init_request_metrics(app)
+    init_query_inspector(app)
     init_location_service(app)
+    init_api_key_cache(app)
+    init_api_key_usage_tracker(app)
+    init_rate_limiter(app)
+    init_otp_store(app)
+    init_email_queue(app)
+    # Si el email de un OTP falla definitivamente se invalida el código
+    app.extensions["email_queue"].on_failure('otp', OTPEmailService.invalidate_after_failed_email)
     
     # Importar modelos para que SQLAlchemy los reconozca
     from models import usuario, empresa, servicio, suscripcion, log_acceso
     from models import soporte_tipo, soporte_suscripcion, soporte_pago, soporte_ticket
-    from models import api_key
+    from models import api_key, otp_code, email_job, renewal_run
 
     # Servir Angular SPA (solo en producción o si existe el build)
     angular_dist_path = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'dist', 'frontend', 'browser')
@@ -298,6 +379,57 @@ def create_app():
 
         db.session.commit()
         print(f"Seed completo -> Servicios: {created['servicios']}, Empresas: {created['empresas']}, Usuarios: {created['usuarios']}, Suscripciones: {created['suscripciones']}")
+
+    # Comandos CLI del catálogo de ubicaciones
+    location_cli = AppGroup("location", help="Catálogo de países y ciudades.")
+
+    @location_cli.command("build-shards")
+    def build_location_shards():
+        """Generar un shard SQLite por país (cities/<CC>.sqlite3) y su manifiesto."""
+        service = get_location_service()
+        # Espera la extracción/verificación de _cities_all.sqlite3 (hilo de arranque)
+        service.wait_until_ready()
+        try:
+            manifest = service.build_city_shards()
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        finally:
+            service.close()
+        total = sum(info["rows"] for info in manifest["countries"].values())
+        print(f"Shards generados -> Países: {len(manifest['countries'])}, Ciudades: {total}, Tiempo: {manifest['build_seconds']} s")
+
+    app.cli.add_command(location_cli)
+
+    email_cli = AppGroup("email", help="Cola de envío de emails.")
+
+    @email_cli.command("process")
+    def process_email_queue():
+        """Enviar una vez los emails pendientes y terminar."""
+        queue = get_email_queue()
+        try:
+            enviados = queue.process_pending()
+        finally:
+            queue.transport.close()
+        click.echo(f"Emails procesados: {enviados}")
+
+    @email_cli.command("worker")
+    def run_email_worker():
+        """Procesar la cola de emails en primer plano (usar con EMAIL_QUEUE_WORKERS=0 en los workers web)."""
+        click.echo("Procesando la cola de emails (Ctrl+C para detener)...")
+        try:
+            get_email_queue().run_forever()
+        except KeyboardInterrupt:
+            pass
+
+    @email_cli.command("status")
+    def email_queue_status():
+        """Mostrar la cantidad de emails por estado."""
+        stats = get_email_queue().stats()
+        for estado, cantidad in sorted(stats["jobs"].items()):
+            click.echo(f"{estado}: {cantidad}")
+        click.echo(f"vencidos por enviar: {stats['due']}")
+
+    app.cli.add_command(email_cli)
     
     return app
 
@@ -0,0 +1,25 @@
+"""add_email_jobs_referencia
+
+Revision ID: a7c3e9f1b5d4
+Revises: f4b9d2c6a8e3
+Create Date: 2026-10-17 16:05:12.481937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b5d4'
+down_revision = 'f4b9d2c6a8e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Origen del email ('<prefijo>:<dato>') para el hook de fallo de la cola (ej. invalidar el OTP)
+    op.add_column('email_jobs', sa.Column('referencia', sa.String(length=300), nullable=True))
+
+
+def downgrade():
+    op.drop_column('email_jobs', 'referencia')
@@ -0,0 +1,25 @@
+"""add_total_usos_to_api_keys
+
+Revision ID: b4e7d2a9c1f3
+Revises: e54c1ae4cedb
+Create Date: 2026-10-17 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e7d2a9c1f3'
+down_revision = 'e54c1ae4cedb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Contador de requests autorizados por API key (se actualiza en lote junto con ultimo_uso)
+    op.add_column('api_keys', sa.Column('total_usos', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('api_keys', 'total_usos')
@@ -0,0 +1,40 @@
+"""add_fulltext_soporte_tickets
+
+Revision ID: c9a3f1e7b2d4
+Revises: b4e7d2a9c1f3
+Create Date: 2026-10-17 11:03:27.518904
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9a3f1e7b2d4'
+down_revision = 'b4e7d2a9c1f3'
+branch_labels = None
+depends_on = None
+
+
+def _es_mysql():
+    return op.get_bind().dialect.name == 'mysql'
+
+
+def upgrade():
+    # Índices FULLTEXT para la búsqueda de tickets (solo MySQL; en otros motores se usa LIKE)
+    if not _es_mysql():
+        return
+    op.create_index(
+        'ft_soporte_tickets_titulo_descripcion', 'soporte_tickets',
+        ['titulo', 'descripcion'], mysql_prefix='FULLTEXT'
+    )
+    op.create_index(
+        'ft_soporte_comentarios_comentario', 'soporte_tickets_comentarios',
+        ['comentario'], mysql_prefix='FULLTEXT'
+    )
+
+
+def downgrade():
+    if not _es_mysql():
+        return
+    op.drop_index('ft_soporte_comentarios_comentario', table_name='soporte_tickets_comentarios')
+    op.drop_index('ft_soporte_tickets_titulo_descripcion', table_name='soporte_tickets')
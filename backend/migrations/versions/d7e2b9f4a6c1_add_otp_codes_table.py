@@ -0,0 +1,35 @@
+"""add_otp_codes_table
+
+Revision ID: d7e2b9f4a6c1
+Revises: c9a3f1e7b2d4
+Create Date: 2026-10-17 12:10:52.381407
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b9f4a6c1'
+down_revision = 'c9a3f1e7b2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Códigos OTP compartidos entre workers (OTP_STORE=sql)
+    op.create_table(
+        'otp_codes',
+        sa.Column('clave', sa.String(length=300), nullable=False),
+        sa.Column('code_hash', sa.String(length=255), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('creado_en', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('clave'),
+    )
+    op.create_index(op.f('ix_otp_codes_expires_at'), 'otp_codes', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_otp_codes_expires_at'), table_name='otp_codes')
+    op.drop_table('otp_codes')
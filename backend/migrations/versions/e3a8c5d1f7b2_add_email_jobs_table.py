@@ -0,0 +1,43 @@
+"""add_email_jobs_table
+
+Revision ID: e3a8c5d1f7b2
+Revises: d7e2b9f4a6c1
+Create Date: 2026-10-17 13:02:18.640915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a8c5d1f7b2'
+down_revision = 'd7e2b9f4a6c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cola persistente de envío de emails (utils/email_queue.py)
+    op.create_table(
+        'email_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('destinatario', sa.String(length=255), nullable=False),
+        sa.Column('asunto', sa.String(length=255), nullable=False),
+        sa.Column('cuerpo_texto', sa.Text(), nullable=True),
+        sa.Column('cuerpo_html', sa.Text(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_intentos', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('proximo_intento', sa.DateTime(), nullable=False),
+        sa.Column('bloqueado_hasta', sa.DateTime(), nullable=True),
+        sa.Column('ultimo_error', sa.String(length=500), nullable=True),
+        sa.Column('creado_en', sa.DateTime(), nullable=False),
+        sa.Column('enviado_en', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_email_jobs_estado_proximo', 'email_jobs', ['estado', 'proximo_intento'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_email_jobs_estado_proximo', table_name='email_jobs')
+    op.drop_table('email_jobs')
@@ -0,0 +1,63 @@
+"""add_renewal_ledger_tables
+
+Revision ID: f4b9d2c6a8e3
+Revises: e3a8c5d1f7b2
+Create Date: 2026-10-17 14:21:37.218604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b9d2c6a8e3'
+down_revision = 'e3a8c5d1f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ledger de corridas de renovación automática (scripts/renovacion_automatica.py)
+    op.create_table(
+        'renewal_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('fecha_limite', sa.Date(), nullable=False),
+        sa.Column('dias_anticipacion', sa.Integer(), nullable=False),
+        sa.Column('particiones', sa.Integer(), nullable=False),
+        sa.Column('total_items', sa.Integer(), nullable=False),
+        sa.Column('resumen', sa.JSON(), nullable=True),
+        sa.Column('iniciado_en', sa.DateTime(), nullable=False),
+        sa.Column('reanudado_en', sa.DateTime(), nullable=True),
+        sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_renewal_runs_estado'), 'renewal_runs', ['estado'], unique=False)
+
+    op.create_table(
+        'renewal_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_id', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(length=10), nullable=False),
+        sa.Column('registro_id', sa.Integer(), nullable=False),
+        sa.Column('empresa_id', sa.Integer(), nullable=False),
+        sa.Column('particion', sa.Integer(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('accion', sa.String(length=20), nullable=True),
+        sa.Column('nuevo_id', sa.Integer(), nullable=True),
+        sa.Column('error', sa.String(length=500), nullable=True),
+        sa.Column('procesado_en', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['run_id'], ['renewal_runs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('run_id', 'tipo', 'registro_id', name='uq_renewal_items_run_registro'),
+    )
+    op.create_index('idx_renewal_items_reclamo', 'renewal_items', ['run_id', 'tipo', 'particion', 'estado'], unique=False)
+    op.create_index('idx_renewal_items_registro', 'renewal_items', ['tipo', 'registro_id', 'estado'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_renewal_items_registro', table_name='renewal_items')
+    op.drop_index('idx_renewal_items_reclamo', table_name='renewal_items')
+    op.drop_table('renewal_items')
+    op.drop_index(op.f('ix_renewal_runs_estado'), table_name='renewal_runs')
+    op.drop_table('renewal_runs')
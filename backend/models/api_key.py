@@ -31,6 +31,7 @@ class ApiKey(db.Model):
     activo = db.Column(db.Boolean, default=True, nullable=False, index=True)
     fecha_creacion = db.Column(db.DateTime, default=get_colombia_now, nullable=False)
     ultimo_uso = db.Column(db.DateTime, nullable=True)
+    total_usos = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Requests autorizados (volcado en lote)
     fecha_expiracion = db.Column(db.DateTime, nullable=True)
     
     # Relación con Empresa
@@ -53,6 +54,7 @@ class ApiKey(db.Model):
             'activo': bool(self.activo),
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
             'ultimo_uso': self.ultimo_uso.isoformat() if self.ultimo_uso else None,
+            'total_usos': self.total_usos or 0,
             'fecha_expiracion': self.fecha_expiracion.isoformat() if self.fecha_expiracion else None,
         }
         
@@ -0,0 +1,48 @@
+from datetime import datetime
+from database.db import db
+
+
+class EmailJob(db.Model):
+    """
+    Email pendiente de envío (cola persistente de utils/email_queue.py).
+
+    Estados: pendiente -> enviando -> enviado | fallido. Un job en 'enviando'
+    cuyo bloqueado_hasta ya pasó (worker caído) vuelve a 'pendiente'.
+    Al terminar (enviado o fallido) se borra el cuerpo del mensaje, que puede
+    contener códigos OTP.
+    `referencia` identifica el origen del email: si termina 'fallido' la cola
+    llama al handler registrado para su prefijo (EmailQueue.on_failure).
+    """
+    __tablename__ = 'email_jobs'
+    __table_args__ = (
+        db.Index('idx_email_jobs_estado_proximo', 'estado', 'proximo_intento'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(255), nullable=False)
+    asunto = db.Column(db.String(255), nullable=False)
+    cuerpo_texto = db.Column(db.Text, nullable=True)
+    cuerpo_html = db.Column(db.Text, nullable=True)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente | enviando | enviado | fallido
+    intentos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_intentos = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+    proximo_intento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # UTC
+    bloqueado_hasta = db.Column(db.DateTime, nullable=True)  # Lease del worker que lo está enviando
+    ultimo_error = db.Column(db.String(500), nullable=True)
+    referencia = db.Column(db.String(300), nullable=True)  # '<prefijo>:<dato>' para el hook de fallo (ej. OTP)
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enviado_en = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'destinatario': self.destinatario,
+            'asunto': self.asunto,
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'max_intentos': self.max_intentos,
+            'proximo_intento': self.proximo_intento.isoformat() if self.proximo_intento else None,
+            'ultimo_error': self.ultimo_error,
+            'creado_en': self.creado_en.isoformat() if self.creado_en else None,
+            'enviado_en': self.enviado_en.isoformat() if self.enviado_en else None,
+        }
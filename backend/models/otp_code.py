@@ -0,0 +1,17 @@
+from datetime import datetime
+from database.db import db
+
+
+class OTPCode(db.Model):
+    """
+    Código OTP activo (hasheado) compartido entre los workers.
+    Lo usa utils/otp_store.py con OTP_STORE=sql; las filas vencidas se eliminan
+    al leerlas y en un barrido periódico (índice por expires_at).
+    """
+    __tablename__ = 'otp_codes'
+
+    clave = db.Column(db.String(300), primary_key=True)  # "<email>:<propósito>"
+    code_hash = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # UTC
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,86 @@
+from datetime import datetime
+from database.db import db
+
+
+class RenewalRun(db.Model):
+    """
+    Corrida del script de renovación automática (scripts/renovacion_automatica.py).
+
+    Al planificarla se guardan en renewal_items todos los registros vencidos;
+    el estado de cada item es el checkpoint: si la corrida se interrumpe queda
+    'en_curso' y la siguiente ejecución la reanuda procesando solo los items
+    pendientes.
+    """
+    __tablename__ = 'renewal_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    estado = db.Column(db.String(20), nullable=False, default='en_curso', index=True)  # en_curso | completada
+    fecha_limite = db.Column(db.Date, nullable=False)
+    dias_anticipacion = db.Column(db.Integer, nullable=False, default=0)
+    particiones = db.Column(db.Integer, nullable=False, default=1)
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    resumen = db.Column(db.JSON, nullable=True)  # Conteo por tipo/acción al completar
+    iniciado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reanudado_en = db.Column(db.DateTime, nullable=True)
+    finalizado_en = db.Column(db.DateTime, nullable=True)
+
+    items = db.relationship('RenewalItem', backref='run', lazy='dynamic', cascade='all, delete-orphan')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'fecha_limite': self.fecha_limite.isoformat() if self.fecha_limite else None,
+            'dias_anticipacion': self.dias_anticipacion,
+            'particiones': self.particiones,
+            'total_items': self.total_items,
+            'resumen': self.resumen,
+            'iniciado_en': self.iniciado_en.isoformat() if self.iniciado_en else None,
+            'reanudado_en': self.reanudado_en.isoformat() if self.reanudado_en else None,
+            'finalizado_en': self.finalizado_en.isoformat() if self.finalizado_en else None,
+        }
+
+
+class RenewalItem(db.Model):
+    """
+    Registro (suscripción de plan o de soporte) a procesar dentro de una corrida.
+
+    Estados: pendiente -> completado | error | omitido ('omitido' cuando el
+    registro ya no estaba vigente al procesarlo, p. ej. otra corrida lo renovó).
+    Se marca en la misma transacción que la renovación, así un item completado
+    nunca se vuelve a aplicar. `particion` = empresa_id % particiones: cada
+    worker procesa solo la suya y reclama sus items con FOR UPDATE SKIP LOCKED.
+    """
+    __tablename__ = 'renewal_items'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'tipo', 'registro_id', name='uq_renewal_items_run_registro'),
+        db.Index('idx_renewal_items_reclamo', 'run_id', 'tipo', 'particion', 'estado'),
+        db.Index('idx_renewal_items_registro', 'tipo', 'registro_id', 'estado'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('renewal_runs.id', ondelete='CASCADE'), nullable=False)
+    tipo = db.Column(db.String(10), nullable=False)  # plan | soporte
+    registro_id = db.Column(db.Integer, nullable=False)  # suscripciones.id o soporte_suscripcion.id
+    empresa_id = db.Column(db.Integer, nullable=False)
+    particion = db.Column(db.Integer, nullable=False, default=0)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente | completado | error | omitido
+    accion = db.Column(db.String(20), nullable=True)  # renovada | inactivada | vencida
+    nuevo_id = db.Column(db.Integer, nullable=True)  # Suscripción/soporte creado al renovar
+    error = db.Column(db.String(500), nullable=True)
+    procesado_en = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'tipo': self.tipo,
+            'registro_id': self.registro_id,
+            'empresa_id': self.empresa_id,
+            'particion': self.particion,
+            'estado': self.estado,
+            'accion': self.accion,
+            'nuevo_id': self.nuevo_id,
+            'error': self.error,
+            'procesado_en': self.procesado_en.isoformat() if self.procesado_en else None,
+        }
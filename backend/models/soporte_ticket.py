@@ -2,6 +2,7 @@
 Modelo SoporteTicket y SoporteTicketComentario - Gestión de tickets de soporte
 """
 from datetime import datetime, timezone, timedelta
+from sqlalchemy.orm import selectinload
 from database.db import db
 
 # Zona horaria de Colombia (UTC-5)
@@ -93,6 +94,8 @@ class SoporteTicket(db.Model):
         db.Index('idx_soporte_tickets_estado', 'estado'),
         db.Index('idx_soporte_tickets_prioridad', 'prioridad'),
         db.Index('idx_soporte_tickets_asignado', 'asignado_a'),
+        # Búsqueda de texto completo (FULLTEXT en MySQL, ver utils/ticket_search.py)
+        db.Index('ft_soporte_tickets_titulo_descripcion', 'titulo', 'descripcion', mysql_prefix='FULLTEXT'),
     )
 
     def cerrar(self):
@@ -100,7 +103,54 @@ class SoporteTicket(db.Model):
         self.estado = 'cerrado'
         self.fecha_cierre = get_colombia_now()
 
-    def to_dict(self, include_comentarios=False, include_relations=True):
+    @classmethod
+    def opciones_carga_relaciones(cls):
+        """
+        Opciones de carga para serializar listas de tickets sin N+1:
+        empresa, admin asignado y suscripción con su tipo de soporte.
+        """
+        from models.soporte_suscripcion import SoporteSuscripcion
+        
+        return (
+            selectinload(cls.empresa),
+            selectinload(cls.admin_asignado),
+            selectinload(cls.soporte_suscripcion).joinedload(SoporteSuscripcion.tipo_soporte),
+        )
+
+    @classmethod
+    def contar_comentarios(cls, ticket_ids):
+        """Cantidad de comentarios por ticket en una sola consulta agrupada."""
+        if not ticket_ids:
+            return {}
+        filas = db.session.query(
+            SoporteTicketComentario.ticket_id,
+            db.func.count(SoporteTicketComentario.id)
+        ).filter(
+            SoporteTicketComentario.ticket_id.in_(ticket_ids)
+        ).group_by(SoporteTicketComentario.ticket_id).all()
+        return {ticket_id: total for ticket_id, total in filas}
+
+    @classmethod
+    def to_dict_lista(cls, tickets, include_relations=True):
+        """
+        Serializa una lista de tickets con un número constante de consultas.
+        Para evitar lazy loads, la consulta de origen debería usar
+        .options(*SoporteTicket.opciones_carga_relaciones()).
+        """
+        totales = cls.contar_comentarios([t.id for t in tickets])
+        return [
+            t.to_dict(include_relations=include_relations, total_comentarios=totales.get(t.id, 0))
+            for t in tickets
+        ]
+
+    def to_dict(self, include_comentarios=False, include_relations=True, total_comentarios=None):
+        comentarios = None
+        if include_comentarios:
+            comentarios = self.comentarios.options(selectinload(SoporteTicketComentario.admin)).all()
+            total_comentarios = len(comentarios)
+        elif total_comentarios is None:
+            total_comentarios = self.comentarios.count()
+        
         data = {
             'id': self.id,
             'soporte_suscripcion_id': self.soporte_suscripcion_id,
@@ -115,7 +165,7 @@ class SoporteTicket(db.Model):
             'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None,
             'fecha_cierre': self.fecha_cierre.isoformat() if self.fecha_cierre else None,
             'extra_data': self.extra_data,
-            'total_comentarios': self.comentarios.count() if self.comentarios else 0
+            'total_comentarios': total_comentarios
         }
         
         if include_relations:
@@ -127,7 +177,7 @@ class SoporteTicket(db.Model):
             data['tipo_soporte'] = self.soporte_suscripcion.tipo_soporte.nombre if self.soporte_suscripcion and self.soporte_suscripcion.tipo_soporte else None
         
         if include_comentarios:
-            data['comentarios'] = [c.to_dict() for c in self.comentarios.all()]
+            data['comentarios'] = [c.to_dict() for c in comentarios]
         
         return data
 
@@ -153,6 +203,7 @@ class SoporteTicketComentario(db.Model):
 
     __table_args__ = (
         db.Index('idx_soporte_comentarios_ticket', 'ticket_id'),
+        db.Index('ft_soporte_comentarios_comentario', 'comentario', mysql_prefix='FULLTEXT'),
     )
 
     def to_dict(self):
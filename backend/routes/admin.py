@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
+import os
 import secrets
 import string
 from app import db
@@ -7,6 +8,7 @@ from models.empresa import Empresa
 from models.servicio import Servicio
 from models.suscripcion import Suscripcion
 from models.usuario import Usuario
+from utils.ttl_cache import all_cache_stats
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -54,6 +56,13 @@ def listar_servicios():
 #     suscripciones = Suscripcion.query.all()
 #     return jsonify([s.to_dict() for s in suscripciones])
 
+@admin_bp.get('/cache/stats')
+@jwt_required()
+@require_roles('admin')
+def estadisticas_cache():
+    """Aciertos, fallos, desalojos y tamaño de los cachés en memoria (del worker que responde)"""
+    return jsonify({'pid': os.getpid(), 'caches': all_cache_stats()})
+
 @admin_bp.put('/suscripcion/<int:id>')
 @jwt_required()
 @require_roles('admin')
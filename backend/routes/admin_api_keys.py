@@ -11,6 +11,7 @@ from database.db import db
 from models.api_key import ApiKey
 from models.empresa import Empresa
 from utils.api_key_crypto import generar_api_key_con_hash
+from utils.api_key_cache import invalidar_api_key_cache
 from utils.log import AppLogger, LogCategory
 
 admin_api_keys_bp = Blueprint('admin_api_keys', __name__, url_prefix='/admin/api-keys')
@@ -279,6 +280,10 @@ def actualizar_api_key(id):
         
         db.session.commit()
         
+        # Estado o expiración pudieron cambiar: descartar verificaciones cacheadas
+        if 'activo' in data or 'dias_expiracion' in data:
+            invalidar_api_key_cache(id)
+        
         claims = get_jwt()
         AppLogger.info(
             LogCategory.API,
@@ -321,6 +326,7 @@ def eliminar_api_key(id):
         
         db.session.delete(api_key)
         db.session.commit()
+        invalidar_api_key_cache(id)
         
         claims = get_jwt()
         AppLogger.info(
@@ -359,6 +365,7 @@ def toggle_api_key(id):
         
         api_key.activo = not api_key.activo
         db.session.commit()
+        invalidar_api_key_cache(id)
         
         claims = get_jwt()
         AppLogger.info(
@@ -427,6 +434,9 @@ def renovar_api_key(id):
         
         db.session.commit()
         
+        # La clave anterior no debe seguir aceptándose desde el caché
+        invalidar_api_key_cache(id)
+        
         claims = get_jwt()
         AppLogger.info(
             LogCategory.API,
@@ -2,29 +2,27 @@
 Rutas de administración para tickets de soporte
 """
 import os
-from datetime import datetime, timezone, timedelta
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from flask_jwt_extended.exceptions import NoAuthorizationError
 from werkzeug.utils import secure_filename
 from functools import wraps
 from database.db import db
 #Models
-from models.api_key import get_colombia_now
 from models.soporte_ticket import SoporteTicket, SoporteTicketComentario
 from models.soporte_suscripcion import SoporteSuscripcion
 from models.usuario import Usuario
-from models.api_key import ApiKey
-from models.empresa import Empresa
 #Utils
 from utils.security import admin_required
 from utils.log import AppLogger, LogCategory
-from utils.api_key_crypto import verificar_api_key
-from utils.file_handler import (
-    allowed_file, validate_file_size, get_upload_path,
-    generate_unique_filename, get_file_info, delete_ticket_files,
-    MAX_FILE_SIZE, get_file_size_mb
+from utils.security.api_key_auth import ApiKeyAuthError, autenticar_request, respuesta_error_api_key
+from utils.ticket_service import (
+    COLOMBIA_TZ, TicketServiceError, get_local_now, obtener_estadisticas_tickets,
+    calcular_disponibilidad_soporte, crear_ticket as crear_ticket_servicio,
+    listar_tickets as listar_tickets_servicio, detalle_ticket,
+    datos_comentario_request, crear_comentario, subir_archivos_ticket, buscar_archivo_ticket
 )
+from utils.file_handler import get_upload_path, delete_ticket_files, MAX_FILE_SIZE, get_file_size_mb
 
 admin_soporte_tickets_bp = Blueprint('admin_soporte_tickets', __name__, url_prefix='/admin/soporte-tickets')
 
@@ -46,121 +44,11 @@ def admin_or_api_key_required(f):
         api_key = request.headers.get('X-API-Key')
         
         if api_key:
-            # Validar API Key desde base de datos
-            empresa_id_header = request.headers.get('X-Empresa-Id')
-            codigo_requerido = request.headers.get('X-Code-API')
-            
-            if not empresa_id_header:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso sin X-Empresa-Id',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'X-Empresa-Id header requerido', 'error': 'missing_empresa_id'}), 401
-            
-            if not codigo_requerido:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso sin X-Code-API',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'X-Code-API header requerido', 'error': 'missing_codigo_key'}), 401
-            
-            # Validar formato de empresa_id
+            # Validar API Key desde base de datos (módulo compartido)
             try:
-                empresa_id = int(empresa_id_header)
-            except ValueError:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'X-Empresa-Id inválido (no numérico)',
-                    empresa_id_header=empresa_id_header,
-                    ip=request.remote_addr
-                )
-                return jsonify({'message': 'X-Empresa-Id debe ser numérico', 'error': 'invalid_empresa_id'}), 400
-            
-            # Validar que la empresa existe
-            empresa = Empresa.query.get(empresa_id)
-            if not empresa:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso con empresa_id inexistente',
-                    empresa_id=empresa_id,
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'Empresa no encontrada', 'error': 'empresa_not_found'}), 404
-            
-            # Buscar API keys activas de la empresa con el código específico
-            api_keys = ApiKey.query.filter_by(
-                empresa_id=empresa_id,
-                codigo=codigo_requerido,
-                activo=True
-            ).all()
-            
-            if not api_keys:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    f'Empresa sin API keys activas para código {codigo_requerido}',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr
-                )
-                return jsonify({'message': f'No hay API keys activas para el scope "{codigo_requerido}"', 'error': 'no_active_keys'}), 403
-            
-            # Verificar si alguna API key coincide
-            api_key_valida = None
-            for key_record in api_keys:
-                # Verificar expiración
-                if key_record.esta_expirada():
-                    continue
-                
-                # Verificar hash con bcrypt
-                if verificar_api_key(api_key, key_record.api_key_hash):
-                    api_key_valida = key_record
-                    break
-            
-            if not api_key_valida:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'API Key inválida o expirada',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint,
-                    api_key_prefix=api_key[:8] if len(api_key) >= 8 else 'corta'
-                )
-                return jsonify({'message': 'API Key inválida o expirada', 'error': 'invalid_api_key'}), 403
-            
-            # Actualizar último uso con hora de Colombia
-            try:
-                api_key_valida.ultimo_uso = get_colombia_now()
-                db.session.commit()
-            except Exception as e:
-                AppLogger.error(
-                    LogCategory.SOPORTE,
-                    'Error al actualizar ultimo_uso de API key',
-                    api_key_id=api_key_valida.id,
-                    exc=e
-                )
-                # No bloqueamos el request por esto
-            
-            # Guardar contexto para uso posterior
-            request.api_key_id = api_key_valida.id
-            request.empresa_id = empresa_id
-            request.api_key_codigo = api_key_valida.codigo
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                'Acceso autorizado con API Key desde BD',
-                empresa_id=empresa_id,
-                api_key_id=api_key_valida.id,
-                api_key_nombre=api_key_valida.nombre,
-                api_key_codigo=api_key_valida.codigo,
-                endpoint=request.endpoint,
-                ip=request.remote_addr
-            )
+                autenticar_request(LogCategory.SOPORTE)
+            except ApiKeyAuthError as e:
+                return respuesta_error_api_key(e)
             
             # API Key válida, permitir acceso
             return f(*args, **kwargs)
@@ -192,13 +80,6 @@ def admin_or_api_key_required(f):
     
     return decorated_function
 
-# Zona horaria de Colombia (UTC-5)
-COLOMBIA_TZ = timezone(timedelta(hours=-5))
-
-def get_local_now():
-    """Obtiene la fecha/hora actual en zona horaria de Colombia"""
-    return datetime.now(COLOMBIA_TZ)
-
 def normalize_datetime(dt):
     """
     Convierte un datetime naive a aware con timezone de Colombia.
@@ -212,128 +93,8 @@ def normalize_datetime(dt):
     return dt
 
 
-def calcular_disponibilidad_soporte(suscripcion):
-    """
-    Calcula la disponibilidad de tickets/horas según la modalidad del tipo de soporte.
-    
-    Args:
-        suscripcion: SoporteSuscripcion instance
-    
-    Returns:
-        dict con información de disponibilidad:
-        {
-            'tiene_disponible': bool,
-            'mensaje': str,
-            'consumido': int/float,
-            'maximo': int/float,
-            'disponible': int/float,
-            'modalidad': str,
-            'periodo_inicio': date,
-            'periodo_fin': date,
-            'requiere_horario_laboral': bool,
-            'respuesta_esperada': str
-        }
-    """
-    tipo_soporte = suscripcion.tipo_soporte
-    modalidad = tipo_soporte.modalidad
-    
-    resultado = {
-        'tiene_disponible': True,
-        'mensaje': '',
-        'consumido': 0,
-        'maximo': 0,
-        'disponible': 0,
-        'modalidad': modalidad,
-        'periodo_inicio': suscripcion.fecha_inicio,
-        'periodo_fin': suscripcion.fecha_fin,
-        'requiere_horario_laboral': False,
-        'respuesta_esperada': ''
-    }
-    
-    # Determinar periodo de evaluación basado en modalidad
-    fecha_inicio = suscripcion.fecha_inicio
-    fecha_fin = suscripcion.fecha_fin
-    
-    # Si es mensual o anual, usar el rango de fechas de la suscripción
-    # Ya está definido en fecha_inicio y fecha_fin
-    
-    # Validar si está dentro del periodo
-    ahora = get_local_now().date()
-    if ahora < fecha_inicio or (fecha_fin and ahora > fecha_fin):
-        resultado['tiene_disponible'] = False
-        resultado['mensaje'] = 'La suscripción de soporte no está vigente en este momento'
-        return resultado
-    
-    # Modalidad: por_horas
-    if modalidad == 'por_horas':
-        max_horas = tipo_soporte.max_horas or 0
-        horas_consumidas = float(suscripcion.horas_consumidas or 0)
-        horas_disponibles = max_horas - horas_consumidas
-        
-        resultado['consumido'] = horas_consumidas
-        resultado['maximo'] = max_horas
-        resultado['disponible'] = horas_disponibles
-        
-        if horas_disponibles <= 0:
-            resultado['tiene_disponible'] = False
-            resultado['mensaje'] = f'Ha consumido todas las horas disponibles ({max_horas} horas) para este periodo'
-        else:
-            resultado['mensaje'] = f'Tiene {horas_disponibles:.2f} horas disponibles de {max_horas}'
-    
-    # Modalidad: por_tickets
-    elif modalidad == 'por_tickets':
-        max_tickets = tipo_soporte.max_tickets or 0
-        
-        # Contar tickets NO cancelados en el periodo (incluye abiertos, en_proceso, pendiente_respuesta, cerrados)
-        # Solo excluimos 'cancelado' porque esos no consumen el cupo
-        fecha_inicio_dt = datetime.combine(fecha_inicio, datetime.min.time(), tzinfo=COLOMBIA_TZ)
-        fecha_fin_dt = datetime.combine(fecha_fin or ahora, datetime.max.time(), tzinfo=COLOMBIA_TZ)
-        
-        tickets_activos = SoporteTicket.query.filter(
-            SoporteTicket.soporte_suscripcion_id == suscripcion.id,
-            SoporteTicket.fecha_creacion >= fecha_inicio_dt,
-            SoporteTicket.fecha_creacion <= fecha_fin_dt,
-            SoporteTicket.estado != 'cancelado'  # Solo excluir cancelados
-        ).count()
-        
-        tickets_disponibles = max_tickets - tickets_activos
-        
-        resultado['consumido'] = tickets_activos
-        resultado['maximo'] = max_tickets
-        resultado['disponible'] = tickets_disponibles
-        
-        if tickets_disponibles <= 0:
-            resultado['tiene_disponible'] = False
-            resultado['mensaje'] = f'Ha consumido todos los tickets disponibles ({max_tickets} tickets) para este periodo'
-        else:
-            resultado['mensaje'] = f'Tiene {tickets_disponibles} tickets disponibles de {max_tickets}'
-    
-    # Modalidad: mensual o anual (soporte básico)
-    elif modalidad in ['mensual', 'anual']:
-        # Verificar si es tipo "básico" - requiere horario laboral
-        if 'basico' in tipo_soporte.nombre.lower() or 'básico' in tipo_soporte.nombre.lower():
-            resultado['requiere_horario_laboral'] = True
-            resultado['respuesta_esperada'] = 'Atención por correo y chat, en horario laboral. Respuesta en máximo 24 horas.'
-            
-            # Verificar si estamos en horario laboral (lunes a viernes, 8am-6pm Colombia)
-            ahora = get_local_now()
-            es_dia_laboral = ahora.weekday() < 5  # 0-4 es lunes a viernes
-            hora_actual = ahora.hour
-            es_horario_laboral = 8 <= hora_actual < 18
-            
-            if not es_dia_laboral or not es_horario_laboral:
-                resultado['mensaje'] = '⚠️ Horario laboral: Lunes a Viernes, 8:00 AM - 6:00 PM. Su ticket será atendido en el siguiente horario hábil.'
-            else:
-                resultado['mensaje'] = 'Soporte básico activo. Respuesta en máximo 24 horas hábiles.'
-        
-        # Verificar si es tipo "24/7" o "premium"
-        elif '24' in tipo_soporte.nombre or 'premium' in tipo_soporte.nombre.lower():
-            resultado['respuesta_esperada'] = 'Atención inmediata todos los días del año. Línea prioritaria.'
-            resultado['mensaje'] = '🚀 Soporte prioritario 24/7 activo. Atención inmediata.'
-        else:
-            resultado['mensaje'] = f'Soporte {tipo_soporte.nombre} activo - Sin límite de tickets'
-    
-    return resultado
+def _usar_cache_estadisticas():
+    return (request.args.get('cache') or '').lower() in ('true', '1')
 
 
 def actualizar_consumo_ticket_cerrado(ticket):
@@ -453,100 +214,8 @@ def crear_ticket():
                     empresa_id=request.empresa_id
                 )
         
-        AppLogger.info(
-            LogCategory.SOPORTE,
-            "Crear ticket - Inicio",
-            usuario_id=usuario_id,
-            es_api_externa=es_peticion_api_externa,
-            empresa_id=data.get('empresa_id'),
-            suscripcion_id=data.get('soporte_suscripcion_id')
-        )
-        
-        # Validaciones
-        if not data.get('soporte_suscripcion_id'):
-            return jsonify({'message': 'soporte_suscripcion_id es obligatorio'}), 400
-        if not data.get('empresa_id'):
-            return jsonify({'message': 'empresa_id es obligatorio'}), 400
-        if not data.get('titulo'):
-            return jsonify({'message': 'titulo es obligatorio'}), 400
-        
-        # Validar prioridad
-        prioridad = data.get('prioridad', 'media')
-        if prioridad not in ['baja', 'media', 'alta', 'critica']:
-            return jsonify({'message': 'Prioridad inválida'}), 400
-        
-        # Verificar que existe la suscripción de soporte
-        suscripcion = SoporteSuscripcion.query.get(data['soporte_suscripcion_id'])
-        if not suscripcion:
-            AppLogger.warning(
-                LogCategory.SOPORTE, 
-                "Suscripción de soporte no encontrada", 
-                suscripcion_id=data['soporte_suscripcion_id']
-            )
-            return jsonify({'message': 'Suscripción de soporte no encontrada'}), 404
-        
-        # Verificar que la suscripción esté activa
-        if suscripcion.estado != 'activo':
-            AppLogger.warning(
-                LogCategory.SOPORTE,
-                "Suscripción de soporte no activa",
-                suscripcion_id=suscripcion.id,
-                estado=suscripcion.estado
-            )
-            return jsonify({'message': 'La suscripción de soporte no está activa'}), 400
-        
-        # Verificar que la empresa coincida
-        if suscripcion.empresa_id != int(data['empresa_id']):
-            AppLogger.warning(
-                LogCategory.SOPORTE,
-                "Suscripción no pertenece a la empresa",
-                suscripcion_empresa_id=suscripcion.empresa_id,
-                empresa_id=data['empresa_id']
-            )
-            return jsonify({'message': 'La suscripción no pertenece a la empresa seleccionada'}), 400
-        
-        # VALIDAR DISPONIBILIDAD DE SOPORTE
-        disponibilidad = calcular_disponibilidad_soporte(suscripcion)
-        
-        if not disponibilidad['tiene_disponible']:
-            AppLogger.warning(
-                LogCategory.SOPORTE,
-                "Sin disponibilidad de soporte",
-                suscripcion_id=suscripcion.id,
-                modalidad=disponibilidad['modalidad'],
-                consumido=disponibilidad['consumido'],
-                maximo=disponibilidad['maximo']
-            )
-            return jsonify({
-                'message': disponibilidad['mensaje'],
-                'disponibilidad': disponibilidad
-            }), 400
-        
-        # Crear el ticket
-        nuevo_ticket = SoporteTicket(
-            soporte_suscripcion_id=data['soporte_suscripcion_id'],
-            empresa_id=int(data['empresa_id']),
-            titulo=data['titulo'],
-            descripcion=data.get('descripcion'),
-            prioridad=prioridad,
-            estado='abierto',
-            usuario_creador_id=usuario_id,  # ID del usuario (BD web si es admin, BD SaaS si es API externa)
-            extra_data=None  # Los archivos se asocian a comentarios, no al ticket directamente
-        )
-        
-        db.session.add(nuevo_ticket)
-        db.session.commit()
-        
-        AppLogger.info(
-            LogCategory.SOPORTE,
-            "Ticket creado exitosamente",
-            ticket_id=nuevo_ticket.id,
-            empresa_id=nuevo_ticket.empresa_id,
-            suscripcion_id=nuevo_ticket.soporte_suscripcion_id,
-            titulo=nuevo_ticket.titulo,
-            prioridad=nuevo_ticket.prioridad,
-            creado_por=usuario_id,
-            es_api_externa=es_peticion_api_externa
+        nuevo_ticket = crear_ticket_servicio(
+            data, usuario_id=usuario_id, es_api_externa=es_peticion_api_externa
         )
         
         return jsonify({
@@ -554,6 +223,8 @@ def crear_ticket():
             'ticket': nuevo_ticket.to_dict()
         }), 201
         
+    except TicketServiceError as e:
+        return jsonify({'message': e.message, **e.datos}), e.status_code
     except Exception as e:
         db.session.rollback()
         AppLogger.error(
@@ -576,89 +247,20 @@ def listar_tickets():
     
     Query params: 
         - empresa_id, estado, prioridad, asignado_a, sin_asignar
-        - busqueda (busca en título y descripción)
+        - busqueda (texto completo en título, descripción y comentarios, por prefijo;
+          agrega 'resaltado' con las coincidencias marcadas en cada ticket)
+        - orden (opcional): 'relevancia' para ordenar por relevancia de la búsqueda
         - page (default: 1), per_page (default: 20)
+        - cursor (opcional): valor next_cursor de la respuesta anterior; reemplaza a page
+          (no disponible con orden=relevancia)
+        - cache (opcional): 'true' para reutilizar estadísticas recientes (dashboard)
     """
     try:
-        query = SoporteTicket.query
-        
-        empresa_id = request.args.get('empresa_id', type=int)
-        if empresa_id:
-            query = query.filter(SoporteTicket.empresa_id == empresa_id)
-        
-        estado = request.args.get('estado')
-        if estado:
-            query = query.filter(SoporteTicket.estado == estado)
-        
-        prioridad = request.args.get('prioridad')
-        if prioridad:
-            query = query.filter(SoporteTicket.prioridad == prioridad)
-        
-        asignado_a = request.args.get('asignado_a', type=int)
-        if asignado_a:
-            query = query.filter(SoporteTicket.asignado_a == asignado_a)
-        
-        sin_asignar = request.args.get('sin_asignar')
-        if sin_asignar and sin_asignar.lower() == 'true':
-            query = query.filter(SoporteTicket.asignado_a.is_(None))
-        
-        # Búsqueda general en título y descripción
-        busqueda = request.args.get('busqueda')
-        if busqueda:
-            query = query.filter(
-                db.or_(
-                    SoporteTicket.titulo.ilike(f'%{busqueda}%'),
-                    SoporteTicket.descripcion.ilike(f'%{busqueda}%')
-                )
-            )
-        
-        # Paginación
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        # Limitar per_page a un máximo razonable
-        per_page = min(per_page, 100)
-        
-        # Obtener total antes de paginar
-        total = query.count()
-        
-        # Ordenar por prioridad y fecha
-        prioridad_orden = {
-            'critica': 1, 'alta': 2, 'media': 3, 'baja': 4
-        }
-        
-        # Obtener todos para ordenar por prioridad (la paginación se hará después)
-        all_tickets = query.order_by(SoporteTicket.fecha_creacion.desc()).all()
-        
-        # Ordenar por prioridad en Python (más flexible)
-        all_tickets.sort(key=lambda t: (
-            0 if t.estado in ['abierto', 'en_proceso', 'pendiente_respuesta'] else 1,
-            prioridad_orden.get(t.prioridad, 5)
-        ))
-        
-        # Paginar manualmente
-        start = (page - 1) * per_page
-        end = start + per_page
-        tickets_paginados = all_tickets[start:end]
-        total_pages = (total + per_page - 1) // per_page
-        
-        return jsonify({
-            'tickets': [t.to_dict() for t in tickets_paginados],
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': total_pages,
-            'estadisticas': {
-                'total': total,
-                'abiertos': sum(1 for t in all_tickets if t.estado == 'abierto'),
-                'en_proceso': sum(1 for t in all_tickets if t.estado == 'en_proceso'),
-                'pendiente_respuesta': sum(1 for t in all_tickets if t.estado == 'pendiente_respuesta'),
-                'cerrados': sum(1 for t in all_tickets if t.estado == 'cerrado'),
-                'criticos': sum(1 for t in all_tickets if t.prioridad == 'critica' and t.estado not in ['cerrado', 'cancelado']),
-                'sin_asignar': sum(1 for t in all_tickets if t.asignado_a is None),
-                'activos': sum(1 for t in all_tickets if t.estado in ['abierto', 'en_proceso', 'pendiente_respuesta'])
-            }
-        }), 200
+        return jsonify(listar_tickets_servicio(
+            request.args, usar_cache_estadisticas=_usar_cache_estadisticas()
+        )), 200
+    except TicketServiceError as e:
+        return jsonify({'message': e.message}), e.status_code
     except Exception as e:
         return jsonify({'message': f'Error al listar tickets: {str(e)}'}), 500
 
@@ -677,7 +279,7 @@ def obtener_ticket(ticket_id):
         if not ticket:
             return jsonify({'message': 'Ticket no encontrado'}), 404
         
-        return jsonify(ticket.to_dict(include_comentarios=True)), 200
+        return jsonify(detalle_ticket(ticket)), 200
     except Exception as e:
         return jsonify({'message': f'Error al obtener ticket: {str(e)}'}), 500
 
@@ -840,13 +442,8 @@ def agregar_comentario_admin(ticket_id):
         es_peticion_api_externa = hasattr(request, 'empresa_id')
         
         # Determinar usuario: puede venir en data/form (API) o de JWT (admin panel)
-        usuario_id = None
-        
-        if request.content_type and 'multipart/form-data' in request.content_type:
-            usuario_id = request.form.get('usuario_id')
-        elif request.is_json:
-            json_data = request.get_json()
-            usuario_id = json_data.get('usuario_id') if json_data else None
+        datos = datos_comentario_request(request)
+        usuario_id = datos['usuario_id']
         
         AppLogger.info(
             LogCategory.SOPORTE,
@@ -895,103 +492,24 @@ def agregar_comentario_admin(ticket_id):
                     empresa_id=request.empresa_id
                 )
         
-        # Detectar si es JSON o FormData
-        if request.content_type and 'multipart/form-data' in request.content_type:
-            # FormData con archivos
-            comentario_texto = request.form.get('comentario')
-            if not comentario_texto:
-                return jsonify({'message': 'El comentario es obligatorio'}), 400
-            
-            archivos_metadata = []
-            
-            # Procesar archivos si existen
-            if 'files' in request.files:
-                files = request.files.getlist('files')
-                
-                for file in files:
-                    if file.filename == '':
-                        continue
-                    
-                    # Validar extensión
-                    if not allowed_file(file.filename):
-                        return jsonify({'message': f'Tipo de archivo no permitido: {file.filename}'}), 400
-                    
-                    # Leer contenido para validar tamaño
-                    file.seek(0, os.SEEK_END)
-                    file_size = file.tell()
-                    file.seek(0)
-                    
-                    # Validar tamaño
-                    is_valid, error_msg = validate_file_size(file_size)
-                    if not is_valid:
-                        return jsonify({'message': f'{file.filename}: {error_msg}'}), 400
-                    
-                    try:
-                        # Generar nombre único y guardar
-                        upload_path = get_upload_path(ticket_id)
-                        unique_filename = generate_unique_filename(file.filename)
-                        filepath = os.path.join(upload_path, unique_filename)
-                        
-                        file.save(filepath)
-                        
-                        # Obtener información del archivo
-                        file_info = get_file_info(unique_filename, filepath)
-                        file_info['nombre_original'] = file.filename
-                        
-                        archivos_metadata.append(file_info)
-                        
-                        AppLogger.info(
-                            LogCategory.SOPORTE,
-                            f"Archivo subido para comentario en ticket {ticket_id}",
-                            filename=file.filename,
-                            size_mb=file_info['tamano_mb']
-                        )
-                    except Exception as e:
-                        AppLogger.error(LogCategory.SOPORTE, f"Error al guardar archivo {file.filename}", exc=e)
-                        return jsonify({'message': f'Error al guardar archivo: {str(e)}'}), 500
-            
-            # Para API externa: no es admin, es usuario de la instancia SaaS
-            # Para Admin interno: es admin
-            nuevo_comentario = SoporteTicketComentario(
-                ticket_id=ticket_id,
-                es_admin=not es_peticion_api_externa,
-                admin_id=usuario_id if not es_peticion_api_externa else None,
-                usuario_id=usuario_id,
-                comentario=comentario_texto,
-                archivos=archivos_metadata if archivos_metadata else None,
-                fecha_creacion=get_local_now()  # Usar zona horaria local
-            )
-        else:
-            # JSON tradicional
-            data = request.get_json()
-            
-            if not data.get('comentario'):
-                return jsonify({'message': 'El comentario es obligatorio'}), 400
-            
-            # Para API externa: no es admin, es usuario de la instancia SaaS
-            # Para Admin interno: es admin
-            nuevo_comentario = SoporteTicketComentario(
-                ticket_id=ticket_id,
-                es_admin=not es_peticion_api_externa,
-                admin_id=usuario_id if not es_peticion_api_externa else None,
-                usuario_id=usuario_id,
-                comentario=data['comentario'],
-                archivos=data.get('archivos'),
-                fecha_creacion=get_local_now()  # Usar zona horaria local
-            )
-        
-        db.session.add(nuevo_comentario)
-        
-        # Cambiar estado a pendiente_respuesta si estaba abierto o en_proceso
-        if ticket.estado in ['abierto', 'en_proceso']:
-            ticket.estado = 'pendiente_respuesta'
-        
-        db.session.commit()
+        # Para API externa: no es admin, es usuario de la instancia SaaS
+        # Para Admin interno: es admin
+        nuevo_comentario = crear_comentario(
+            ticket,
+            comentario=datos['comentario'],
+            usuario_id=usuario_id,
+            es_admin=not es_peticion_api_externa,
+            archivos=datos['archivos'],
+            files=datos['files']
+        )
         
         return jsonify({
             'message': 'Comentario agregado exitosamente',
             'comentario': nuevo_comentario.to_dict()
         }), 201
+    except TicketServiceError as e:
+        db.session.rollback()
+        return jsonify({'message': e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         AppLogger.error(LogCategory.SOPORTE, f"Error al agregar comentario ticket {ticket_id}", exc=e)
@@ -1247,35 +765,24 @@ def estadisticas_tickets():
     """
     GET /admin/soporte-tickets/estadisticas
     Obtiene estadísticas generales de tickets
+    
+    Query params opcionales (mismos filtros del listado):
+        - empresa_id, estado, prioridad, asignado_a, sin_asignar, busqueda
+        - cache: 'true' para reutilizar el resultado reciente (dashboard)
     """
     try:
-        total = SoporteTicket.query.count()
-        abiertos = SoporteTicket.query.filter_by(estado='abierto').count()
-        en_proceso = SoporteTicket.query.filter_by(estado='en_proceso').count()
-        pendiente_respuesta = SoporteTicket.query.filter_by(estado='pendiente_respuesta').count()
-        cerrados = SoporteTicket.query.filter_by(estado='cerrado').count()
-        cancelados = SoporteTicket.query.filter_by(estado='cancelado').count()
-        
-        criticos = SoporteTicket.query.filter(
-            SoporteTicket.prioridad == 'critica',
-            SoporteTicket.estado.notin_(['cerrado', 'cancelado'])
-        ).count()
-        
-        sin_asignar = SoporteTicket.query.filter(
-            SoporteTicket.asignado_a.is_(None),
-            SoporteTicket.estado.notin_(['cerrado', 'cancelado'])
-        ).count()
+        estadisticas = obtener_estadisticas_tickets(request.args, usar_cache=_usar_cache_estadisticas())
         
         return jsonify({
-            'total': total,
-            'abiertos': abiertos,
-            'en_proceso': en_proceso,
-            'pendiente_respuesta': pendiente_respuesta,
-            'cerrados': cerrados,
-            'cancelados': cancelados,
-            'criticos': criticos,
-            'sin_asignar': sin_asignar,
-            'activos': abiertos + en_proceso + pendiente_respuesta
+            'total': estadisticas['total'],
+            'abiertos': estadisticas['abiertos'],
+            'en_proceso': estadisticas['en_proceso'],
+            'pendiente_respuesta': estadisticas['pendiente_respuesta'],
+            'cerrados': estadisticas['cerrados'],
+            'cancelados': estadisticas['cancelados'],
+            'criticos': estadisticas['criticos'],
+            'sin_asignar': estadisticas['sin_asignar_activos'],
+            'activos': estadisticas['activos']
         }), 200
     except Exception as e:
         return jsonify({'message': f'Error al obtener estadísticas: {str(e)}'}), 500
@@ -1299,108 +806,11 @@ def subir_archivo(ticket_id):
         if not ticket:
             return jsonify({'message': 'Ticket no encontrado'}), 404
         
-        # Verificar si se debe asociar a un comentario específico
-        comentario_id = request.form.get('comentario_id')
-        comentario = None
-        
-        if comentario_id:
-            comentario = SoporteTicketComentario.query.filter_by(
-                id=int(comentario_id),
-                ticket_id=ticket_id
-            ).first()
-            if not comentario:
-                return jsonify({'message': 'Comentario no encontrado'}), 404
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                'Subiendo archivos para comentario específico',
-                ticket_id=ticket_id,
-                comentario_id=comentario_id
-            )
-        
-        # Verificar que se envíen archivos
-        if 'files' not in request.files:
-            return jsonify({'message': 'No se enviaron archivos'}), 400
-        
-        files = request.files.getlist('files')
-        if not files or all(f.filename == '' for f in files):
-            return jsonify({'message': 'No se seleccionaron archivos'}), 400
-        
-        # Validar número de archivos (máximo 10 por carga)
-        if len(files) > 10:
-            return jsonify({'message': 'Máximo 10 archivos por carga'}), 400
-        
-        # Determinar dónde guardar los archivos
-        if comentario:
-            # Guardar en el comentario
-            if not comentario.archivos:
-                comentario.archivos = []
-        else:
-            # Guardar en el ticket
-            if not ticket.extra_data:
-                ticket.extra_data = {'archivos': []}
-            elif 'archivos' not in ticket.extra_data:
-                ticket.extra_data['archivos'] = []
-        
-        archivos_subidos = []
-        errores = []
-        
-        for file in files:
-            if file.filename == '':
-                continue
-            
-            # Validar extensión
-            if not allowed_file(file.filename):
-                errores.append(f'{file.filename}: Tipo de archivo no permitido')
-                continue
-            
-            # Leer contenido para validar tamaño
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-            
-            # Validar tamaño
-            is_valid, error_msg = validate_file_size(file_size)
-            if not is_valid:
-                errores.append(f'{file.filename}: {error_msg}')
-                continue
-            
-            try:
-                # Generar nombre único y guardar
-                upload_path = get_upload_path(ticket_id)
-                unique_filename = generate_unique_filename(file.filename)
-                filepath = os.path.join(upload_path, unique_filename)
-                
-                file.save(filepath)
-                
-                # Obtener información del archivo
-                file_info = get_file_info(unique_filename, filepath)
-                file_info['nombre_original'] = file.filename
-                
-                # Guardar en comentario o ticket según corresponda
-                if comentario:
-                    comentario.archivos.append(file_info)
-                    AppLogger.info(
-                        LogCategory.SOPORTE,
-                        f"Archivo subido para comentario {comentario_id} en ticket {ticket_id}",
-                        filename=file.filename,
-                        size_mb=file_info['tamano_mb']
-                    )
-                else:
-                    ticket.extra_data['archivos'].append(file_info)
-                    AppLogger.info(
-                        LogCategory.SOPORTE,
-                        f"Archivo subido para ticket {ticket_id}",
-                        filename=file.filename,
-                        size_mb=file_info['tamano_mb']
-                    )
-                
-                archivos_subidos.append(file_info)
-            except Exception as e:
-                errores.append(f'{file.filename}: Error al guardar - {str(e)}')
-        
-        if archivos_subidos:
-            db.session.commit()
+        archivos_subidos, errores = subir_archivos_ticket(
+            ticket,
+            request.files.getlist('files'),
+            comentario_id=request.form.get('comentario_id')
+        )
         
         response = {
             'message': f'{len(archivos_subidos)} archivo(s) subido(s) exitosamente',
@@ -1412,6 +822,8 @@ def subir_archivo(ticket_id):
             response['message'] += f', {len(errores)} error(es)'
         
         return jsonify(response), 200 if archivos_subidos else 400
+    except TicketServiceError as e:
+        return jsonify({'message': e.message}), e.status_code
     except Exception as e:
         db.session.rollback()
         AppLogger.error(LogCategory.SOPORTE, f"Error al subir archivos ticket {ticket_id}", exc=e)
@@ -1432,43 +844,14 @@ def descargar_archivo(ticket_id, filename):
         if not ticket:
             return jsonify({'message': 'Ticket no encontrado'}), 404
         
-        archivo_encontrado = None
-        
-        # Buscar primero en archivos del ticket (extra_data)
-        if ticket.extra_data and 'archivos' in ticket.extra_data:
-            for archivo in ticket.extra_data['archivos']:
-                if archivo.get('nombre') == filename:
-                    archivo_encontrado = archivo
-                    break
-        
-        # Si no se encontró, buscar en archivos de comentarios
-        if not archivo_encontrado:
-            for comentario in ticket.comentarios:
-                if comentario.archivos:
-                    for archivo in comentario.archivos:
-                        if archivo.get('nombre') == filename:
-                            archivo_encontrado = archivo
-                            break
-                if archivo_encontrado:
-                    break
-        
-        if not archivo_encontrado:
-            return jsonify({'message': 'Archivo no encontrado'}), 404
-        
-        # Construir ruta completa
-        upload_path = get_upload_path(ticket_id)
-        filepath = os.path.join(upload_path, filename)
-        
-        if not os.path.exists(filepath):
-            return jsonify({'message': 'El archivo físico no existe en el servidor'}), 404
-        
-        # Enviar archivo
-        nombre_original = archivo_encontrado.get('nombre_original', filename)
+        filepath, nombre_original = buscar_archivo_ticket(ticket, filename)
         return send_file(
             filepath,
             as_attachment=True,
             download_name=nombre_original
         )
+    except TicketServiceError as e:
+        return jsonify({'message': e.message}), e.status_code
     except Exception as e:
         AppLogger.error(LogCategory.SOPORTE, f"Error al descargar archivo ticket {ticket_id}", exc=e)
         return jsonify({'message': f'Error al descargar archivo: {str(e)}'}), 500
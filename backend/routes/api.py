@@ -7,148 +7,15 @@ from models.servicio import Servicio
 from models.plan import Plan
 from models.empresa import Empresa
 from models.servicio import PlanServicio
-from models.api_key import ApiKey, get_colombia_now
 #Utils
 from utils.logger import Logger
 from utils.log import AppLogger, LogCategory
-from utils.api_key_crypto import verificar_api_key
-from database.db import db
-from functools import wraps
+from utils.security.api_key_auth import api_key_required
 import traceback
 import os
 
 api_bp = Blueprint('api', __name__)
 
-# Decorador para validar API Key desde base de datos
-def require_api_key():
-    """
-    Decorador para validar API Key.
-    Recibe el codigo (scope) desde el header X-Code-API enviado por el cliente.
-    
-    Requiere headers:
-    - X-API-Key: API key en texto plano
-    - X-Empresa-Id: ID de la empresa
-    - X-Code-API: Código del scope ('licencias', 'soporte', 'facturacion', 'general')
-    """
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            api_key = request.headers.get('X-API-Key')
-            empresa_id_header = request.headers.get('X-Empresa-Id')
-            codigo_requerido = request.headers.get('X-Code-API')
-            
-            if not api_key:
-                AppLogger.warning(
-                    LogCategory.API,
-                    'Intento de acceso sin X-API-Key',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'X-API-Key header requerido', 'error': 'missing_api_key'}), 401
-            
-            if not empresa_id_header:
-                AppLogger.warning(
-                    LogCategory.API,
-                    'Intento de acceso sin X-Empresa-Id',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'X-Empresa-Id header requerido', 'error': 'missing_empresa_id'}), 401
-            
-            if not codigo_requerido:
-                AppLogger.warning(
-                    LogCategory.API,
-                    'Intento de acceso sin X-Code-API',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'message': 'X-Code-API header requerido', 'error': 'missing_codigo_key'}), 401
-            
-            # Validar formato de empresa_id
-            try:
-                empresa_id = int(empresa_id_header)
-            except ValueError:
-                AppLogger.warning(
-                    LogCategory.API,
-                    'X-Empresa-Id inválido (no numérico)',
-                    empresa_id_header=empresa_id_header,
-                    ip=request.remote_addr
-                )
-                return jsonify({'message': 'X-Empresa-Id debe ser numérico', 'error': 'invalid_empresa_id'}), 400
-            
-            # Buscar API keys activas de la empresa con el código específico
-            api_keys = ApiKey.query.filter_by(
-                empresa_id=empresa_id,
-                codigo=codigo_requerido,
-                activo=True
-            ).all()
-            
-            if not api_keys:
-                AppLogger.warning(
-                    LogCategory.API,
-                    f'Empresa sin API keys activas para código {codigo_requerido}',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr
-                )
-                return jsonify({'message': f'No hay API keys activas para el scope "{codigo_requerido}"', 'error': 'no_active_keys'}), 403
-            
-            # Verificar si alguna API key coincide
-            api_key_valida = None
-            for key_record in api_keys:
-                # Verificar expiración
-                if key_record.esta_expirada():
-                    continue
-                
-                # Verificar hash
-                if verificar_api_key(api_key, key_record.api_key_hash):
-                    api_key_valida = key_record
-                    break
-            
-            if not api_key_valida:
-                AppLogger.warning(
-                    LogCategory.API,
-                    'API Key inválida o expirada',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint,
-                    api_key_prefix=api_key[:8] if len(api_key) >= 8 else 'corta'
-                )
-                return jsonify({'message': 'API Key inválida o expirada', 'error': 'invalid_api_key'}), 403
-            
-            # Actualizar último uso con hora de Colombia
-            try:
-                api_key_valida.ultimo_uso = get_colombia_now()
-                db.session.commit()
-            except Exception as e:
-                AppLogger.error(
-                    LogCategory.API,
-                    'Error al actualizar ultimo_uso de API key',
-                    api_key_id=api_key_valida.id,
-                    exc=e
-                )
-                # No bloqueamos el request por esto
-            
-            # Guardar contexto para uso posterior
-            request.api_key_id = api_key_valida.id
-            request.empresa_id = empresa_id
-            request.api_key_codigo = api_key_valida.codigo
-            
-            AppLogger.info(
-                LogCategory.API,
-                'Acceso autorizado con API Key',
-                empresa_id=empresa_id,
-                api_key_id=api_key_valida.id,
-                api_key_nombre=api_key_valida.nombre,
-                api_key_codigo=api_key_valida.codigo,
-                endpoint=request.endpoint,
-                ip=request.remote_addr
-            )
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
-
 @api_bp.get('/planes')
 def obtener_planes():
     try:
@@ -219,7 +86,7 @@ def verificar_servicios_activos():
 
 
 @api_bp.get('/suscripcion-activa/<string:nit>')
-@require_api_key()
+@api_key_required(LogCategory.API)
 def obtener_suscripcion_activa(nit):
     """
     Endpoint seguro para consultar la suscripción activa de una empresa por su NIT.
@@ -2,199 +2,34 @@
 API Interna de Soporte - Endpoints para instancias SaaS
 Permite crear tickets, agregar comentarios y consultar estado
 
-Este módulo actúa como un proxy que:
-1. Valida la API Key de la instancia SaaS desde base de datos
-2. Invoca los endpoints de admin_soporte_tickets.py que contienen la lógica de negocio
-3. Transforma las respuestas a un formato consistente para las instancias
+Cada endpoint:
+1. Valida la API Key de la instancia SaaS desde base de datos (una sola vez)
+2. Restringe el acceso a los tickets de la empresa autenticada
+3. Invoca el servicio de tickets (utils/ticket_service.py), compartido con
+   admin_soporte_tickets.py, y serializa la respuesta una sola vez
 
-NO duplica lógica de negocio - reutiliza admin_soporte_tickets.py
+NO duplica lógica de negocio - reutiliza utils/ticket_service.py
 """
 #Utils
 from datetime import datetime
-from functools import wraps
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, send_file
 import hashlib
 from utils.log import AppLogger, LogCategory
-from utils.api_key_crypto import verificar_api_key
-from werkzeug.datastructures import ImmutableMultiDict
-from flask import make_response
+from utils.security.api_key_auth import api_key_required
 from database.db import db
 #Models
 from models.soporte_suscripcion import SoporteSuscripcion
 from models.empresa import Empresa
 from models.soporte_ticket import SoporteTicket
-from models.api_key import ApiKey, get_colombia_now
-# Routes
 
-from routes.admin_soporte_tickets import (
-    crear_ticket as admin_crear_ticket,
-    listar_tickets as admin_listar_tickets,
-    obtener_ticket as admin_obtener_ticket,
-    agregar_comentario_admin,
-    subir_archivo as admin_subir_archivo,
-    descargar_archivo as admin_descargar_archivo
+from utils.ticket_service import (
+    TicketServiceError, crear_ticket as crear_ticket_servicio, listar_tickets, detalle_ticket,
+    datos_comentario_request, crear_comentario, subir_archivos_ticket, buscar_archivo_ticket
 )
 
 api_soporte_bp = Blueprint('api_soporte', __name__, url_prefix='/api/internal/support')
 
 
-def validar_api_key():
-    """
-    Decorador para validar API Key de instancias SaaS desde base de datos.
-    Recibe el codigo (scope) desde el header X-Code-API enviado por el cliente.
-    
-    Las API Keys se almacenan hasheadas con bcrypt en la tabla api_keys.
-    Cada key está asociada a una empresa y tiene un código que define su propósito.
-    
-    Requiere headers:
-    - X-API-Key: API key en texto plano
-    - X-Empresa-Id: ID de la empresa
-    - X-Code-API: Código del scope ('soporte', 'licencias', 'facturacion', 'general')
-    
-    Requiere headers:
-    - X-API-Key: <API_KEY> - Clave única de la instancia (en texto plano)
-    - X-Empresa-Id: <empresa_id> - ID de la empresa que consume la API
-    
-    Validaciones:
-    1. Headers presentes y formato correcto
-    2. Empresa existe en BD
-    3. API Key existe, está activa, no expirada y tiene el código correcto
-    4. API Key pertenece a la empresa del header
-    5. Actualiza ultimo_uso de la API key (UTC)
-    """
-    def api_key_decorator(fn):
-        @wraps(fn)
-        def decorated_wrapper(*args, **kwargs):
-            api_key = request.headers.get('X-API-Key')
-            empresa_id_header = request.headers.get('X-Empresa-Id')
-            codigo_requerido = request.headers.get('X-Code-API')
-            print(f"api_key: {api_key}, empresa_id_header: {empresa_id_header}, codigo_requerido: {codigo_requerido}")
-            if not api_key:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso sin X-API-Key',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'success': False, 'message': 'X-API-Key header requerido'}), 401
-            
-            if not empresa_id_header:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso sin X-Empresa-Id',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'success': False, 'message': 'X-Empresa-Id header requerido'}), 401
-            
-            if not codigo_requerido:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso sin X-Code-API',
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'success': False, 'message': 'X-Code-API header requerido'}), 401
-            
-            # Validar formato de empresa_id
-            try:
-                empresa_id = int(empresa_id_header)
-            except ValueError:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'X-Empresa-Id inválido (no numérico)',
-                    empresa_id_header=empresa_id_header,
-                    ip=request.remote_addr
-                )
-                return jsonify({'success': False, 'message': 'X-Empresa-Id debe ser numérico'}), 400
-            
-            # Validar que la empresa existe
-            empresa = Empresa.query.get(empresa_id)
-            if not empresa:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'Intento de acceso con empresa_id inexistente',
-                    empresa_id=empresa_id,
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint
-                )
-                return jsonify({'success': False, 'message': 'Empresa no encontrada'}), 404
-            
-            # Buscar API keys activas de la empresa con el código específico
-            api_keys = ApiKey.query.filter_by(
-                empresa_id=empresa_id,
-                codigo=codigo_requerido,
-                activo=True
-            ).all()
-            
-            if not api_keys:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    f'Empresa sin API keys activas para código {codigo_requerido}',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr
-                )
-                return jsonify({'success': False, 'message': f'No hay API keys activas para el scope "{codigo_requerido}"'}), 403
-            
-            # Verificar si alguna API key coincide
-            api_key_valida = None
-            for key_record in api_keys:
-                # Verificar expiración
-                if key_record.esta_expirada():
-                    continue
-                
-                # Verificar hash con bcrypt
-                if verificar_api_key(api_key, key_record.api_key_hash):
-                    api_key_valida = key_record
-                    break
-            
-            if not api_key_valida:
-                AppLogger.warning(
-                    LogCategory.SOPORTE,
-                    'API Key inválida o expirada',
-                    empresa_id=empresa_id,
-                    codigo_requerido=codigo_requerido,
-                    ip=request.remote_addr,
-                    endpoint=request.endpoint,
-                    api_key_prefix=api_key[:8] if len(api_key) >= 8 else 'corta'
-                )
-                return jsonify({'success': False, 'message': 'API Key inválida o expirada'}), 403
-            
-            # Actualizar último uso con hora de Colombia
-            try:
-                api_key_valida.ultimo_uso = get_colombia_now()
-                db.session.commit()
-            except Exception as e:
-                AppLogger.error(
-                    LogCategory.SOPORTE,
-                    'Error al actualizar ultimo_uso de API key',
-                    api_key_id=api_key_valida.id,
-                    exc=e
-                )
-                # No bloqueamos el request por esto
-            
-            # Guardar información en request para uso posterior
-            request.empresa_id = empresa_id
-            request.api_key_id = api_key_valida.id
-            request.api_key_codigo = api_key_valida.codigo
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                'Acceso autorizado a API de soporte',
-                empresa_id=empresa_id,
-                empresa_nombre=empresa.nombre,
-                api_key_id=api_key_valida.id,
-                api_key_nombre=api_key_valida.nombre,
-                api_key_codigo=api_key_valida.codigo,
-                endpoint=request.endpoint,
-                ip=request.remote_addr
-            )
-            
-            return fn(*args, **kwargs)
-        return decorated_wrapper
-    return api_key_decorator
-
 def obtener_soporte_activo(empresa_id):
     """Obtiene la suscripción de soporte activa de una empresa"""
     hoy = datetime.utcnow().date()
@@ -207,7 +42,7 @@ def obtener_soporte_activo(empresa_id):
     ).first()
 
 @api_soporte_bp.route('/create_tickets', methods=['POST'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def crear_ticket():
     """
     POST /api/internal/support/tickets
@@ -279,62 +114,46 @@ def crear_ticket():
             estado=soporte_activo.estado
         )
         
-        # Preparar datos para el endpoint de admin
-        # Agregar metadata
-        if 'metadata' in body:
-            body['metadata']['ip_origen'] = request.remote_addr
+        usuario_id = body.get('usuario_id')
+        if not usuario_id:
+            return jsonify({
+                'success': False,
+                'message': 'usuario_id es obligatorio cuando se usa API Key'
+            }), 400
         
-        # Agregar empresa_id al body
+        # El usuario_id es de la BD de la instancia SaaS: no se valida en la BD web
         body['empresa_id'] = empresa_id
+        ticket = crear_ticket_servicio(body, usuario_id=usuario_id, es_api_externa=True)
+        ticket_data = ticket.to_dict()
         
-        # Modificar request.json temporalmente para pasar al endpoint de admin
-        original_json = request.get_json(silent=True)
-        request._cached_json = (body, body)
-        
-        # Invocar el endpoint de admin que tiene toda la lógica
-        result = admin_crear_ticket()
-        
-        # Restaurar JSON original
-        if original_json is not None:
-            request._cached_json = (original_json, original_json)
-        
-        # Flask retorna tupla (response, status_code), convertir a Response
-        if isinstance(result, tuple):
-            response = make_response(result[0], result[1])
-        else:
-            response = result
-        
-        # Transformar respuesta al formato de la API interna
-        if response.status_code == 201:
-            data = response.get_json()
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                'Ticket creado exitosamente desde API externa',
-                empresa_id=empresa_id,
-                ticket_id=data['ticket']['id'],
-                titulo=data['ticket'].get('titulo')
-            )
-            return jsonify({
-                'success': True,
-                'message': data.get('message', 'Ticket creado exitosamente'),
-                'ticket_id': data['ticket']['id'],
-                'ticket': data['ticket']
-            }), 201
-        else:
-            data = response.get_json()
-            AppLogger.warning(
-                LogCategory.SOPORTE,
-                'Error al crear ticket desde API externa',
-                empresa_id=empresa_id,
-                status_code=response.status_code,
-                error_message=data.get('message')
-            )
-            return jsonify({
-                'success': False,
-                'message': data.get('message', 'Error al crear ticket'),
-                'code': data.get('error')
-            }), response.status_code
+        AppLogger.info(
+            LogCategory.SOPORTE,
+            'Ticket creado exitosamente desde API externa',
+            empresa_id=empresa_id,
+            ticket_id=ticket.id,
+            titulo=ticket.titulo
+        )
+        return jsonify({
+            'success': True,
+            'message': 'Ticket creado exitosamente',
+            'ticket_id': ticket.id,
+            'ticket': ticket_data
+        }), 201
         
+    except TicketServiceError as e:
+        AppLogger.warning(
+            LogCategory.SOPORTE,
+            'Error al crear ticket desde API externa',
+            empresa_id=request.empresa_id,
+            status_code=e.status_code,
+            error_message=e.message
+        )
+        return jsonify({
+            'success': False,
+            'message': e.message,
+            'code': e.error,
+            **e.datos
+        }), e.status_code
     except Exception as e:
         AppLogger.error(
             LogCategory.SOPORTE,
@@ -348,7 +167,7 @@ def crear_ticket():
         }), 500
 
 @api_soporte_bp.route('/tickets', methods=['GET'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def listar_tickets_empresa():
     """
     GET /api/internal/support/tickets
@@ -361,62 +180,41 @@ def listar_tickets_empresa():
     - estado: filtrar por estado (abierto, en_proceso, resuelto, cerrado)
     - prioridad: filtrar por prioridad (baja, media, alta, urgente)
     - usuario_id: filtrar por usuario creador
+    - busqueda: texto completo en título, descripción y comentarios (incluye 'resaltado')
+    - orden: 'relevancia' para ordenar por relevancia de la búsqueda
     - page: página de resultados (default 1)
     - per_page: resultados por página (default 20, max 100)
+    - cursor: next_cursor de la respuesta anterior (paginación por cursor)
     """
     try:
         empresa_id = request.empresa_id
         
         # Agregar empresa_id a los query params para FORZAR el filtro
-        new_args = dict(request.args)
-        new_args['empresa_id'] = str(empresa_id)
+        args = request.args.copy()
+        args['empresa_id'] = str(empresa_id)
         
         # Mapear 'limite' y 'pagina' a 'per_page' y 'page' si vienen
-        if 'limite' in new_args:
-            new_args['per_page'] = new_args.pop('limite')
-        if 'pagina' in new_args:
-            new_args['page'] = new_args.pop('pagina')
-        
-        original_args = request.args
-        request.args = ImmutableMultiDict(new_args)
+        if 'limite' in args:
+            args['per_page'] = args.pop('limite')
+        if 'pagina' in args:
+            args['page'] = args.pop('pagina')
         
         AppLogger.info(
             LogCategory.SOPORTE,
             "Listando tickets para empresa",
             empresa_id=empresa_id,
-            args=new_args
+            args=args.to_dict()
         )
         
-        # Invocar endpoint de admin (ahora tiene @admin_or_api_key_required)
-        result = admin_listar_tickets()
-        
-        # Restaurar args originales
-        request.args = original_args
-        
-        # Flask retorna tupla (response, status_code), convertir a Response
-        if isinstance(result, tuple):
-            response = make_response(result[0], result[1])
-        else:
-            response = result
-        
-        # Transformar respuesta al formato de la API interna
-        if response.status_code == 200:
-            data = response.get_json()
-            return jsonify({
-                'success': True,
-                'tickets': data['tickets'],
-                'total': data.get('total'),
-                'page': data.get('page'),
-                'per_page': data.get('per_page'),
-                'pages': data.get('pages'),
-                'estadisticas': data.get('estadisticas')
-            }), 200
-        else:
-            data = response.get_json()
+        try:
+            data = listar_tickets(args)
+        except TicketServiceError as e:
             return jsonify({
                 'success': False,
-                'message': data.get('message', 'Error al listar tickets')
-            }), response.status_code
+                'message': e.message
+            }), e.status_code
+        
+        return jsonify({'success': True, **data}), 200
         
     except Exception as e:
         AppLogger.error(
@@ -432,7 +230,7 @@ def listar_tickets_empresa():
 
 
 @api_soporte_bp.route('/ticket_id/<int:ticket_id>', methods=['GET'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def obtener_ticket_detalle(ticket_id):
     """
     GET /api/internal/support/ticket_id/:id
@@ -475,28 +273,10 @@ def obtener_ticket_detalle(ticket_id):
                 'message': 'No tiene permisos para acceder a este ticket'
             }), 403
         
-        # Invocar endpoint de admin
-        result = admin_obtener_ticket(ticket_id)
-        
-        # Flask retorna tupla (response, status_code), convertir a Response
-        if isinstance(result, tuple):
-            response = make_response(result[0], result[1])
-        else:
-            response = result
-        
-        # Transformar respuesta al formato de la API interna
-        if response.status_code == 200:
-            data = response.get_json()
-            return jsonify({
-                'success': True,
-                'ticket': data
-            }), 200
-        else:
-            data = response.get_json()
-            return jsonify({
-                'success': False,
-                'message': data.get('message', 'Error al obtener ticket')
-            }), response.status_code
+        return jsonify({
+            'success': True,
+            'ticket': detalle_ticket(ticket)
+        }), 200
         
     except Exception as e:
         return jsonify({
@@ -506,7 +286,7 @@ def obtener_ticket_detalle(ticket_id):
 
 
 @api_soporte_bp.route('/tickets/<int:ticket_id>/comments', methods=['POST'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def agregar_comentario(ticket_id):
     """
     POST /api/internal/support/tickets/:id/comentarios
@@ -577,52 +357,47 @@ def agregar_comentario(ticket_id):
                 'error': 'no_active_support'
             }), 403
         
-        # Agregar logging detallado para diagnóstico
+        datos = datos_comentario_request(request)
+        
+        # El usuario_id pertenece a la BD de la instancia SaaS (no se valida aquí)
+        if not datos['usuario_id']:
+            return jsonify({
+                'success': False,
+                'message': 'usuario_id es obligatorio cuando se usa API Key'
+            }), 400
+        
+        try:
+            comentario = crear_comentario(
+                ticket,
+                comentario=datos['comentario'],
+                usuario_id=datos['usuario_id'],
+                es_admin=False,
+                archivos=datos['archivos'],
+                files=datos['files']
+            )
+        except TicketServiceError as e:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': e.message
+            }), e.status_code
+        
+        comentario_data = comentario.to_dict()
+        
         AppLogger.info(
             LogCategory.SOPORTE,
-            'Invocando admin_agregar_comentario',
+            'Comentario creado exitosamente desde API externa',
             ticket_id=ticket_id,
-            content_type=request.content_type,
-            has_json=request.is_json,
-            has_form=bool(request.form),
-            has_files=bool(request.files)
+            comentario_id=comentario.id,
+            usuario_id=comentario.usuario_id
         )
         
-        # Invocar endpoint de admin
-        result = agregar_comentario_admin(ticket_id)
-        
-        # Flask retorna tupla (response, status_code), convertir a Response
-        if isinstance(result, tuple):
-            response = make_response(result[0], result[1])
-        else:
-            response = result
-        
-        # Transformar respuesta al formato de la API interna
-        if response.status_code == 201:
-            data = response.get_json()
-            comentario_data = data.get('comentario', {})
-            comentario_id = comentario_data.get('id')
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                'Comentario creado exitosamente desde API externa',
-                ticket_id=ticket_id,
-                comentario_id=comentario_id,
-                usuario_id=comentario_data.get('usuario_id')
-            )
-            
-            return jsonify({
-                'success': True,
-                'message': data.get('message', 'Comentario agregado exitosamente'),
-                'comentario': comentario_data,
-                'comentario_id': comentario_id  # Incluir ID para facilitar subida de archivos
-            }), 201
-        else:
-            data = response.get_json()
-            return jsonify({
-                'success': False,
-                'message': data.get('message', 'Error al agregar comentario')
-            }), response.status_code
+        return jsonify({
+            'success': True,
+            'message': 'Comentario agregado exitosamente',
+            'comentario': comentario_data,
+            'comentario_id': comentario.id  # Incluir ID para facilitar subida de archivos
+        }), 201
         
     except Exception as e:
         return jsonify({
@@ -632,7 +407,7 @@ def agregar_comentario(ticket_id):
 
 
 @api_soporte_bp.route('/tickets/<int:ticket_id>/files', methods=['POST'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def subir_archivo(ticket_id):
     """
     POST /api/internal/support/tickets/:id/upload
@@ -699,39 +474,44 @@ def subir_archivo(ticket_id):
                 'error': 'no_active_support'
             }), 403
         
-        # Invocar endpoint de admin
-        result = admin_subir_archivo(ticket_id)
-        
-        # Flask retorna tupla (response, status_code), convertir a Response
-        if isinstance(result, tuple):
-            response = make_response(result[0], result[1])
-        else:
-            response = result
+        try:
+            archivos, errores = subir_archivos_ticket(
+                ticket,
+                request.files.getlist('files'),
+                comentario_id=comentario_id
+            )
+        except TicketServiceError as e:
+            return jsonify({
+                'success': False,
+                'message': e.message
+            }), e.status_code
         
-        # Logging para diagnóstico
-        data = response.get_json()
         AppLogger.info(
             LogCategory.SOPORTE,
-            'Respuesta de admin_subir_archivo',
-            status_code=response.status_code,
-            data=data
+            'Archivos subidos a ticket desde API externa',
+            ticket_id=ticket_id,
+            total=len(archivos),
+            errores=errores
         )
         
-        # Transformar respuesta al formato de la API interna
-        if response.status_code == 200:
-            archivos = data.get('archivos', [])
-            return jsonify({
-                'success': True,
-                'message': data.get('message', 'Archivos subidos exitosamente'),
-                'archivos_subidos': archivos,
-                'total': len(archivos),
-                'errores': data.get('errores', [])
-            }), 200
-        else:
+        if not archivos:
             return jsonify({
                 'success': False,
-                'message': data.get('message', 'Error al subir archivos')
-            }), response.status_code
+                'message': f'0 archivo(s) subido(s) exitosamente, {len(errores)} error(es)',
+                'errores': errores
+            }), 400
+        
+        message = f'{len(archivos)} archivo(s) subido(s) exitosamente'
+        if errores:
+            message += f', {len(errores)} error(es)'
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'archivos_subidos': archivos,
+            'total': len(archivos),
+            'errores': errores
+        }), 200
         
     except Exception as e:
         return jsonify({
@@ -741,7 +521,7 @@ def subir_archivo(ticket_id):
 
 
 @api_soporte_bp.route('/tickets/<int:ticket_id>/archivos/<filename>', methods=['GET'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def descargar_archivo(ticket_id, filename):
     """
     GET /api/internal/support/tickets/:id/archivos/:filename
@@ -787,8 +567,19 @@ def descargar_archivo(ticket_id, filename):
                 'message': 'No tiene permisos para acceder a los archivos de este ticket'
             }), 403
         
-        # Invocar endpoint de admin (este retorna el archivo directamente)
-        return admin_descargar_archivo(ticket_id, filename)
+        try:
+            filepath, nombre_original = buscar_archivo_ticket(ticket, filename)
+        except TicketServiceError as e:
+            return jsonify({
+                'success': False,
+                'message': e.message
+            }), e.status_code
+        
+        return send_file(
+            filepath,
+            as_attachment=True,
+            download_name=nombre_original
+        )
         
     except Exception as e:
         return jsonify({
@@ -798,7 +589,7 @@ def descargar_archivo(ticket_id, filename):
 
 
 @api_soporte_bp.route('/status', methods=['GET'])
-@validar_api_key()
+@api_key_required(LogCategory.SOPORTE, incluir_success=True)
 def verificar_soporte():
     """
     GET /api/internal/support/status
@@ -0,0 +1,28 @@
+import hmac
+
+from flask import Response, current_app, jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+
+from utils.request_metrics import get_request_metrics, render_prometheus
+
+
+def _token_de_scraper_valido() -> bool:
+    """Permite el acceso de Prometheus con 'Authorization: Bearer <METRICS_TOKEN>'."""
+    esperado = current_app.config.get('METRICS_TOKEN')
+    auth = request.headers.get('Authorization', '')
+    if not esperado or not auth.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(auth[7:].strip().encode(), esperado.encode())
+
+
+def metrics():
+    """Métricas de requests de todos los workers en formato de texto de Prometheus (solo admin)"""
+    if not _token_de_scraper_valido():
+        verify_jwt_in_request()
+        if get_jwt().get('rol') != 'admin':
+            return jsonify({'message': 'No autorizado'}), 403
+
+    request_metrics = get_request_metrics()
+    if request_metrics is None:
+        return jsonify({'message': 'Métricas deshabilitadas'}), 404
+    return Response(render_prometheus(request_metrics), mimetype='text/plain; version=0.0.4; charset=utf-8')
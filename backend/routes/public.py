@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from database.db import db
 from models.empresa import Empresa
 from models.servicio import Servicio
@@ -6,10 +6,24 @@ from models.plan import Plan
 from models.suscripcion import Suscripcion
 from utils.logger import Logger
 from utils.location_service import get_location_service
+from utils.precompressed import send_precompressed
 import traceback
 
 public_bp = Blueprint('public', __name__)
 
+
+def _catalogo_precomprimido(clave, construir):
+    """
+    Respuesta del catálogo renderizada una vez por versión de datos (JSON + gzip/br) con ETag.
+    Mientras el servicio responde con el catálogo de respaldo, el cliente no debe cachearla.
+    """
+    service = get_location_service()
+    rendered = current_app.extensions["location_responses"].get_or_render(
+        (*clave, service.data_version), construir
+    )
+    max_age = current_app.config.get('LOCATION_HTTP_MAX_AGE', 3600) if service.ready else 0
+    return send_precompressed(rendered, max_age=max_age)
+
 @public_bp.get('/planes')
 def obtener_planes():
     try:
@@ -79,20 +93,41 @@ def obtener_paises():
     try:
         if query:
             countries = service.search_countries(query, limit=safe_limit)
-        else:
-            countries = service.get_countries()
-        return jsonify({'countries': countries})
+            return jsonify({'countries': countries})
+        return _catalogo_precomprimido(('countries',), lambda: {'countries': service.get_countries()})
     except Exception as ex:  # noqa: BLE001
         Logger.add_to_log('error', f'Error al procesar países: {str(ex)}\n{traceback.format_exc()}')
         return jsonify({'message': 'No pudimos obtener el catálogo de países en este momento.'}), 500
 
 
+@public_bp.get('/location/cities/search')
+def buscar_ciudades():
+    service = get_location_service()
+    query = request.args.get('q', type=str)
+    country_code = request.args.get('country', type=str)
+    requested_limit = request.args.get('limit', type=int)
+    safe_limit = max(1, min(requested_limit or 20, 50))
+
+    if not query or not query.strip():
+        return jsonify({'cities': []})
+
+    try:
+        cities = service.search_cities(query, country_code=country_code, limit=safe_limit)
+        return jsonify({'cities': cities})
+    except Exception as ex:  # noqa: BLE001
+        Logger.add_to_log('error', f'Error al buscar ciudades ({query}): {str(ex)}\n{traceback.format_exc()}')
+        return jsonify({'message': 'No pudimos buscar ciudades en este momento.'}), 500
+
+
 @public_bp.get('/location/countries/<string:country_code>/cities')
 def obtener_ciudades(country_code: str):
     service = get_location_service()
+    codigo = country_code.upper().strip()
     try:
-        cities = service.get_cities(country_code)
-        return jsonify({'cities': cities, 'country_code': country_code.upper()})
+        return _catalogo_precomprimido(
+            ('cities', codigo),
+            lambda: {'cities': service.get_cities(codigo), 'country_code': codigo}
+        )
     except Exception as ex:  # noqa: BLE001
         Logger.add_to_log('error', f'Error al obtener ciudades de {country_code}: {str(ex)}\n{traceback.format_exc()}')
         return jsonify({'message': f'No pudimos obtener ciudades para {country_code}.'}), 500
\ No newline at end of file
@@ -11,7 +11,7 @@ from pathlib import Path
 # Agregar el directorio padre al path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.otp_email_service import OTPEmailService
+from utils.email_templates import get_email_templates
 
 def preview_template():
     """Genera un preview HTML de la plantilla de email."""
@@ -20,10 +20,10 @@ def preview_template():
     print("=" * 60)
     
     try:
-        # Cargar plantilla
-        print("\n📄 Cargando plantilla otp_code.html...")
-        template = OTPEmailService._load_email_template('otp_code.html')
-        print("✅ Plantilla cargada correctamente")
+        # Cargar y compilar plantillas (mismo registro que usa el envío real)
+        print("\n📄 Cargando plantillas otp_code.html / otp_code.txt...")
+        templates = get_email_templates()
+        print("✅ Plantillas cargadas correctamente")
         
         # Datos de prueba
         test_data = {
@@ -35,8 +35,11 @@ def preview_template():
         
         # Renderizar plantilla
         print("\n🎨 Renderizando plantilla con datos de prueba...")
-        html_content = OTPEmailService._render_template(template, **test_data)
+        html_content, text_content = templates.render_email('otp_code', **test_data)
         print("✅ Plantilla renderizada correctamente")
+        if text_content:
+            print("\n📝 Versión de texto plano:")
+            print(text_content)
         
         # Guardar en archivo
         output_file = Path(__file__).parent / 'preview_email.html'
@@ -93,9 +96,8 @@ def preview_with_custom_data():
     greeting = f"Hola {name}," if name != "Usuario" else "Hola,"
     
     try:
-        template = OTPEmailService._load_email_template('otp_code.html')
-        html_content = OTPEmailService._render_template(
-            template,
+        html_content, _ = get_email_templates().render_email(
+            'otp_code',
             greeting=greeting,
             subject_text=purpose,
             code=code,
@@ -7,21 +7,43 @@ Funciones:
 1. Revisa todas las suscripciones de plan que:
    - Tienen renovacion_automatica = True
    - Han llegado a su fecha_fin o están por vencer
-   
+
 2. Revisa todas las suscripciones de soporte que:
-   - Tienen renovacion_automatica = True  
+   - Tienen renovacion_automatica = True
    - Han llegado a su fecha_fin o están por vencer
 
 3. Para cada suscripción elegible:
    - Si tiene renovacion_automatica=True: Crea una nueva suscripción activa
    - Si renovacion_automatica=False: Marca como inactiva
 
+Procesamiento por lotes:
+   Los candidatos se recorren en lotes ordenados por id (keyset: id > último id
+   visto, sin OFFSET) cargando empresa/plan/tipo_soporte en la misma consulta.
+   Cada lote es una transacción: las inactivaciones y el cierre de las
+   renovadas son UPDATE por conjunto de ids y las renovaciones un INSERT
+   multi-fila. Si un lote falla se revierte completo y se reintenta registro
+   por registro, para que un solo registro con problemas no bloquee al resto.
+
+Corridas (tablas renewal_runs / renewal_items):
+   Cada ejecución real crea una corrida y guarda los registros vencidos como
+   items 'pendiente'. Cada item se marca completado en la misma transacción
+   que su renovación, así que si el proceso se interrumpe la siguiente
+   ejecución reanuda la corrida 'en_curso' procesando solo lo pendiente y
+   nunca renueva dos veces el mismo registro.
+   Los items se reparten en particiones por empresa_id % workers; con
+   --workers N cada partición la procesa un proceso distinto, que reclama sus
+   lotes con SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8+ / MariaDB 10.6+).
+
 Uso:
-    python renovacion_automatica.py [--dry-run] [--dias-anticipacion N]
-    
+    python renovacion_automatica.py [--dry-run] [--dias-anticipacion N] [--tamano-lote N]
+                                    [--workers N] [--run-id ID]
+
 Opciones:
     --dry-run               Simula la ejecución sin hacer cambios
     --dias-anticipacion N   Renovar N días antes del vencimiento (default: 0)
+    --tamano-lote N         Registros por lote/transacción (default: 500)
+    --workers N             Procesos en paralelo, uno por partición (default: 1)
+    --run-id ID             Reanudar solo la corrida ID, sin planificar una nueva
 
 Crontab (ejecutar todos los días a las 2 AM):
     0 2 * * * cd /ruta/backend && /ruta/env_web/bin/python scripts/renovacion_automatica.py
@@ -38,13 +60,19 @@ from pathlib import Path
 from datetime import datetime, timedelta
 from decimal import Decimal
 import argparse
+import multiprocessing
 
 # Agregar el directorio backend al path
 backend_dir = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(backend_dir))
 
+from sqlalchemy import bindparam, func, insert, literal, select, update
+from sqlalchemy.orm import joinedload
+
 from database.db import db
-from models import Suscripcion, SoporteSuscripcion, Plan, SoporteTipo
+from models import Suscripcion, SoporteSuscripcion, SoporteTipo
+from models.plan import Plan
+from models.renewal_run import RenewalRun, RenewalItem
 from utils.log import AppLogger, LogCategory
 
 # Inicializar Flask app para acceso a DB
@@ -54,338 +82,769 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'mysql+py
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+TAMANO_LOTE_DEFAULT = 500
+
 
-def renovar_suscripcion_plan(suscripcion: Suscripcion, dry_run: bool = False) -> dict:
+# ==========================================
+# ACCESO A DATOS POR LOTES
+# ==========================================
+
+def iterar_lotes(modelo, estado: str, fecha_limite, tamano_lote: int, relaciones=()):
     """
-    Renueva automáticamente una suscripción de plan.
-    
+    Recorre los registros vencidos de `modelo` en lotes ordenados por id.
+
+    Usa paginación por keyset (id > último id visto) en lugar de OFFSET, así
+    cada consulta cuesta lo mismo aunque los lotes anteriores ya hayan cambiado
+    de estado. El recorrido se limita al id máximo existente al empezar: las
+    renovaciones creadas durante la ejecución no se vuelven a procesar aunque
+    su nueva fecha_fin también esté vencida.
+
     Args:
-        suscripcion: Suscripción a renovar
-        dry_run: Si es True, solo simula sin hacer cambios
-        
-    Returns:
-        dict con resultado de la operación
+        modelo: Suscripcion o SoporteSuscripcion
+        estado: Estado vigente a buscar ('activa' / 'activo')
+        fecha_limite: Se procesan los registros con fecha_fin <= fecha_limite
+        tamano_lote: Máximo de registros por lote
+        relaciones: Relaciones many-to-one a cargar con JOIN en la misma consulta
+
+    Yields:
+        Lista de instancias del lote
     """
-    resultado = {
-        'tipo': 'plan',
-        'suscripcion_id': suscripcion.id,
-        'empresa_id': suscripcion.empresa_id,
-        'empresa_nombre': suscripcion.empresa.nombre_comercial if suscripcion.empresa else 'N/A',
-        'plan_nombre': suscripcion.plan.nombre if suscripcion.plan else 'N/A',
-        'accion': None,
-        'nueva_suscripcion_id': None,
-        'error': None
-    }
-    
-    try:
-        # Calcular fechas para la renovación
-        fecha_inicio = suscripcion.fecha_fin or datetime.utcnow().date()
-        
-        if suscripcion.periodo == 'mensual':
-            fecha_fin = fecha_inicio + timedelta(days=30)
-            precio_pagado = suscripcion.plan.precio_mensual
-        else:  # anual
-            fecha_fin = fecha_inicio + timedelta(days=365)
-            precio_pagado = suscripcion.plan.precio_anual
-        
-        if not dry_run:
-            # Marcar la anterior como inactiva
-            suscripcion.estado = 'inactiva'
-            suscripcion.notas = (suscripcion.notas or '') + f'\n[Renovada automáticamente el {datetime.utcnow().date()}]'
-            
-            # Crear nueva suscripción
-            nueva_suscripcion = Suscripcion(
-                empresa_id=suscripcion.empresa_id,
-                plan_id=suscripcion.plan_id,
-                fecha_inicio=fecha_inicio,
-                fecha_fin=fecha_fin,
-                estado='activa',
-                periodo=suscripcion.periodo,
-                precio_pagado=precio_pagado,
-                porcentaje_descuento=suscripcion.porcentaje_descuento,
-                renovacion_automatica=True,  # Mantener la renovación automática
-                forma_pago=suscripcion.forma_pago,
-                creado_por=suscripcion.creado_por,
-                notas=f'Renovación automática de suscripción #{suscripcion.id}'
+    id_maximo = db.session.scalar(select(func.max(modelo.id)))
+    if id_maximo is None:
+        return
+
+    opciones = [joinedload(relacion) for relacion in relaciones]
+    ultimo_id = 0
+    while True:
+        lote = (
+            modelo.query
+            .options(*opciones)
+            .filter(
+                modelo.estado == estado,
+                modelo.fecha_fin <= fecha_limite,
+                modelo.id > ultimo_id,
+                modelo.id <= id_maximo,
             )
-            
-            db.session.add(nueva_suscripcion)
-            db.session.commit()
-            
-            resultado['accion'] = 'renovada'
-            resultado['nueva_suscripcion_id'] = nueva_suscripcion.id
-            
-            AppLogger.info(
-                LogCategory.SUSCRIPCIONES,
-                "Suscripción renovada automáticamente",
-                suscripcion_anterior_id=suscripcion.id,
-                nueva_suscripcion_id=nueva_suscripcion.id,
-                empresa_id=suscripcion.empresa_id,
-                plan_id=suscripcion.plan_id,
-                periodo=suscripcion.periodo
+            .order_by(modelo.id)
+            .limit(tamano_lote)
+            .all()
+        )
+        if not lote:
+            return
+        ultimo_id = lote[-1].id
+        yield lote
+        # Liberar el lote ya procesado del identity map
+        db.session.expunge_all()
+
+
+def contar_vencidos(modelo, estado: str, fecha_limite) -> int:
+    """Cuenta los registros que se van a procesar (para el reporte)."""
+    return db.session.scalar(
+        select(func.count(modelo.id))
+        .where(modelo.estado == estado, modelo.fecha_fin <= fecha_limite)
+    )
+
+
+def marcar_en_bloque(modelo, ids: list, estado_actual: str, estado_nuevo: str, nota: str) -> None:
+    """
+    Cambia el estado de un conjunto de registros con un solo UPDATE y agrega
+    la nota al final de `notas` en SQL.
+
+    Solo actualiza los que siguen en `estado_actual`; si alguno cambió entre la
+    lectura y el UPDATE (otro proceso, un admin) lanza una excepción para que
+    el lote se revierta y no se renueve algo que ya no está vigente.
+    """
+    if not ids:
+        return
+    resultado = db.session.execute(
+        update(modelo)
+        .where(modelo.id.in_(ids), modelo.estado == estado_actual)
+        .values(estado=estado_nuevo, notas=func.coalesce(modelo.notas, '') + nota)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != len(ids):
+        raise RuntimeError(
+            f"{len(ids) - resultado.rowcount} registro(s) de {modelo.__tablename__} "
+            f"cambiaron de estado durante el proceso"
+        )
+
+
+def insertar_en_bloque(modelo, filas: list) -> list:
+    """
+    Inserta las filas con un INSERT multi-fila y retorna sus ids en el mismo orden.
+
+    Cada fila se identifica por `notas` ('Renovación automática de ... #<id>'),
+    que es única por registro de origen. Con motores que soportan RETURNING
+    (SQLite, MariaDB, PostgreSQL) el par (id, notas) vuelve en el mismo INSERT;
+    MySQL no lo soporta y se recupera con una consulta por empresa_id + notas.
+    """
+    if not filas:
+        return []
+
+    dialecto = db.session.get_bind().dialect
+    if dialecto.insert_executemany_returning:
+        creados = db.session.execute(insert(modelo).returning(modelo.id, modelo.notas), filas)
+    else:
+        db.session.execute(insert(modelo), filas)
+        creados = db.session.execute(
+            select(modelo.id, modelo.notas)
+            .where(
+                modelo.empresa_id.in_({fila['empresa_id'] for fila in filas}),
+                modelo.estado == filas[0]['estado'],
+                modelo.notas.in_([fila['notas'] for fila in filas]),
             )
-        else:
-            resultado['accion'] = 'renovar (simulado)'
-        
-        return resultado
-        
+            .order_by(modelo.id)
+        )
+    ids_por_nota = {notas: id_ for id_, notas in creados}
+    return [ids_por_nota[fila['notas']] for fila in filas]
+
+
+def ejecutar_lote(renovar: list, inactivar: list, aplicar, categoria: LogCategory, campo_id: str,
+                  ledger=None) -> None:
+    """
+    Aplica un lote en una sola transacción.
+
+    `renovar` e `inactivar` son listas de (instancia, resultado, fila_nueva) y
+    (instancia, resultado). `aplicar(renovar, inactivar)` ejecuta el SQL del lote.
+    Si el lote falla se revierte y se reintenta cada registro por separado, de
+    modo que el error queda solo en el registro que lo causa.
+    Con `ledger` los items del lote se marcan completados en la misma transacción.
+    """
+    try:
+        aplicar(renovar, inactivar)
+        if ledger is not None:
+            ledger.completar(renovar, inactivar)
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
+        if len(renovar) + len(inactivar) > 1:
+            for item in renovar:
+                ejecutar_lote([item], [], aplicar, categoria, campo_id, ledger)
+            for item in inactivar:
+                ejecutar_lote([], [item], aplicar, categoria, campo_id, ledger)
+            return
+
+        resultado = (renovar or inactivar)[0][1]
         resultado['error'] = str(e)
         AppLogger.error(
-            LogCategory.SUSCRIPCIONES,
-            "Error en renovación automática de suscripción",
+            categoria,
+            "Error en renovación automática",
             exc=e,
-            suscripcion_id=suscripcion.id
+            **{campo_id: resultado[campo_id]}
         )
-        return resultado
 
 
-def inactivar_suscripcion_plan(suscripcion: Suscripcion, dry_run: bool = False) -> dict:
+# ==========================================
+# SUSCRIPCIONES DE PLAN
+# ==========================================
+
+def fila_renovacion_plan(suscripcion: Suscripcion) -> dict:
     """
-    Inactiva una suscripción que venció sin renovación automática.
+    Calcula la nueva suscripción que reemplaza a `suscripcion` (sin tocar la BD).
     """
-    resultado = {
-        'tipo': 'plan',
-        'suscripcion_id': suscripcion.id,
+    fecha_inicio = suscripcion.fecha_fin or datetime.utcnow().date()
+
+    if suscripcion.periodo == 'mensual':
+        fecha_fin = fecha_inicio + timedelta(days=30)
+        precio_pagado = suscripcion.plan.precio_mensual
+    else:  # anual
+        fecha_fin = fecha_inicio + timedelta(days=365)
+        precio_pagado = suscripcion.plan.precio_anual
+
+    return {
         'empresa_id': suscripcion.empresa_id,
-        'empresa_nombre': suscripcion.empresa.nombre_comercial if suscripcion.empresa else 'N/A',
-        'plan_nombre': suscripcion.plan.nombre if suscripcion.plan else 'N/A',
-        'accion': None,
-        'error': None
+        'plan_id': suscripcion.plan_id,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'estado': 'activa',
+        'periodo': suscripcion.periodo,
+        'precio_pagado': precio_pagado,
+        'porcentaje_descuento': suscripcion.porcentaje_descuento,
+        'renovacion_automatica': True,  # Mantener la renovación automática
+        'forma_pago': suscripcion.forma_pago,
+        'creado_por': suscripcion.creado_por,
+        'notas': f'Renovación automática de suscripción #{suscripcion.id}',
     }
-    
-    try:
-        if not dry_run:
-            suscripcion.estado = 'inactiva'
-            suscripcion.notas = (suscripcion.notas or '') + f'\n[Inactivada automáticamente el {datetime.utcnow().date()} por vencimiento]'
-            db.session.commit()
-            
-            AppLogger.info(
-                LogCategory.SUSCRIPCIONES,
-                "Suscripción inactivada por vencimiento",
-                suscripcion_id=suscripcion.id,
-                empresa_id=suscripcion.empresa_id
-            )
-        
-        resultado['accion'] = 'inactivada' if not dry_run else 'inactivar (simulado)'
-        return resultado
-        
-    except Exception as e:
-        db.session.rollback()
-        resultado['error'] = str(e)
-        AppLogger.error(
+
+
+def aplicar_lote_planes(renovar: list, inactivar: list) -> None:
+    """SQL de un lote de planes: 2 UPDATE por conjunto + 1 INSERT multi-fila."""
+    hoy = datetime.utcnow().date()
+
+    marcar_en_bloque(
+        Suscripcion, [r['suscripcion_id'] for _, r in inactivar], 'activa', 'inactiva',
+        f'\n[Inactivada automáticamente el {hoy} por vencimiento]'
+    )
+    marcar_en_bloque(
+        Suscripcion, [r['suscripcion_id'] for _, r, _ in renovar], 'activa', 'inactiva',
+        f'\n[Renovada automáticamente el {hoy}]'
+    )
+    nuevos_ids = insertar_en_bloque(Suscripcion, [fila for _, _, fila in renovar])
+    for (_, resultado, _), nuevo_id in zip(renovar, nuevos_ids):
+        resultado['nueva_suscripcion_id'] = nuevo_id
+
+
+def procesar_lote_planes(lote: list, dry_run: bool, resultados: dict, ledger=None) -> None:
+    """
+    Procesa un lote de suscripciones de plan vencidas y agrega cada resultado
+    a `resultados` (mismo formato que el reporte de ejecución).
+    """
+    renovar, inactivar, con_error = [], [], []
+
+    for suscripcion in lote:
+        resultado = {
+            'tipo': 'plan',
+            'suscripcion_id': suscripcion.id,
+            'empresa_id': suscripcion.empresa_id,
+            'empresa_nombre': suscripcion.empresa.nombre if suscripcion.empresa else 'N/A',
+            'plan_nombre': suscripcion.plan.nombre if suscripcion.plan else 'N/A',
+            'accion': None,
+            'error': None
+        }
+
+        if suscripcion.renovacion_automatica:
+            resultado['nueva_suscripcion_id'] = None
+            try:
+                fila = fila_renovacion_plan(suscripcion)
+            except Exception as e:
+                resultado['error'] = str(e)
+                con_error.append(resultado)
+                AppLogger.error(
+                    LogCategory.SUSCRIPCIONES,
+                    "Error en renovación automática de suscripción",
+                    exc=e,
+                    suscripcion_id=suscripcion.id
+                )
+                continue
+            renovar.append((suscripcion, resultado, fila))
+        else:
+            inactivar.append((suscripcion, resultado))
+
+    if not dry_run:
+        ejecutar_lote(renovar, inactivar, aplicar_lote_planes, LogCategory.SUSCRIPCIONES, 'suscripcion_id', ledger)
+
+    resultados['errores'].extend(con_error)
+
+    for _, resultado, fila in renovar:
+        if resultado['error']:
+            resultados['errores'].append(resultado)
+            continue
+        resultados['planes_renovadas'].append(resultado)
+        print(f"   ✓ Renovada: Empresa {resultado['empresa_nombre']} - Plan {resultado['plan_nombre']}")
+        if dry_run:
+            resultado['accion'] = 'renovar (simulado)'
+            continue
+        resultado['accion'] = 'renovada'
+        AppLogger.info(
             LogCategory.SUSCRIPCIONES,
-            "Error al inactivar suscripción",
-            exc=e,
-            suscripcion_id=suscripcion.id
+            "Suscripción renovada automáticamente",
+            suscripcion_anterior_id=resultado['suscripcion_id'],
+            nueva_suscripcion_id=resultado['nueva_suscripcion_id'],
+            empresa_id=resultado['empresa_id'],
+            plan_id=fila['plan_id'],
+            periodo=fila['periodo']
+        )
+
+    for _, resultado in inactivar:
+        if resultado['error']:
+            resultados['errores'].append(resultado)
+            continue
+        resultados['planes_inactivadas'].append(resultado)
+        print(f"   ✗ Inactivada: Empresa {resultado['empresa_nombre']} - Plan {resultado['plan_nombre']}")
+        if dry_run:
+            resultado['accion'] = 'inactivar (simulado)'
+            continue
+        resultado['accion'] = 'inactivada'
+        AppLogger.info(
+            LogCategory.SUSCRIPCIONES,
+            "Suscripción inactivada por vencimiento",
+            suscripcion_id=resultado['suscripcion_id'],
+            empresa_id=resultado['empresa_id']
         )
-        return resultado
 
 
-def renovar_soporte_suscripcion(soporte: SoporteSuscripcion, dry_run: bool = False) -> dict:
+# ==========================================
+# SUSCRIPCIONES DE SOPORTE
+# ==========================================
+
+def fila_renovacion_soporte(soporte: SoporteSuscripcion) -> dict:
     """
-    Renueva automáticamente una suscripción de soporte.
+    Calcula el nuevo periodo de soporte que reemplaza a `soporte` (sin tocar la BD).
     """
-    resultado = {
-        'tipo': 'soporte',
-        'soporte_id': soporte.id,
+    # Calcular nueva fecha_fin (mismo periodo que la anterior)
+    if soporte.fecha_fin and soporte.fecha_inicio:
+        duracion_dias = (soporte.fecha_fin - soporte.fecha_inicio).days
+        fecha_inicio = soporte.fecha_fin
+        fecha_fin = fecha_inicio + timedelta(days=duracion_dias)
+    else:
+        fecha_inicio = datetime.utcnow().date()
+        fecha_fin = fecha_inicio + timedelta(days=365)  # Default: 1 año
+
+    return {
+        'suscripcion_id': soporte.suscripcion_id,
         'empresa_id': soporte.empresa_id,
-        'empresa_nombre': soporte.empresa.nombre_comercial if soporte.empresa else 'N/A',
-        'tipo_soporte': soporte.tipo_soporte.nombre if soporte.tipo_soporte else 'N/A',
-        'accion': None,
-        'nuevo_soporte_id': None,
-        'error': None
+        'soporte_tipo_id': soporte.soporte_tipo_id,
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'estado': 'activo',
+        'precio_actual': soporte.tipo_soporte.precio,
+        'renovacion_automatica': True,  # Mantener la renovación automática
+        'tickets_consumidos': 0,  # Resetear contador
+        'horas_consumidas': Decimal('0.00'),
+        'notas': f'Renovación automática de soporte #{soporte.id}',
+        'creado_por': soporte.creado_por,
     }
-    
-    try:
-        # Calcular nueva fecha_fin (mismo periodo que la anterior)
-        if soporte.fecha_fin and soporte.fecha_inicio:
-            duracion_dias = (soporte.fecha_fin - soporte.fecha_inicio).days
-            fecha_inicio = soporte.fecha_fin
-            fecha_fin = fecha_inicio + timedelta(days=duracion_dias)
-        else:
-            fecha_inicio = datetime.utcnow().date()
-            fecha_fin = fecha_inicio + timedelta(days=365)  # Default: 1 año
-        
-        if not dry_run:
-            # Marcar el anterior como vencido
-            soporte.estado = 'vencido'
-            soporte.notas = (soporte.notas or '') + f'\n[Renovado automáticamente el {datetime.utcnow().date()}]'
-            
-            # Crear nueva suscripción de soporte
-            nuevo_soporte = SoporteSuscripcion(
-                suscripcion_id=soporte.suscripcion_id,
-                empresa_id=soporte.empresa_id,
-                soporte_tipo_id=soporte.soporte_tipo_id,
-                fecha_inicio=fecha_inicio,
-                fecha_fin=fecha_fin,
-                estado='activo',
-                precio_actual=soporte.tipo_soporte.precio,
-                renovacion_automatica=True,  # Mantener la renovación automática
-                tickets_consumidos=0,  # Resetear contador
-                horas_consumidas=Decimal('0.00'),
-                notas=f'Renovación automática de soporte #{soporte.id}',
-                creado_por=soporte.creado_por
-            )
-            
-            db.session.add(nuevo_soporte)
-            db.session.commit()
-            
-            resultado['accion'] = 'renovada'
-            resultado['nuevo_soporte_id'] = nuevo_soporte.id
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                "Soporte renovado automáticamente",
-                soporte_anterior_id=soporte.id,
-                nuevo_soporte_id=nuevo_soporte.id,
-                empresa_id=soporte.empresa_id,
-                tipo_soporte_id=soporte.soporte_tipo_id
-            )
+
+
+def aplicar_lote_soportes(renovar: list, inactivar: list) -> None:
+    """SQL de un lote de soportes: 2 UPDATE por conjunto + 1 INSERT multi-fila."""
+    hoy = datetime.utcnow().date()
+
+    marcar_en_bloque(
+        SoporteSuscripcion, [r['soporte_id'] for _, r in inactivar], 'activo', 'vencido',
+        f'\n[Vencido automáticamente el {hoy}]'
+    )
+    marcar_en_bloque(
+        SoporteSuscripcion, [r['soporte_id'] for _, r, _ in renovar], 'activo', 'vencido',
+        f'\n[Renovado automáticamente el {hoy}]'
+    )
+    nuevos_ids = insertar_en_bloque(SoporteSuscripcion, [fila for _, _, fila in renovar])
+    for (_, resultado, _), nuevo_id in zip(renovar, nuevos_ids):
+        resultado['nuevo_soporte_id'] = nuevo_id
+
+
+def procesar_lote_soportes(lote: list, dry_run: bool, resultados: dict, ledger=None) -> None:
+    """
+    Procesa un lote de suscripciones de soporte vencidas y agrega cada
+    resultado a `resultados`.
+    """
+    renovar, inactivar, con_error = [], [], []
+
+    for soporte in lote:
+        resultado = {
+            'tipo': 'soporte',
+            'soporte_id': soporte.id,
+            'empresa_id': soporte.empresa_id,
+            'empresa_nombre': soporte.empresa.nombre if soporte.empresa else 'N/A',
+            'tipo_soporte': soporte.tipo_soporte.nombre if soporte.tipo_soporte else 'N/A',
+            'accion': None,
+            'error': None
+        }
+
+        if soporte.renovacion_automatica:
+            resultado['nuevo_soporte_id'] = None
+            try:
+                fila = fila_renovacion_soporte(soporte)
+            except Exception as e:
+                resultado['error'] = str(e)
+                con_error.append(resultado)
+                AppLogger.error(
+                    LogCategory.SOPORTE,
+                    "Error en renovación automática de soporte",
+                    exc=e,
+                    soporte_id=soporte.id
+                )
+                continue
+            renovar.append((soporte, resultado, fila))
         else:
+            inactivar.append((soporte, resultado))
+
+    if not dry_run:
+        ejecutar_lote(renovar, inactivar, aplicar_lote_soportes, LogCategory.SOPORTE, 'soporte_id', ledger)
+
+    resultados['errores'].extend(con_error)
+
+    for _, resultado, fila in renovar:
+        if resultado['error']:
+            resultados['errores'].append(resultado)
+            continue
+        resultados['soportes_renovados'].append(resultado)
+        print(f"   ✓ Renovado: Empresa {resultado['empresa_nombre']} - {resultado['tipo_soporte']}")
+        if dry_run:
             resultado['accion'] = 'renovar (simulado)'
-        
-        return resultado
-        
-    except Exception as e:
-        db.session.rollback()
-        resultado['error'] = str(e)
-        AppLogger.error(
+            continue
+        resultado['accion'] = 'renovada'
+        AppLogger.info(
             LogCategory.SOPORTE,
-            "Error en renovación automática de soporte",
-            exc=e,
-            soporte_id=soporte.id
+            "Soporte renovado automáticamente",
+            soporte_anterior_id=resultado['soporte_id'],
+            nuevo_soporte_id=resultado['nuevo_soporte_id'],
+            empresa_id=resultado['empresa_id'],
+            tipo_soporte_id=fila['soporte_tipo_id']
         )
-        return resultado
+
+    for _, resultado in inactivar:
+        if resultado['error']:
+            resultados['errores'].append(resultado)
+            continue
+        resultados['soportes_vencidos'].append(resultado)
+        print(f"   ✗ Vencido: Empresa {resultado['empresa_nombre']} - {resultado['tipo_soporte']}")
+        if dry_run:
+            resultado['accion'] = 'vencer (simulado)'
+            continue
+        resultado['accion'] = 'vencida'
+        AppLogger.info(
+            LogCategory.SOPORTE,
+            "Soporte marcado como vencido",
+            soporte_id=resultado['soporte_id'],
+            empresa_id=resultado['empresa_id']
+        )
+
+
+# ==========================================
+# LEDGER DE CORRIDAS (renewal_runs / renewal_items)
+# ==========================================
+
+# tipo -> (modelo, estado vigente, relaciones a precargar, procesador del lote, campo id del resultado)
+TIPOS_REGISTRO = {
+    'plan': (Suscripcion, 'activa', ('empresa', 'plan'), procesar_lote_planes, 'suscripcion_id'),
+    'soporte': (SoporteSuscripcion, 'activo', ('empresa', 'tipo_soporte'), procesar_lote_soportes, 'soporte_id'),
+}
+
+_items = RenewalItem.__table__
+
+
+def resultados_vacios() -> dict:
+    """Estructura del reporte de ejecución."""
+    return {
+        'planes_renovadas': [],
+        'planes_inactivadas': [],
+        'soportes_renovados': [],
+        'soportes_vencidos': [],
+        'omitidos': [],
+        'errores': []
+    }
+
+
+def combinar_resultados(destino: dict, parcial: dict) -> None:
+    for clave, lista in parcial.items():
+        destino[clave].extend(lista)
 
 
-def inactivar_soporte_suscripcion(soporte: SoporteSuscripcion, dry_run: bool = False) -> dict:
+class LedgerLote:
     """
-    Marca como vencida una suscripción de soporte sin renovación automática.
+    Items de renewal_items reclamados para un lote, indexados por registro_id.
+
+    Cada método agrega un UPDATE (executemany) a la transacción en curso; solo
+    cambia items que siguen 'pendiente', así un item ya cerrado por otro
+    proceso no se sobrescribe.
     """
-    resultado = {
-        'tipo': 'soporte',
-        'soporte_id': soporte.id,
-        'empresa_id': soporte.empresa_id,
-        'empresa_nombre': soporte.empresa.nombre_comercial if soporte.empresa else 'N/A',
-        'tipo_soporte': soporte.tipo_soporte.nombre if soporte.tipo_soporte else 'N/A',
-        'accion': None,
-        'error': None
-    }
-    
-    try:
-        if not dry_run:
-            soporte.estado = 'vencido'
-            soporte.notas = (soporte.notas or '') + f'\n[Vencido automáticamente el {datetime.utcnow().date()}]'
-            db.session.commit()
-            
-            AppLogger.info(
-                LogCategory.SOPORTE,
-                "Soporte marcado como vencido",
-                soporte_id=soporte.id,
-                empresa_id=soporte.empresa_id
+
+    def __init__(self, items: list, campo_id: str):
+        self._item_ids = {item.registro_id: item.id for item in items}
+        self._campo_id = campo_id
+
+    def _actualizar(self, filas: list, **valores) -> None:
+        if not filas:
+            return
+        db.session.execute(
+            update(_items)
+            .where(_items.c.id == bindparam('b_id'), _items.c.estado == 'pendiente')
+            .values(procesado_en=datetime.utcnow(), **valores),
+            filas,
+        )
+
+    def completar(self, renovar: list, inactivar: list) -> None:
+        """Marca como completados los items aplicados (misma transacción que el lote)."""
+        filas = [
+            {
+                'b_id': self._item_ids[resultado[self._campo_id]],
+                'b_accion': 'renovada',
+                'b_nuevo_id': resultado.get('nueva_suscripcion_id') or resultado.get('nuevo_soporte_id'),
+            }
+            for _, resultado, _ in renovar
+        ] + [
+            {
+                'b_id': self._item_ids[resultado[self._campo_id]],
+                'b_accion': 'inactivada' if resultado['tipo'] == 'plan' else 'vencida',
+                'b_nuevo_id': None,
+            }
+            for _, resultado in inactivar
+        ]
+        self._actualizar(filas, estado='completado', accion=bindparam('b_accion'), nuevo_id=bindparam('b_nuevo_id'))
+
+    def fallar(self, errores: list) -> None:
+        """Marca con error los items cuyo resultado tiene error."""
+        filas = [
+            {'b_id': self._item_ids[resultado[self._campo_id]], 'b_error': (resultado['error'] or '')[:500]}
+            for resultado in errores
+        ]
+        self._actualizar(filas, estado='error', error=bindparam('b_error'))
+
+    def omitir(self, registro_ids: list) -> None:
+        """Marca como omitidos los items cuyo registro ya no estaba vigente."""
+        filas = [{'b_id': self._item_ids[registro_id]} for registro_id in registro_ids]
+        self._actualizar(filas, estado='omitido', error='El registro ya no estaba vigente al procesarlo')
+
+
+def planificar_corrida(fecha_limite, dias_anticipacion: int, particiones: int) -> RenewalRun:
+    """
+    Crea una corrida y guarda en renewal_items los registros vencidos con un
+    INSERT ... SELECT por tipo (particion = empresa_id % particiones).
+
+    Se excluyen los registros que ya están pendientes en otra corrida sin
+    terminar, para que dos corridas no compitan por el mismo registro.
+    """
+    run = RenewalRun(
+        estado='en_curso',
+        fecha_limite=fecha_limite,
+        dias_anticipacion=dias_anticipacion,
+        particiones=particiones,
+    )
+    db.session.add(run)
+    db.session.flush()
+
+    for tipo, (modelo, estado, _, _, _) in TIPOS_REGISTRO.items():
+        pendientes = select(RenewalItem.registro_id).where(
+            RenewalItem.tipo == tipo,
+            RenewalItem.estado == 'pendiente'
+        )
+        db.session.execute(
+            insert(_items).from_select(
+                ['run_id', 'tipo', 'registro_id', 'empresa_id', 'particion', 'estado'],
+                select(
+                    literal(run.id), literal(tipo), modelo.id, modelo.empresa_id,
+                    modelo.empresa_id % particiones, literal('pendiente')
+                ).where(
+                    modelo.estado == estado,
+                    modelo.fecha_fin <= fecha_limite,
+                    modelo.id.not_in(pendientes),
+                )
             )
-        
-        resultado['accion'] = 'vencida' if not dry_run else 'vencer (simulado)'
-        return resultado
-        
-    except Exception as e:
-        db.session.rollback()
-        resultado['error'] = str(e)
-        AppLogger.error(
-            LogCategory.SOPORTE,
-            "Error al vencer soporte",
-            exc=e,
-            soporte_id=soporte.id
         )
-        return resultado
+
+    run.total_items = db.session.scalar(
+        select(func.count(RenewalItem.id)).where(RenewalItem.run_id == run.id)
+    )
+    db.session.commit()
+    return run
+
+
+def preparar_reanudacion(run: RenewalRun, particiones: int) -> None:
+    """
+    Prepara una corrida interrumpida para continuarla. Si cambió la cantidad
+    de workers, reparte los items pendientes en las nuevas particiones.
+    """
+    run.reanudado_en = datetime.utcnow()
+    if run.particiones != particiones:
+        db.session.execute(
+            update(_items)
+            .where(_items.c.run_id == run.id, _items.c.estado == 'pendiente')
+            .values(particion=_items.c.empresa_id % particiones)
+        )
+        run.particiones = particiones
+    db.session.commit()
+
+
+def _iniciar_worker():
+    """Inicializador de cada proceso worker: no reutilizar conexiones heredadas del padre."""
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def procesar_particion(run_id: int, particion: int, fecha_limite, tamano_lote: int) -> dict:
+    """
+    Procesa los items pendientes de una partición de la corrida.
+
+    Reclama lotes con SELECT ... FOR UPDATE SKIP LOCKED: si dos procesos
+    trabajan la misma partición (p. ej. dos ejecuciones solapadas) cada uno
+    toma items distintos en lugar de esperar o repetir trabajo. Además el
+    UPDATE del registro vuelve a validar su estado, así que un registro nunca
+    se renueva dos veces.
+
+    Returns:
+        Resultados de la partición (mismo formato que el reporte)
+    """
+    resultados = resultados_vacios()
+    with app.app_context():
+        for tipo, (modelo, estado, relaciones, procesar, campo_id) in TIPOS_REGISTRO.items():
+            opciones = [joinedload(getattr(modelo, relacion)) for relacion in relaciones]
+            while True:
+                items = (
+                    RenewalItem.query
+                    .filter_by(run_id=run_id, tipo=tipo, particion=particion, estado='pendiente')
+                    .order_by(RenewalItem.id)
+                    .limit(tamano_lote)
+                    .with_for_update(skip_locked=True)
+                    .all()
+                )
+                if not items:
+                    break
+
+                registro_ids = [item.registro_id for item in items]
+                lote = (
+                    modelo.query
+                    .options(*opciones)
+                    .filter(
+                        modelo.id.in_(registro_ids),
+                        modelo.estado == estado,
+                        modelo.fecha_fin <= fecha_limite,
+                    )
+                    .order_by(modelo.id)
+                    .all()
+                )
+                vigentes = {registro.id for registro in lote}
+                omitidos = [registro_id for registro_id in registro_ids if registro_id not in vigentes]
+
+                ledger = LedgerLote(items, campo_id)
+                parcial = resultados_vacios()
+                if lote:
+                    procesar(lote, False, parcial, ledger)
+
+                # Errores y omitidos: cierra los items que no se completaron con el lote
+                ledger.fallar(parcial['errores'])
+                ledger.omitir(omitidos)
+                db.session.commit()
+                db.session.expunge_all()
+
+                parcial['omitidos'] = [
+                    {'tipo': tipo, campo_id: registro_id, 'accion': 'omitida', 'error': None}
+                    for registro_id in omitidos
+                ]
+                combinar_resultados(resultados, parcial)
+    return resultados
+
+
+def ejecutar_corrida(run: RenewalRun, tamano_lote: int) -> dict:
+    """
+    Procesa todas las particiones de la corrida: con una sola partición en este
+    proceso, con varias en un proceso worker por partición.
+    """
+    args = [(run.id, particion, run.fecha_limite, tamano_lote) for particion in range(run.particiones)]
+    if len(args) == 1:
+        partes = [procesar_particion(*args[0])]
+    else:
+        with multiprocessing.Pool(len(args), initializer=_iniciar_worker) as pool:
+            partes = pool.starmap(procesar_particion, args)
+
+    resultados = resultados_vacios()
+    for parte in partes:
+        combinar_resultados(resultados, parte)
+    return resultados
 
 
-def ejecutar_renovaciones(dry_run: bool = False, dias_anticipacion: int = 0):
+def finalizar_corrida(run: RenewalRun) -> bool:
+    """
+    Marca la corrida como completada si ya no le quedan items pendientes
+    (un worker caído deja items pendientes y la corrida sigue 'en_curso').
+
+    Returns:
+        True si la corrida quedó completada
+    """
+    # Los items se procesan en otra sesión (o proceso): terminar la transacción
+    # de esta para no contarlos sobre una instantánea anterior (REPEATABLE READ)
+    db.session.commit()
+    conteos = db.session.execute(
+        select(RenewalItem.tipo, RenewalItem.estado, RenewalItem.accion, func.count(RenewalItem.id))
+        .where(RenewalItem.run_id == run.id)
+        .group_by(RenewalItem.tipo, RenewalItem.estado, RenewalItem.accion)
+    ).all()
+    if any(estado == 'pendiente' for _, estado, _, _ in conteos):
+        return False
+
+    run.resumen = {f"{tipo}_{accion or estado}": cantidad for tipo, estado, accion, cantidad in conteos}
+    run.estado = 'completada'
+    run.finalizado_en = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def ejecutar_renovaciones(dry_run: bool = False, dias_anticipacion: int = 0,
+                          tamano_lote: int = TAMANO_LOTE_DEFAULT, workers: int = 1,
+                          run_id: int = None):
     """
     Función principal que revisa y procesa todas las renovaciones.
-    
+
+    En ejecución real primero reanuda las corridas que quedaron 'en_curso' y
+    luego planifica una nueva con los registros vencidos que no estén
+    pendientes en ninguna.
+
     Args:
-        dry_run: Si es True, solo simula sin hacer cambios
+        dry_run: Si es True, solo simula sin hacer cambios (no crea corrida)
         dias_anticipacion: Días de anticipación para renovar antes del vencimiento
+        tamano_lote: Registros por lote (una transacción por lote)
+        workers: Procesos en paralelo (una partición por empresa_id % workers)
+        run_id: Reanudar solo esta corrida, sin planificar una nueva
     """
+    workers = max(1, workers)
     with app.app_context():
         fecha_limite = datetime.utcnow().date() + timedelta(days=dias_anticipacion)
-        
+
         print(f"\n{'='*80}")
         print(f"RENOVACIÓN AUTOMÁTICA DE SUSCRIPCIONES")
         print(f"Fecha: {datetime.utcnow()}")
         print(f"Modo: {'SIMULACIÓN (DRY-RUN)' if dry_run else 'EJECUCIÓN REAL'}")
         print(f"Fecha límite: {fecha_limite} (anticipación: {dias_anticipacion} días)")
+        print(f"Tamaño de lote: {tamano_lote}")
+        if not dry_run:
+            print(f"Workers: {workers}")
         print(f"{'='*80}\n")
-        
-        resultados = {
-            'planes_renovadas': [],
-            'planes_inactivadas': [],
-            'soportes_renovados': [],
-            'soportes_vencidos': [],
-            'errores': []
-        }
-        
-        # ==========================================
-        # 1. PROCESAR SUSCRIPCIONES DE PLAN
-        # ==========================================
-        print("1. Procesando suscripciones de plan...")
-        
-        # Buscar suscripciones activas que vencen
-        suscripciones_vencer = Suscripcion.query.filter(
-            Suscripcion.estado == 'activa',
-            Suscripcion.fecha_fin <= fecha_limite
-        ).all()
-        
-        print(f"   Encontradas: {len(suscripciones_vencer)} suscripciones por vencer\n")
-        
-        for suscripcion in suscripciones_vencer:
-            if suscripcion.renovacion_automatica:
-                resultado = renovar_suscripcion_plan(suscripcion, dry_run)
-                if resultado['error']:
-                    resultados['errores'].append(resultado)
-                else:
-                    resultados['planes_renovadas'].append(resultado)
-                    print(f"   ✓ Renovada: Empresa {resultado['empresa_nombre']} - Plan {resultado['plan_nombre']}")
-            else:
-                resultado = inactivar_suscripcion_plan(suscripcion, dry_run)
-                if resultado['error']:
-                    resultados['errores'].append(resultado)
-                else:
-                    resultados['planes_inactivadas'].append(resultado)
-                    print(f"   ✗ Inactivada: Empresa {resultado['empresa_nombre']} - Plan {resultado['plan_nombre']}")
-        
-        # ==========================================
-        # 2. PROCESAR SUSCRIPCIONES DE SOPORTE
-        # ==========================================
-        print(f"\n2. Procesando suscripciones de soporte...")
-        
-        # Buscar soportes activos que vencen
-        soportes_vencer = SoporteSuscripcion.query.filter(
-            SoporteSuscripcion.estado == 'activo',
-            SoporteSuscripcion.fecha_fin <= fecha_limite
-        ).all()
-        
-        print(f"   Encontradas: {len(soportes_vencer)} suscripciones de soporte por vencer\n")
-        
-        for soporte in soportes_vencer:
-            if soporte.renovacion_automatica:
-                resultado = renovar_soporte_suscripcion(soporte, dry_run)
-                if resultado['error']:
-                    resultados['errores'].append(resultado)
-                else:
-                    resultados['soportes_renovados'].append(resultado)
-                    print(f"   ✓ Renovado: Empresa {resultado['empresa_nombre']} - {resultado['tipo_soporte']}")
+
+        resultados = resultados_vacios()
+        corridas_ids = []
+
+        if dry_run:
+            # ==========================================
+            # 1. PROCESAR SUSCRIPCIONES DE PLAN
+            # ==========================================
+            print("1. Procesando suscripciones de plan...")
+
+            encontradas = contar_vencidos(Suscripcion, 'activa', fecha_limite)
+            print(f"   Encontradas: {encontradas} suscripciones por vencer\n")
+
+            for lote in iterar_lotes(Suscripcion, 'activa', fecha_limite, tamano_lote,
+                                     (Suscripcion.empresa, Suscripcion.plan)):
+                procesar_lote_planes(lote, dry_run, resultados)
+
+            # ==========================================
+            # 2. PROCESAR SUSCRIPCIONES DE SOPORTE
+            # ==========================================
+            print(f"\n2. Procesando suscripciones de soporte...")
+
+            encontradas = contar_vencidos(SoporteSuscripcion, 'activo', fecha_limite)
+            print(f"   Encontradas: {encontradas} suscripciones de soporte por vencer\n")
+
+            for lote in iterar_lotes(SoporteSuscripcion, 'activo', fecha_limite, tamano_lote,
+                                     (SoporteSuscripcion.empresa, SoporteSuscripcion.tipo_soporte)):
+                procesar_lote_soportes(lote, dry_run, resultados)
+        else:
+            # ==========================================
+            # 1. CORRIDAS INTERRUMPIDAS
+            # ==========================================
+            if run_id is not None:
+                run = db.session.get(RenewalRun, run_id)
+                if run is None:
+                    raise ValueError(f"No existe la corrida de renovación #{run_id}")
+                corridas = [run] if run.estado == 'en_curso' else []
+                if not corridas:
+                    print(f"La corrida #{run_id} ya está {run.estado}, no hay nada que reanudar")
             else:
-                resultado = inactivar_soporte_suscripcion(soporte, dry_run)
-                if resultado['error']:
-                    resultados['errores'].append(resultado)
+                corridas = RenewalRun.query.filter_by(estado='en_curso').order_by(RenewalRun.id).all()
+
+            for run in corridas:
+                preparar_reanudacion(run, workers)
+                pendientes = RenewalItem.query.filter_by(run_id=run.id, estado='pendiente').count()
+                print(f"Reanudando corrida #{run.id} (fecha límite {run.fecha_limite}): "
+                      f"{pendientes} de {run.total_items} registros pendientes")
+
+            # ==========================================
+            # 2. NUEVA CORRIDA
+            # ==========================================
+            if run_id is None:
+                run = planificar_corrida(fecha_limite, dias_anticipacion, workers)
+                corridas.append(run)
+                print(f"Corrida #{run.id} planificada: {run.total_items} registros por vencer "
+                      f"en {run.particiones} partición(es)")
+
+            for run in corridas:
+                print(f"\nProcesando corrida #{run.id}...")
+                combinar_resultados(resultados, ejecutar_corrida(run, tamano_lote))
+                corridas_ids.append(run.id)
+                if finalizar_corrida(run):
+                    print(f"   Corrida #{run.id} completada")
                 else:
-                    resultados['soportes_vencidos'].append(resultado)
-                    print(f"   ✗ Vencido: Empresa {resultado['empresa_nombre']} - {resultado['tipo_soporte']}")
-        
+                    print(f"   Corrida #{run.id} quedó con registros pendientes; se reanudará en la próxima ejecución")
+
         # ==========================================
         # RESUMEN
         # ==========================================
@@ -396,39 +855,49 @@ def ejecutar_renovaciones(dry_run: bool = False, dias_anticipacion: int = 0):
         print(f"Planes inactivadas:    {len(resultados['planes_inactivadas'])}")
         print(f"Soportes renovados:    {len(resultados['soportes_renovados'])}")
         print(f"Soportes vencidos:     {len(resultados['soportes_vencidos'])}")
+        print(f"Omitidos:              {len(resultados['omitidos'])}")
         print(f"Errores:               {len(resultados['errores'])}")
         print(f"{'='*80}\n")
-        
+
         if resultados['errores']:
             print("ERRORES:")
             for error in resultados['errores']:
                 print(f"   - {error['tipo']} ID {error.get('suscripcion_id') or error.get('soporte_id')}: {error['error']}")
-        
+
         # Log general
         AppLogger.info(
             LogCategory.SUSCRIPCIONES,
             "Proceso de renovación automática ejecutado",
             dry_run=dry_run,
+            corridas=corridas_ids,
             planes_renovadas=len(resultados['planes_renovadas']),
             planes_inactivadas=len(resultados['planes_inactivadas']),
             soportes_renovados=len(resultados['soportes_renovados']),
             soportes_vencidos=len(resultados['soportes_vencidos']),
+            omitidos=len(resultados['omitidos']),
             errores=len(resultados['errores'])
         )
-        
+
         return resultados
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Renovación automática de suscripciones')
     parser.add_argument('--dry-run', action='store_true', help='Simular sin hacer cambios')
-    parser.add_argument('--dias-anticipacion', type=int, default=0, 
+    parser.add_argument('--dias-anticipacion', type=int, default=0,
                        help='Días de anticipación para renovar (default: 0)')
-    
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_DEFAULT,
+                       help=f'Registros por lote/transacción (default: {TAMANO_LOTE_DEFAULT})')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Procesos en paralelo, uno por partición de empresas (default: 1)')
+    parser.add_argument('--run-id', type=int, default=None,
+                       help='Reanudar solo esta corrida, sin planificar una nueva')
+
     args = parser.parse_args()
-    
+
     try:
-        ejecutar_renovaciones(dry_run=args.dry_run, dias_anticipacion=args.dias_anticipacion)
+        ejecutar_renovaciones(dry_run=args.dry_run, dias_anticipacion=args.dias_anticipacion,
+                              tamano_lote=args.tamano_lote, workers=args.workers, run_id=args.run_id)
         sys.exit(0)
     except Exception as e:
         print(f"\n❌ ERROR CRÍTICO: {str(e)}")
@@ -0,0 +1,149 @@
+"""
+Caché de verificación de API Keys.
+
+bcrypt (12 rounds) cuesta ~250 ms de CPU por cada key candidata. Este caché
+recuerda qué API key en texto plano ya fue verificada contra qué registro,
+indexando por un HMAC-SHA256 de la key presentada (nunca se guarda la key
+en texto plano ni el hash bcrypt como índice).
+
+El caché NO reemplaza la consulta a base de datos: en cada request se siguen
+cargando las keys activas de la empresa/código, y una entrada del caché solo
+se acepta si el registro sigue activo, no expirado y con el mismo hash. Así una
+key revocada, rotada o expirada desde otro worker queda invalidada de inmediato.
+"""
+import hashlib
+import hmac
+import secrets
+from typing import Iterable, Optional, Tuple
+
+from utils.api_key_crypto import verificar_api_key
+from utils.ttl_cache import TTLCache
+
+
+class ApiKeyVerificationCache:
+    """
+    Caché LRU acotado con TTL de verificaciones bcrypt exitosas.
+
+    Cada entrada: digest -> (api_key_id, empresa_id, api_key_hash)
+    """
+
+    def __init__(self, *, ttl: int, max_size: int, secret: Optional[bytes] = None) -> None:
+        # Secreto por proceso: los digests no sirven fuera de este worker
+        self._secret = secret or secrets.token_bytes(32)
+        self._entries = TTLCache("api_key_verification", max_size=max_size, ttl=ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return self._entries.enabled
+
+    def digest(self, api_key: str, empresa_id: int, codigo: str) -> str:
+        """Calcula el HMAC-SHA256 de la key presentada junto con su contexto."""
+        mensaje = f"{empresa_id}:{codigo}:{api_key}".encode('utf-8')
+        return hmac.new(self._secret, mensaje, hashlib.sha256).hexdigest()
+
+    def get(self, digest: str) -> Optional[Tuple[int, str]]:
+        """Retorna (api_key_id, api_key_hash) si la entrada existe y no ha expirado."""
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        api_key_id, _empresa_id, api_key_hash = entry
+        return api_key_id, api_key_hash
+
+    def store(self, digest: str, api_key_id: int, empresa_id: int, api_key_hash: str) -> None:
+        """Registra una verificación exitosa, desalojando la entrada más antigua si se llena."""
+        self._entries.set(digest, (api_key_id, empresa_id, api_key_hash))
+
+    def discard(self, digest: str) -> None:
+        self._entries.pop(digest)
+
+    def invalidate_api_key(self, api_key_id: int) -> int:
+        """Elimina todas las entradas asociadas a una API key. Retorna cuántas se eliminaron."""
+        return self._entries.remove_where(lambda _digest, entry: entry[0] == api_key_id)
+
+    def invalidate_empresa(self, empresa_id: int) -> int:
+        """Elimina todas las entradas de una empresa. Retorna cuántas se eliminaron."""
+        return self._entries.remove_where(lambda _digest, entry: entry[1] == empresa_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def buscar_api_key_valida(api_key: str, empresa_id: int, codigo: str, candidatos: Iterable):
+    """
+    Busca entre las API keys candidatas (activas, de la empresa y código) la que
+    coincide con la key presentada, usando el caché antes de recurrir a bcrypt.
+
+    Args:
+        api_key: API key en texto plano recibida en el request
+        empresa_id: ID de la empresa del header X-Empresa-Id
+        codigo: Código (scope) del header X-Code-API
+        candidatos: Registros ApiKey activos de la empresa con ese código
+
+    Returns:
+        ApiKey | None: El registro válido o None si ninguno coincide
+    """
+    vigentes = [k for k in candidatos if not k.esta_expirada()]
+    if not vigentes:
+        return None
+
+    cache = get_api_key_cache()
+    digest = None
+    if cache is not None and cache.enabled:
+        digest = cache.digest(api_key, empresa_id, codigo)
+        cached = cache.get(digest)
+        if cached is not None:
+            api_key_id, api_key_hash = cached
+            for key_record in vigentes:
+                if key_record.id == api_key_id and key_record.api_key_hash == api_key_hash:
+                    return key_record
+            # El registro fue revocado, rotado o expiró
+            cache.discard(digest)
+
+    for key_record in vigentes:
+        if verificar_api_key(api_key, key_record.api_key_hash):
+            if digest is not None:
+                cache.store(digest, key_record.id, key_record.empresa_id, key_record.api_key_hash)
+            return key_record
+
+    return None
+
+
+def invalidar_api_key_cache(api_key_id: int) -> None:
+    """Invalida las verificaciones cacheadas de una API key (revocación, rotación, expiración)."""
+    cache = get_api_key_cache()
+    if cache is not None:
+        cache.invalidate_api_key(api_key_id)
+
+
+def init_api_key_cache(app) -> None:
+    """
+    Inicializa el caché de verificación de API keys con la configuración de la aplicación.
+
+    Args:
+        app: Instancia de Flask
+    """
+    cache = ApiKeyVerificationCache(
+        ttl=int(app.config.get("API_KEY_CACHE_TTL", 300)),
+        max_size=int(app.config.get("API_KEY_CACHE_MAX_SIZE", 1024)),
+    )
+    app.extensions["api_key_cache"] = cache
+
+
+def get_api_key_cache() -> Optional[ApiKeyVerificationCache]:
+    """
+    Obtiene la instancia del caché desde Flask.
+
+    Returns:
+        ApiKeyVerificationCache o None si no hay app activa o no se inicializó
+    """
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("api_key_cache")
@@ -0,0 +1,156 @@
+"""
+Acumulador de uso de API Keys.
+
+En lugar de hacer UPDATE + COMMIT sobre api_keys en cada request autorizado,
+los decoradores registran el uso en memoria y un hilo en segundo plano vuelca
+los datos acumulados (último uso y número de requests por key) en un único
+UPDATE masivo cada N segundos y al apagar el worker.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, update
+
+from utils.logger import Logger
+
+
+class ApiKeyUsageTracker:
+    """
+    Acumula por api_key_id el timestamp más reciente y la cantidad de usos
+    pendientes de persistir.
+    """
+
+    def __init__(self, app, *, flush_interval: float) -> None:
+        self._app = app
+        self._flush_interval = float(flush_interval)
+        self._pending: Dict[int, Tuple[datetime, int]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def record(self, api_key_id: int, when: datetime) -> None:
+        """Registra un uso de la API key (sin tocar la base de datos)."""
+        with self._lock:
+            ultimo, total = self._pending.get(api_key_id, (when, 0))
+            self._pending[api_key_id] = (max(ultimo, when), total + 1)
+
+        if self._flush_interval <= 0:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Persiste los usos acumulados en un solo UPDATE.
+
+        Returns:
+            int: Número de API keys actualizadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            from database.db import db
+            from models.api_key import ApiKey
+
+            ids = list(batch.keys())
+            stmt = (
+                update(ApiKey)
+                .where(ApiKey.id.in_(ids))
+                .values(
+                    ultimo_uso=case({k: v[0] for k, v in batch.items()}, value=ApiKey.id),
+                    total_usos=ApiKey.total_usos + case({k: v[1] for k, v in batch.items()}, value=ApiKey.id),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            try:
+                with self._app.app_context():
+                    with db.engine.begin() as conn:
+                        conn.execute(stmt)
+                return len(ids)
+            except Exception as e:
+                # Reintegrar el lote para el siguiente ciclo
+                with self._lock:
+                    for api_key_id, (ultimo, total) in batch.items():
+                        actual = self._pending.get(api_key_id)
+                        if actual:
+                            self._pending[api_key_id] = (max(actual[0], ultimo), actual[1] + total)
+                        else:
+                            self._pending[api_key_id] = (ultimo, total)
+                Logger.add_to_log("error", f"Error al volcar uso de API keys ({len(ids)} keys): {e}")
+                return 0
+
+    def stop(self) -> None:
+        """Detiene el hilo de volcado y persiste lo pendiente."""
+        self._stop_event.set()
+        self.flush()
+
+    def _ensure_thread(self) -> None:
+        # Se arranca perezosamente y por PID: los workers de gunicorn pueden
+        # heredar la instancia vía fork sin heredar el hilo
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+                return
+            self._pid = pid
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="api-key-usage-flusher", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self._flush_interval):
+            self.flush()
+
+
+def init_api_key_usage_tracker(app) -> None:
+    """
+    Inicializa el acumulador de uso de API keys y registra el volcado al apagar.
+
+    Args:
+        app: Instancia de Flask
+    """
+    tracker = ApiKeyUsageTracker(
+        app,
+        flush_interval=float(app.config.get("API_KEY_USAGE_FLUSH_INTERVAL", 30)),
+    )
+    app.extensions["api_key_usage"] = tracker
+    atexit.register(tracker.stop)
+
+
+def registrar_uso_api_key(api_key_id: int) -> None:
+    """
+    Registra el uso de una API key. Si el acumulador no está inicializado,
+    escribe directamente (comportamiento anterior).
+    """
+    from flask import current_app
+    from models.api_key import get_colombia_now
+
+    tracker = current_app.extensions.get("api_key_usage")
+    if tracker is not None:
+        tracker.record(api_key_id, get_colombia_now())
+        return
+
+    from database.db import db
+    from models.api_key import ApiKey
+
+    db.session.execute(
+        update(ApiKey)
+        .where(ApiKey.id == api_key_id)
+        .values(ultimo_uso=get_colombia_now(), total_usos=ApiKey.total_usos + 1)
+    )
+    db.session.commit()
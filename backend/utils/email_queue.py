@@ -0,0 +1,587 @@
+"""
+Envío de emails en segundo plano.
+
+El request solo inserta el mensaje en la tabla email_jobs (persistente: los
+pendientes sobreviven a reinicios) y responde. Uno o más hilos por proceso
+(EMAIL_QUEUE_WORKERS) toman los jobs vencidos y los envían reutilizando
+conexiones SMTP ya autenticadas (SMTPConnectionPool): STARTTLS y login se hacen
+una vez por conexión, no por email.
+
+- Reintentos: ante un error temporal el job vuelve a 'pendiente' con espera
+  exponencial (EMAIL_RETRY_BASE_SECONDS * 2^(intento-1), tope
+  EMAIL_RETRY_MAX_SECONDS, con jitter) hasta max_intentos; los rechazos
+  permanentes (códigos 5xx, destinatario inválido) pasan directo a 'fallido'.
+- Varios procesos: cada job se reclama justo antes de enviarlo con un UPDATE
+  condicional y un lease (bloqueado_hasta); si el worker muere, el job vuelve
+  a 'pendiente' al vencer. El resultado solo se guarda si el lease sigue
+  siendo el propio, así un envío lento no pisa el estado de otro worker.
+- Hooks de fallo: un job puede llevar una referencia '<prefijo>:<dato>'; si
+  termina 'fallido' se llama al handler registrado con on_failure(prefijo)
+  (p. ej. el servicio OTP invalida el código que no se pudo entregar).
+- EMAIL_BACKEND=fake usa FakeSMTPTransport, que guarda los mensajes en memoria
+  (tests y desarrollo sin servidor SMTP).
+
+Los hilos se inician con el primer request de cada worker de gunicorn; con
+EMAIL_QUEUE_WORKERS=0 los envía solo un proceso aparte: `flask email worker`.
+"""
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+
+from utils.logger import Logger
+
+# Excepciones SMTP que no se resuelven reintentando
+_ERRORES_PERMANENTES = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)
+# Excepciones de conexión: se descarta la conexión y se reintenta una vez con otra
+_ERRORES_CONEXION = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError, ssl.SSLError)
+
+
+def _es_permanente(error: Exception) -> bool:
+    """Rechazos definitivos: destinatario/remitente inválido o respuesta 5xx (salvo autenticación)."""
+    if isinstance(error, _ERRORES_PERMANENTES):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+# ------------------------------------------------------------------ transporte
+
+class SMTPConnectionPool:
+    """
+    Conexiones SMTP autenticadas reutilizables. Antes de usar una conexión
+    ociosa por más de check_after segundos se verifica con NOOP; se cierran las
+    que superan max_idle segundos o max_messages envíos.
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = True,
+        use_ssl: bool = False,
+        timeout: float = 30,
+        size: int = 2,
+        max_idle: float = 240,
+        check_after: float = 30,
+        max_messages: int = 100,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.size = max(1, size)
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.max_messages = max(1, max_messages)
+        self._idle: List[list] = []  # [conexión, último uso (monotonic), envíos]
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                conn.starttls(context=ssl.create_default_context())
+        if self.username:
+            conn.login(self.username, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+
+    @staticmethod
+    def _close(conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:  # noqa: BLE001 - la conexión ya puede estar cerrada
+            try:
+                conn.close()
+            except Exception:  # noqa: BLE001
+                pass
+
+    def acquire(self) -> list:
+        """Conexión lista para enviar: una ociosa válida o una nueva."""
+        ahora = time.monotonic()
+        while True:
+            with self._lock:
+                entrada = self._idle.pop() if self._idle else None
+            if entrada is None:
+                return [self._connect(), ahora, 0]
+            conn, ultimo_uso, _ = entrada
+            if ahora - ultimo_uso > self.max_idle:
+                self._close(conn)
+                continue
+            if ahora - ultimo_uso > self.check_after:
+                try:
+                    if conn.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP rechazado")
+                except Exception:  # noqa: BLE001
+                    self._close(conn)
+                    continue
+            return entrada
+
+    def release(self, entrada: list, *, broken: bool = False) -> None:
+        entrada[1] = time.monotonic()
+        if broken or entrada[2] >= self.max_messages:
+            self._close(entrada[0])
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(entrada)
+                return
+        self._close(entrada[0])
+
+    def close_all(self) -> None:
+        with self._lock:
+            entradas, self._idle = self._idle, []
+        for conn, _, _ in entradas:
+            self._close(conn)
+
+
+class SMTPTransport:
+    """Envía mensajes por SMTP reutilizando las conexiones del pool."""
+
+    def __init__(self, pool: SMTPConnectionPool) -> None:
+        self.pool = pool
+
+    def send(self, message: MIMEMultipart) -> None:
+        for intento in range(2):
+            entrada = self.pool.acquire()
+            try:
+                entrada[0].send_message(message)
+            except _ERRORES_CONEXION:
+                # Conexión cerrada por el servidor: se reintenta una vez con una nueva
+                self.pool.release(entrada, broken=True)
+                if intento:
+                    raise
+                continue
+            except Exception:
+                self.pool.release(entrada, broken=True)
+                raise
+            entrada[2] += 1
+            self.pool.release(entrada)
+            return
+
+    def close(self) -> None:
+        self.pool.close_all()
+
+
+class FakeSMTPTransport:
+    """
+    Sumidero en memoria con la misma interfaz que SMTPTransport (EMAIL_BACKEND=fake).
+    fail_next(n, error) hace fallar los siguientes n envíos para probar reintentos.
+    """
+
+    def __init__(self) -> None:
+        self.messages: List[MIMEMultipart] = []
+        self._fallos: List[Exception] = []
+        self._lock = threading.Lock()
+
+    def fail_next(self, n: int = 1, error: Optional[Exception] = None) -> None:
+        with self._lock:
+            self._fallos.extend([error or smtplib.SMTPServerDisconnected("fallo simulado")] * n)
+
+    def send(self, message: MIMEMultipart) -> None:
+        with self._lock:
+            if self._fallos:
+                raise self._fallos.pop(0)
+            self.messages.append(message)
+
+    def outbox(self, to: Optional[str] = None) -> List[MIMEMultipart]:
+        with self._lock:
+            return [m for m in self.messages if to is None or m["To"] == to]
+
+    def close(self) -> None:
+        pass
+
+
+# ----------------------------------------------------------------------- cola
+
+class EmailQueue:
+    """Cola persistente (tabla email_jobs) y los hilos que la procesan en este proceso."""
+
+    def __init__(
+        self,
+        app,
+        transport,
+        *,
+        sender: str,
+        configured: bool = True,
+        workers: int = 1,
+        poll_interval: float = 5,
+        batch_size: int = 20,
+        max_attempts: int = 5,
+        retry_base: float = 30,
+        retry_max: float = 3600,
+        lease_seconds: float = 120,
+        retention_days: int = 7,
+    ) -> None:
+        self._app = app
+        self.transport = transport
+        self.sender = sender
+        self.configured = configured
+        self.workers = max(0, int(workers))
+        self.poll_interval = float(poll_interval)
+        self.batch_size = max(1, int(batch_size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base = float(retry_base)
+        self.retry_max = float(retry_max)
+        self.lease_seconds = float(lease_seconds)
+        self.retention_days = int(retention_days)
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._proxima_purga = 0.0
+        self._al_fallar: Dict[str, Callable[[str], None]] = {}
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def _tabla(self):
+        from models.email_job import EmailJob
+
+        return EmailJob.__table__
+
+    @contextmanager
+    def _begin(self):
+        from database.db import db
+
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                yield conn
+
+    # ------------------------------------------------------------- encolar
+
+    def on_failure(self, prefix: str, handler: Callable[[str], None]) -> None:
+        """
+        Registra handler(dato) para los jobs con referencia '<prefix>:<dato>'
+        que terminan en 'fallido'. Se ejecuta con contexto de la app.
+        """
+        self._al_fallar[prefix] = handler
+
+    def enqueue(self, to: str, subject: str, text: Optional[str], html: Optional[str] = None,
+                *, max_attempts: Optional[int] = None, reference: Optional[str] = None) -> int:
+        """
+        Guarda el email para envío en segundo plano (transacción propia).
+
+        Args:
+            reference: '<prefijo>:<dato>' para el hook de fallo (ver on_failure)
+
+        Returns:
+            int: id del job
+        """
+        ahora = datetime.utcnow()
+        with self._begin() as conn:
+            resultado = conn.execute(
+                insert(self._tabla).values(
+                    destinatario=to,
+                    asunto=subject,
+                    cuerpo_texto=text,
+                    cuerpo_html=html,
+                    estado="pendiente",
+                    intentos=0,
+                    max_intentos=max_attempts or self.max_attempts,
+                    proximo_intento=ahora,
+                    creado_en=ahora,
+                    referencia=reference,
+                )
+            )
+            job_id = resultado.inserted_primary_key[0]
+        self._ensure_threads()
+        self._wakeup.set()
+        return job_id
+
+    # ------------------------------------------------------------ procesar
+
+    def _vencidos(self, limite: int) -> List[int]:
+        """Ids de hasta `limite` jobs pendientes vencidos (recupera los leases vencidos)."""
+        t = self._tabla
+        ahora = datetime.utcnow()
+        with self._begin() as conn:
+            # Jobs de workers caídos: el lease venció sin que terminaran
+            conn.execute(
+                update(t)
+                .where(t.c.estado == "enviando", t.c.bloqueado_hasta < ahora)
+                .values(estado="pendiente", bloqueado_hasta=None)
+            )
+            return conn.execute(
+                select(t.c.id)
+                .where(t.c.estado == "pendiente", t.c.proximo_intento <= ahora)
+                .order_by(t.c.proximo_intento)
+                .limit(limite)
+            ).scalars().all()
+
+    def _reclamar(self, job_id: int) -> Optional[Dict]:
+        """
+        Marca el job como 'enviando' con un lease que empieza ahora (justo antes
+        de enviarlo, no al leer el lote) y lo retorna; None si otro worker lo tomó.
+        """
+        t = self._tabla
+        # Sin microsegundos: el lease se compara por igualdad y DATETIME los redondea
+        lease = (datetime.utcnow() + timedelta(seconds=self.lease_seconds)).replace(microsecond=0)
+        with self._begin() as conn:
+            # UPDATE condicional: si otro worker lo tomó primero, rowcount es 0
+            tomado = conn.execute(
+                update(t)
+                .where(t.c.id == job_id, t.c.estado == "pendiente")
+                .values(estado="enviando", intentos=t.c.intentos + 1, bloqueado_hasta=lease)
+            ).rowcount
+            if not tomado:
+                return None
+            return dict(conn.execute(select(t).where(t.c.id == job_id)).mappings().first())
+
+    def _cerrar(self, job: Dict, **valores) -> bool:
+        """
+        Actualiza el job solo si sigue siendo nuestro ('enviando' con el mismo
+        lease); si el lease venció y otro worker lo tomó no se toca su estado.
+        """
+        t = self._tabla
+        with self._begin() as conn:
+            propio = conn.execute(
+                update(t)
+                .where(t.c.id == job["id"], t.c.estado == "enviando", t.c.bloqueado_hasta == job["bloqueado_hasta"])
+                .values(bloqueado_hasta=None, **valores)
+            ).rowcount
+        if not propio:
+            Logger.add_to_log("warn", f"Email {job['id']}: el lease venció durante el envío, otro worker lo tomó")
+        return bool(propio)
+
+    def _mensaje(self, job: Dict) -> MIMEMultipart:
+        message = MIMEMultipart("alternative")
+        message["From"] = self.sender
+        message["To"] = job["destinatario"]
+        message["Subject"] = job["asunto"]
+        if job["cuerpo_texto"]:
+            message.attach(MIMEText(job["cuerpo_texto"], "plain", "utf-8"))
+        if job["cuerpo_html"]:
+            message.attach(MIMEText(job["cuerpo_html"], "html", "utf-8"))
+        return message
+
+    def _espera_reintento(self, intentos: int) -> float:
+        espera = min(self.retry_max, self.retry_base * (2 ** max(0, intentos - 1)))
+        return espera * random.uniform(0.8, 1.2)
+
+    def _enviar(self, job: Dict) -> None:
+        ahora = datetime.utcnow()
+        try:
+            self.transport.send(self._mensaje(job))
+        except Exception as e:  # noqa: BLE001 - cualquier error se registra en el job
+            error = f"{type(e).__name__}: {e}"[:500]
+            definitivo = _es_permanente(e) or job["intentos"] >= job["max_intentos"]
+            if definitivo:
+                valores = {"estado": "fallido", "cuerpo_texto": None, "cuerpo_html": None}
+                with self._lock:
+                    self.failed += 1
+                Logger.add_to_log(
+                    "error",
+                    f"Email {job['id']} a {job['destinatario']} descartado tras {job['intentos']} intentos: {error}",
+                )
+            else:
+                espera = self._espera_reintento(job["intentos"])
+                valores = {"estado": "pendiente", "proximo_intento": ahora + timedelta(seconds=espera)}
+                with self._lock:
+                    self.retried += 1
+                Logger.add_to_log(
+                    "warn",
+                    f"Email {job['id']} a {job['destinatario']} falló (intento {job['intentos']}), "
+                    f"reintento en {int(espera)}s: {error}",
+                )
+            if self._cerrar(job, ultimo_error=error, **valores) and definitivo:
+                self._notificar_fallo(job)
+            return
+
+        self._cerrar(job, estado="enviado", enviado_en=ahora, cuerpo_texto=None, cuerpo_html=None)
+        with self._lock:
+            self.sent += 1
+
+    def _notificar_fallo(self, job: Dict) -> None:
+        """Llama al handler registrado para la referencia del job fallido, si hay."""
+        prefijo, _, dato = (job.get("referencia") or "").partition(":")
+        handler = self._al_fallar.get(prefijo)
+        if handler is None:
+            return
+        try:
+            with self._app.app_context():
+                handler(dato)
+        except Exception as e:  # noqa: BLE001 - el fallo del hook no afecta la cola
+            Logger.add_to_log("error", f"Error en el hook de fallo del email {job['id']} ({prefijo}): {e}")
+
+    def process_pending(self, limit: Optional[int] = None) -> int:
+        """
+        Envía los jobs vencidos (hasta `limit`, por lotes de batch_size).
+
+        Returns:
+            int: Número de jobs procesados (enviados o no)
+        """
+        procesados = 0
+        while limit is None or procesados < limit:
+            ids = self._vencidos(min(self.batch_size, (limit - procesados) if limit else self.batch_size))
+            if not ids:
+                break
+            for job_id in ids:
+                # Cada job se reclama justo antes de enviarlo: un lote lento no
+                # deja vencer el lease de los últimos mientras espera su turno
+                job = self._reclamar(job_id)
+                if job is not None:
+                    self._enviar(job)
+                    procesados += 1
+        self._purgar()
+        return procesados
+
+    def _purgar(self) -> None:
+        """Elimina (como mucho una vez por hora) los jobs terminados más antiguos que retention_days."""
+        if self.retention_days <= 0 or time.monotonic() < self._proxima_purga:
+            return
+        self._proxima_purga = time.monotonic() + 3600
+        t = self._tabla
+        limite = datetime.utcnow() - timedelta(days=self.retention_days)
+        with self._begin() as conn:
+            conn.execute(delete(t).where(t.c.estado.in_(("enviado", "fallido")), t.c.creado_en < limite))
+
+    # ---------------------------------------------------------------- hilos
+
+    def _ensure_threads(self) -> None:
+        # Por PID: los workers de gunicorn heredan la instancia vía fork sin los hilos
+        pid = os.getpid()
+        if self.workers == 0 or self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._stop_event.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"email-queue-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for hilo in self._threads:
+                hilo.start()
+
+    def start(self) -> None:
+        """Inicia los hilos de envío de este proceso (también se inician al encolar)."""
+        self._ensure_threads()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.process_pending()
+            except Exception as e:  # noqa: BLE001 - el hilo de envío no debe morir
+                Logger.add_to_log("error", f"Error procesando la cola de emails: {e}")
+            # Despierta al encolar en este proceso; los jobs de otros procesos
+            # o con reintento programado se toman en el siguiente sondeo
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def run_forever(self) -> None:
+        """Procesa la cola en primer plano (proceso dedicado: flask email worker)."""
+        try:
+            while not self._stop_event.is_set():
+                if not self.process_pending():
+                    self._stop_event.wait(self.poll_interval)
+        finally:
+            self.transport.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wakeup.set()
+        for hilo in self._threads:
+            hilo.join(timeout=5)
+        self.transport.close()
+
+    def stats(self) -> Dict:
+        """Contadores de este proceso y jobs por estado en la tabla."""
+        t = self._tabla
+        with self._begin() as conn:
+            por_estado = dict(conn.execute(select(t.c.estado, func.count()).group_by(t.c.estado)).all())
+            vencidos = conn.execute(
+                select(func.count()).select_from(t).where(
+                    or_(
+                        and_(t.c.estado == "pendiente", t.c.proximo_intento <= datetime.utcnow()),
+                        and_(t.c.estado == "enviando", t.c.bloqueado_hasta < datetime.utcnow()),
+                    )
+                )
+            ).scalar()
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "sent": self.sent,
+                "failed": self.failed,
+                "retried": self.retried,
+                "jobs": por_estado,
+                "due": vencidos,
+            }
+
+
+def init_email_queue(app) -> None:
+    """
+    Inicializa la cola de emails con la configuración de la aplicación.
+
+    Args:
+        app: Instancia de Flask
+    """
+    backend = (app.config.get("EMAIL_BACKEND") or "smtp").lower()
+    if backend == "fake":
+        transport = FakeSMTPTransport()
+    else:
+        port = int(app.config.get("SMTP_PORT", 587))
+        transport = SMTPTransport(SMTPConnectionPool(
+            host=app.config.get("SMTP_SERVER", "smtp.gmail.com"),
+            port=port,
+            username=app.config.get("SMTP_USERNAME", ""),
+            password=app.config.get("SMTP_PASSWORD", ""),
+            use_ssl=port == 465,
+            use_tls=port != 465,
+            size=max(1, int(app.config.get("EMAIL_QUEUE_WORKERS", 1))),
+        ))
+
+    nombre = app.config.get("SENDER_NAME") or ""
+    correo = app.config.get("SENDER_EMAIL") or app.config.get("SMTP_USERNAME") or ""
+    queue = EmailQueue(
+        app,
+        transport,
+        sender=f"{nombre} <{correo}>" if nombre else correo,
+        configured=backend == "fake" or bool(app.config.get("SMTP_USERNAME") and correo),
+        workers=int(app.config.get("EMAIL_QUEUE_WORKERS", 1)),
+        poll_interval=float(app.config.get("EMAIL_QUEUE_POLL_INTERVAL", 5)),
+        max_attempts=int(app.config.get("EMAIL_MAX_ATTEMPTS", 5)),
+        retry_base=float(app.config.get("EMAIL_RETRY_BASE_SECONDS", 30)),
+        retry_max=float(app.config.get("EMAIL_RETRY_MAX_SECONDS", 3600)),
+    )
+    app.extensions["email_queue"] = queue
+    # Los hilos arrancan con el primer request de cada worker (no en comandos CLI)
+    app.before_request(queue.start)
+
+
+def get_email_queue() -> Optional[EmailQueue]:
+    """
+    Obtiene la cola de emails desde Flask.
+
+    Returns:
+        EmailQueue o None si no hay app activa
+    """
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("email_queue")
@@ -0,0 +1,83 @@
+"""
+Registro de plantillas de email (templates/emails) compiladas con Jinja2.
+
+Cada plantilla se lee y compila una sola vez por proceso y queda en memoria;
+con EMAIL_TEMPLATES_AUTO_RELOAD=true (desarrollo) Jinja revisa el mtime del
+archivo en cada uso y la recompila si cambió. Un email se compone de
+<nombre>.html (con autoescape: los datos del usuario no pueden inyectar HTML)
+y, si existe, <nombre>.txt para la parte de texto plano.
+
+Se configura por variables de entorno porque lo usan también los scripts
+(scripts/preview_email_template.py) sin crear la app Flask.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
+
+TEMPLATES_DIR = Path(__file__).parent.parent / 'templates' / 'emails'
+
+
+class EmailTemplateRegistry:
+    """Plantillas de email compiladas (caché de Jinja, recarga por mtime opcional)."""
+
+    def __init__(self, directory: Path = TEMPLATES_DIR, *, auto_reload: bool = False) -> None:
+        self.directory = Path(directory)
+        self._env = Environment(
+            loader=FileSystemLoader(str(self.directory), encoding='utf-8'),
+            autoescape=select_autoescape(enabled_extensions=('html',), default_for_string=False),
+            auto_reload=auto_reload,
+            cache_size=-1,  # Sin límite: son pocas plantillas
+            keep_trailing_newline=True,
+        )
+
+    def render(self, template_name: str, **context) -> str:
+        """
+        Renderiza una plantilla (ej: 'otp_code.html').
+
+        Raises:
+            FileNotFoundError: Si la plantilla no existe
+        """
+        try:
+            template = self._env.get_template(template_name)
+        except TemplateNotFound:
+            raise FileNotFoundError(f"Plantilla de email no encontrada: {self.directory / template_name}")
+        return template.render(**context)
+
+    def render_email(self, name: str, **context) -> Tuple[str, Optional[str]]:
+        """
+        Renderiza la parte HTML (<name>.html) y la de texto (<name>.txt, si existe).
+
+        Returns:
+            Tupla (html, texto o None)
+        """
+        html = self.render(f"{name}.html", **context)
+        try:
+            text = self.render(f"{name}.txt", **context)
+        except FileNotFoundError:
+            text = None
+        return html, text
+
+    def precompile(self) -> int:
+        """Compila por adelantado todas las plantillas del directorio. Retorna cuántas."""
+        nombres = [n for n in self._env.list_templates() if n.endswith(('.html', '.txt'))]
+        for nombre in nombres:
+            self._env.get_template(nombre)
+        return len(nombres)
+
+
+_registry: Optional[EmailTemplateRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_email_templates() -> EmailTemplateRegistry:
+    """Registro compartido del proceso (EMAIL_TEMPLATES_AUTO_RELOAD desde el entorno)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                auto_reload = os.environ.get('EMAIL_TEMPLATES_AUTO_RELOAD', 'false').lower() in ('true', '1', 'yes')
+                _registry = EmailTemplateRegistry(auto_reload=auto_reload)
+    return _registry
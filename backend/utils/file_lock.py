@@ -0,0 +1,50 @@
+"""
+Bloqueo exclusivo entre procesos sobre un archivo (fcntl en Linux/macOS, msvcrt en Windows).
+
+Se usa para que un solo worker de gunicorn haga tareas sobre archivos compartidos:
+extracción de la base de ciudades, generación de shards y rotación de logs.
+"""
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(lock_path, *, blocking: bool = True):
+    """
+    Bloqueo exclusivo entre procesos (workers de gunicorn) sobre un archivo.
+
+    Con blocking=False no espera: produce False si otro proceso tiene el bloqueo.
+    """
+    with open(lock_path, "a+b") as fh:
+        adquirido = True
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                adquirido = False
+        else:  # pragma: no cover
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not blocking:
+                        adquirido = False
+                        break
+                    time.sleep(0.1)
+        try:
+            yield adquirido
+        finally:
+            if adquirido:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+                else:  # pragma: no cover
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
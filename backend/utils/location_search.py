@@ -0,0 +1,208 @@
+"""
+Índice de búsqueda en memoria para países y ciudades.
+
+Cada nombre se indexa por su forma plegada (minúsculas, sin tildes) desde el
+inicio de cada palabra, en arreglos ordenados: una búsqueda por prefijo es un
+bisect sobre el arreglo (global o del país). Si no hay suficientes
+coincidencias exactas se toleran errores de tipeo con una distancia de edición
+acotada sobre el prefijo. Los resultados se ordenan por tipo de coincidencia,
+población y nombre.
+"""
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Máximo de candidatos evaluados por distancia de edición
+FUZZY_MAX_CANDIDATES = 2000
+# Prefijos de hasta este largo se resuelven una vez y se recuerdan
+SHORT_PREFIX_LENGTH = 2
+SHORT_PREFIX_RESULTS = 50
+
+_PALABRA_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+def plegar(texto: str) -> str:
+    """Minúsculas sin tildes ni signos: 'Bogotá D.C.' -> 'bogota d c'."""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", texto or "") if not unicodedata.combining(c)
+    )
+    return " ".join(_PALABRA_RE.findall(sin_tildes.casefold()))
+
+
+def distancia_prefijo(consulta: str, clave: str, maximo: int) -> int:
+    """
+    Distancia de edición (Levenshtein) entre la consulta y el mejor prefijo de la
+    clave, cortando en cuanto supera el máximo. Retorna maximo + 1 si lo excede.
+    """
+    n = len(consulta)
+    clave = clave[:n + maximo]
+    anterior = list(range(n + 1))
+    mejor = anterior[n]
+    for j, c in enumerate(clave, 1):
+        actual = [j] + [0] * n
+        minimo_fila = j
+        for i in range(1, n + 1):
+            costo = 0 if consulta[i - 1] == c else 1
+            actual[i] = min(anterior[i] + 1, actual[i - 1] + 1, anterior[i - 1] + costo)
+            if actual[i] < minimo_fila:
+                minimo_fila = actual[i]
+        if minimo_fila > maximo:
+            return maximo + 1
+        mejor = min(mejor, actual[n])
+        anterior = actual
+    return mejor if mejor <= maximo else maximo + 1
+
+
+def _tolerancia(consulta: str) -> int:
+    if len(consulta) < 4:
+        return 0
+    return 1 if len(consulta) < 8 else 2
+
+
+class _ArregloOrdenado:
+    """Claves plegadas ordenadas con el id de la entrada y si es inicio del nombre."""
+
+    def __init__(self, pares: List[Tuple[str, int, bool]]) -> None:
+        pares.sort()
+        self.claves = [p[0] for p in pares]
+        self.ids = [p[1] for p in pares]
+        self.inicio = [p[2] for p in pares]
+
+    def rango(self, prefijo: str) -> Tuple[int, int]:
+        desde = bisect_left(self.claves, prefijo)
+        hasta = bisect_left(self.claves, prefijo + "\uffff", desde)
+        return desde, hasta
+
+
+class LocationSearchIndex:
+    """
+    Índice de entradas (nombres, población, datos a retornar) con búsqueda por
+    prefijo de palabra, insensible a tildes y tolerante a errores de tipeo.
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[Sequence[str], int, Optional[str], tuple]], *, campos: Sequence[str]) -> None:
+        """
+        Args:
+            entradas: (nombres, población, grupo, valores). nombres incluye los
+                      alternativos (ej: traducción, código ISO); grupo permite filtrar
+                      (ej: código de país de una ciudad); valores se retornan como
+                      dict con las claves de campos (omitiendo los vacíos).
+            campos: Nombres de las claves de cada resultado
+        """
+        self._campos = tuple(campos)
+        self._valores: List[tuple] = []
+        poblaciones: List[int] = []
+        nombres_orden: List[str] = []
+        pares_globales: List[Tuple[str, int, bool]] = []
+        pares_por_grupo: Dict[str, List[Tuple[str, int, bool]]] = {}
+
+        for nombres, poblacion, grupo, valores in entradas:
+            claves = tuple(dict.fromkeys(c for c in (plegar(n) for n in nombres) if c))
+            if not claves:
+                continue
+            entrada_id = len(self._valores)
+            self._valores.append(tuple(valores))
+            poblaciones.append(int(poblacion or 0))
+            nombres_orden.append(claves[0])
+
+            # Una clave por cada inicio de palabra: "san jose" -> "san jose", "jose"
+            for clave in claves:
+                posiciones = [0] + [i + 1 for i, c in enumerate(clave) if c == " "]
+                for pos in posiciones:
+                    par = (clave[pos:], entrada_id, pos == 0)
+                    pares_globales.append(par)
+                    if grupo:
+                        pares_por_grupo.setdefault(grupo.upper(), []).append(par)
+
+        # Rango fijo de cada entrada: población descendente y luego nombre
+        orden = sorted(range(len(self._valores)), key=lambda i: (-poblaciones[i], nombres_orden[i]))
+        self._rango = [0] * len(orden)
+        for posicion, entrada_id in enumerate(orden):
+            self._rango[entrada_id] = posicion
+
+        self._global = _ArregloOrdenado(pares_globales)
+        self._grupos = {g: _ArregloOrdenado(p) for g, p in pares_por_grupo.items()}
+        # Resultados de prefijos cortos (muchas coincidencias), calculados una vez.
+        # Solo se guardan prefijos que existen en el índice: su número está acotado
+        # por los datos, no por lo que envíen los clientes
+        self._cortos: Dict[Tuple[Optional[str], str], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._valores)
+
+    def search(self, query: str, *, group: Optional[str] = None, limit: int = 20) -> List[Dict[str, str]]:
+        """
+        Busca entradas cuyo nombre (o alguna de sus palabras) empiece por la consulta.
+
+        Orden: nombre exacto, nombre que empieza por la consulta, palabra interna
+        que empieza por la consulta y por último coincidencias aproximadas; dentro
+        de cada grupo por población descendente y nombre.
+        """
+        consulta = plegar(query)
+        if not consulta or limit <= 0:
+            return []
+
+        grupo = group.upper() if group else None
+        arreglo = self._grupos.get(grupo) if grupo else self._global
+        if arreglo is None:
+            return []
+
+        if len(consulta) <= SHORT_PREFIX_LENGTH and limit <= SHORT_PREFIX_RESULTS:
+            ids = self._cortos.get((grupo, consulta))
+            if ids is None:
+                ids = self._buscar(arreglo, consulta, SHORT_PREFIX_RESULTS)
+                if ids:
+                    self._cortos[(grupo, consulta)] = ids
+            ids = ids[:limit]
+        else:
+            ids = self._buscar(arreglo, consulta, limit)
+        return [self._resultado(entrada_id) for entrada_id in ids]
+
+    def _resultado(self, entrada_id: int) -> Dict[str, str]:
+        return {campo: valor for campo, valor in zip(self._campos, self._valores[entrada_id]) if valor}
+
+    def _buscar(self, arreglo: _ArregloOrdenado, consulta: str, limit: int) -> List[int]:
+        vistos: Dict[int, Tuple[int, int]] = {}
+        desde, hasta = arreglo.rango(consulta)
+        claves, ids, inicio = arreglo.claves, arreglo.ids, arreglo.inicio
+        for k in range(desde, hasta):
+            if not inicio[k]:
+                tipo = 2
+            elif claves[k] == consulta:
+                tipo = 0
+            else:
+                tipo = 1
+            self._registrar(vistos, ids[k], (tipo, 0))
+
+        if len(vistos) < limit:
+            self._buscar_aproximado(arreglo, consulta, vistos)
+
+        rango = self._rango
+        mejores = heapq.nsmallest(limit, vistos.items(), key=lambda item: (item[1], rango[item[0]]))
+        return [entrada_id for entrada_id, _ in mejores]
+
+    def _registrar(self, vistos: Dict[int, Tuple[int, int]], entrada_id: int, rango: Tuple[int, int]) -> None:
+        actual = vistos.get(entrada_id)
+        if actual is None or rango < actual:
+            vistos[entrada_id] = rango
+
+    def _buscar_aproximado(self, arreglo: _ArregloOrdenado, consulta: str, vistos: Dict[int, Tuple[int, int]]) -> None:
+        maximo = _tolerancia(consulta)
+        if maximo == 0:
+            return
+        # Candidatos: claves con la misma primera letra (o las dos primeras si son demasiadas)
+        desde, hasta = arreglo.rango(consulta[0])
+        if hasta - desde > FUZZY_MAX_CANDIDATES:
+            desde, hasta = arreglo.rango(consulta[:2])
+            hasta = min(hasta, desde + FUZZY_MAX_CANDIDATES)
+        minimo_largo = len(consulta) - maximo
+        for k in range(desde, hasta):
+            entrada_id = arreglo.ids[k]
+            clave = arreglo.claves[k]
+            if entrada_id in vistos or len(clave) < minimo_largo:
+                continue
+            distancia = distancia_prefijo(consulta, clave, maximo)
+            if distancia <= maximo:
+                self._registrar(vistos, entrada_id, (3, distancia))
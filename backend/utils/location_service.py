@@ -3,13 +3,197 @@ Servicio de localización usando SQLite local.
 Proporciona búsqueda de países y ciudades sin dependencias externas.
 """
 import gzip
+import hashlib
+import json
+import os
 import sqlite3
+import tempfile
 import threading
 import time
+import weakref
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+from utils.file_lock import file_lock
+from utils.location_search import LocationSearchIndex, plegar
+from utils.location_shards import SHARDS_MANIFEST_NAME, build_city_shards, load_shards_manifest
 from utils.logger import Logger
+from utils.precompressed import PrecompressedCache
+from utils.ttl_cache import TTLCache
+
+
+CITIES_DB_NAME = "_cities_all.sqlite3"
+CITIES_META_NAME = "_cities_all.meta.json"
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(EXTRACT_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cerrar_conexiones(conexiones: Dict[str, sqlite3.Connection], pid: int) -> None:
+    """Cierra las conexiones de un hilo (solo en el proceso que las abrió)."""
+    if os.getpid() != pid:
+        return
+    for conn in list(conexiones.values()):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    conexiones.clear()
+
+
+class _ConexionesHilo:
+    """Conexiones abiertas por un hilo; se cierran cuando el hilo termina."""
+
+    def __init__(self, generation: int) -> None:
+        self.pid = os.getpid()
+        self.generation = generation
+        self.connections: Dict[str, sqlite3.Connection] = {}
+        weakref.finalize(self, _cerrar_conexiones, self.connections, self.pid)
+
+
+class SQLiteReadPool:
+    """
+    Conexiones SQLite de solo lectura reutilizadas por hilo y por proceso.
+
+    Cada hilo mantiene una conexión abierta por archivo (mode=ro, immutable=1,
+    mmap habilitado), de modo que las consultas reutilizan la caché de páginas
+    y las sentencias preparadas de la conexión en lugar de abrir el archivo en
+    cada consulta. Tras un fork (workers de gunicorn) se abren conexiones nuevas.
+    Las conexiones de un hilo se cierran cuando el hilo termina (servidor de
+    desarrollo o gthread con un hilo por request), así no se acumulan.
+
+    immutable=1 asume que el archivo no se modifica mientras está abierto; si se
+    reemplaza (extracción, generación de shards) hay que llamar close_all().
+    """
+
+    def __init__(self, *, mmap_size: int = 256 * 1024 * 1024, cached_statements: int = 128) -> None:
+        self._mmap_size = int(mmap_size)
+        self._cached_statements = int(cached_statements)
+        self._local = threading.local()
+        # Referencias débiles: el pool no mantiene vivas las conexiones de hilos terminados
+        self._hilos: "weakref.WeakSet[_ConexionesHilo]" = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def connection(self, db_path: Path) -> sqlite3.Connection:
+        """Obtiene la conexión del hilo actual para el archivo (la abre si no existe)."""
+        hilo = getattr(self._local, "hilo", None)
+        if hilo is None or hilo.pid != os.getpid() or hilo.generation != self._generation:
+            hilo = _ConexionesHilo(self._generation)
+            self._local.hilo = hilo
+            with self._lock:
+                self._hilos.add(hilo)
+
+        key = str(db_path)
+        conn = hilo.connections.get(key)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"{Path(db_path).resolve().as_uri()}?mode=ro&immutable=1",
+                uri=True,
+                check_same_thread=False,
+                cached_statements=self._cached_statements,
+            )
+            conn.row_factory = sqlite3.Row
+            if self._mmap_size > 0:
+                conn.execute(f"PRAGMA mmap_size={self._mmap_size}")
+            hilo.connections[key] = conn
+        return conn
+
+    def close_all(self) -> None:
+        """Cierra todas las conexiones; cada hilo abrirá nuevas en su próxima consulta."""
+        with self._lock:
+            hilos = list(self._hilos)
+            self._hilos = weakref.WeakSet()
+            self._generation += 1
+        for hilo in hilos:
+            _cerrar_conexiones(hilo.connections, hilo.pid)
+
+
+class CitiesTableLayout:
+    """
+    Estructura de una base de ciudades, resuelta una sola vez por archivo:
+    qué tabla usar y con qué columnas, y la consulta (constante) resultante.
+    """
+
+    def __init__(self, tables: List[str], columns: Dict[str, List[str]]) -> None:
+        self._tables = set(tables)
+        self._columns = columns
+        self._fallback_table = next((t for t in tables if "cit" in t.lower()), None)
+
+    @property
+    def has_tables(self) -> bool:
+        return bool(self._tables)
+
+    def query_for(self, country_code: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+        """Retorna (sql, parámetros) para las ciudades del país, o None si no hay tabla."""
+        if "cities" in self._tables:
+            # Tabla cities estándar
+            return (
+                """
+                SELECT DISTINCT name, state_code as state
+                FROM cities
+                WHERE country_code = ?
+                ORDER BY name
+                LIMIT 5000
+                """,
+                (country_code,),
+            )
+        if f"cities_{country_code}" in self._tables:
+            # Tabla específica del país
+            return (
+                f"""
+                SELECT DISTINCT name, state_code as state
+                FROM cities_{country_code}
+                ORDER BY name
+                """,
+                (),
+            )
+        if self._fallback_table:
+            # Cualquier tabla de ciudades, con la columna de estado que tenga
+            columnas = self._columns.get(self._fallback_table, [])
+            estado = [c for c in ("state_code", "state") if c in columnas]
+            estado_sql = f"COALESCE({', '.join(estado)}, '')" if estado else "''"
+            return (
+                f"""
+                SELECT DISTINCT name, {estado_sql} as state
+                FROM "{self._fallback_table}"
+                WHERE country_code = ?
+                ORDER BY name
+                LIMIT 5000
+                """,
+                (country_code,),
+            )
+        return None
+
+    def all_cities_query(self) -> Optional[str]:
+        """
+        Consulta de todas las ciudades (name, state, country_code, population) para
+        construir el índice de búsqueda. None si la base no tiene una tabla combinada.
+        """
+        table = "cities" if "cities" in self._tables else self._fallback_table
+        columnas = self._columns.get(table or "", [])
+        if not table or "country_code" not in columnas:
+            return None
+        estado = [c for c in ("state_code", "state") if c in columnas]
+        estado_sql = f"COALESCE({', '.join(estado)}, '')" if estado else "''"
+        poblacion_sql = "COALESCE(population, 0)" if "population" in columnas else "0"
+        return f"""
+            SELECT name, {estado_sql} as state, country_code, {poblacion_sql} as population
+            FROM "{table}"
+        """
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection) -> "CitiesTableLayout":
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        columns = {t: [row[1] for row in conn.execute(f'PRAGMA table_info("{t}")')] for t in tables}
+        return cls(tables, columns)
 
 
 class LocationService:
@@ -24,22 +208,41 @@ class LocationService:
         cache_ttl_countries: int,
         cache_ttl_cities: int,
         sqlite_db_path: Optional[str] = None,
-        cities_archive_path: Optional[str] = None
+        cities_archive_path: Optional[str] = None,
+        mmap_size: int = 256 * 1024 * 1024,
+        cache_max_size: int = 2048
     ) -> None:
-        # Configuración de caché
-        self._cache: Dict[Tuple[str, ...], Tuple[float, List[Dict[str, str]]]] = {}
-        self._cache_lock = threading.Lock()
+        # Configuración de caché (LRU acotado: cada prefijo buscado es una entrada)
+        self._cache = TTLCache(
+            "location",
+            max_size=cache_max_size,
+            ttl=max(cache_ttl_countries, cache_ttl_cities),
+        )
         self._cache_ttl_countries = cache_ttl_countries
         self._cache_ttl_cities = cache_ttl_cities
         
+        # Conexiones de solo lectura reutilizadas y estructura de tablas por archivo
+        self._pool = SQLiteReadPool(mmap_size=mmap_size)
+        self._layouts: Dict[str, CitiesTableLayout] = {}
+        self._layouts_lock = threading.Lock()
+        
+        # Índices de búsqueda en memoria (se construyen en segundo plano)
+        self._countries_index: Optional[LocationSearchIndex] = None
+        self._cities_index: Optional[LocationSearchIndex] = None
+        self._index_thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        
         # Rutas de bases de datos SQLite
         self._sqlite_db_path = Path(sqlite_db_path) if sqlite_db_path else None
         self._sqlite_available = False
         
-        # Configuración de archivo de ciudades
+        # Configuración de archivo de ciudades (se extrae en setup(), normalmente en segundo plano)
         self._cities_archive_path = Path(cities_archive_path) if cities_archive_path else None
-        self._cities_dir = None
+        self._cities_dir = self._cities_archive_path.parent / "cities" if self._cities_archive_path else None
         self._cities_available = False
+        # Shards por país vigentes según cities/manifest.json
+        self._city_shards: Dict[str, Path] = {}
+        self._shards_manifest_present = False
         
         # Verificar disponibilidad de BD de países
         if self._sqlite_db_path and self._sqlite_db_path.exists():
@@ -48,12 +251,6 @@ class LocationService:
         elif self._sqlite_db_path:
             Logger.add_to_log("warn", f"Base de datos SQLite de países no encontrada: {self._sqlite_db_path}")
         
-        # Extraer archivo de ciudades si existe
-        if self._cities_archive_path and self._cities_archive_path.exists():
-            self._setup_cities_database()
-        elif self._cities_archive_path:
-            Logger.add_to_log("warn", f"Archivo de ciudades no encontrado: {self._cities_archive_path}")
-
         # Datos de respaldo mínimos (solo como último recurso)
         self._fallback_countries = [
             {"code": "US", "name": "Estados Unidos"},
@@ -69,103 +266,320 @@ class LocationService:
             "AR": ["Buenos Aires", "Córdoba", "Rosario", "Mendoza", "La Plata"],
             "ES": ["Madrid", "Barcelona", "Valencia", "Sevilla", "Bilbao"],
         }
+        self._data_version = self._compute_data_version()
+
+    @property
+    def data_version(self) -> str:
+        """
+        Identificador de la versión de los datos servidos: cambia cuando cambian
+        los archivos SQLite (países, ciudades, shards) o termina el setup.
+        """
+        return self._data_version
+
+    def _compute_data_version(self) -> str:
+        partes = [f"cities={self._cities_available}"]
+        if self._sqlite_available:
+            stat = self._sqlite_db_path.stat()
+            partes.append(f"countries={stat.st_size}:{stat.st_mtime_ns}")
+        if self._cities_available:
+            partes.append(f"cities_sha={(self._read_cities_meta() or {}).get('sha256')}")
+            manifest = self._cities_dir / SHARDS_MANIFEST_NAME
+            if self._city_shards and manifest.exists():
+                partes.append(f"shards={manifest.stat().st_mtime_ns}")
+        return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def ready(self) -> bool:
+        """True cuando la base de ciudades ya fue verificada/extraída (o no hay archivo)."""
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def setup(self, *, build_search_indexes: bool = False) -> None:
+        """
+        Prepara la base de ciudades (extracción verificada) y resuelve su estructura.
+        Mientras no termina, get_cities responde con el catálogo de respaldo.
+        """
+        try:
+            if self._cities_archive_path and self._cities_archive_path.exists():
+                self._setup_cities_database()
+            elif self._cities_archive_path:
+                Logger.add_to_log("warn", f"Archivo de ciudades no encontrado: {self._cities_archive_path}")
+            
+            # Resolver la estructura de la base combinada una sola vez
+            if self._cities_available:
+                self._get_layout(self._cities_dir / CITIES_DB_NAME)
+                self._load_city_shards()
+        finally:
+            self._data_version = self._compute_data_version()
+            # Descartar lo cacheado durante el setup (catálogo de respaldo)
+            self._cache.clear()
+            self._ready.set()
+        
+        if build_search_indexes:
+            self.build_search_indexes()
+
+    def start_background_setup(self, *, build_search_indexes: bool = True) -> None:
+        """Ejecuta setup() en un hilo en segundo plano para no bloquear el arranque."""
+        if self._index_thread is not None and self._index_thread.is_alive():
+            return
+        self._index_thread = threading.Thread(
+            target=self.setup,
+            kwargs={"build_search_indexes": build_search_indexes},
+            name="location-setup",
+            daemon=True,
+        )
+        self._index_thread.start()
+
+    def _read_cities_meta(self) -> Optional[dict]:
+        try:
+            with open(self._cities_dir / CITIES_META_NAME, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _archive_signature(self) -> Dict[str, int]:
+        stat = self._cities_archive_path.stat()
+        return {"archive_size": stat.st_size, "archive_mtime_ns": stat.st_mtime_ns}
+
+    def _extracted_db_is_valid(self) -> bool:
+        """La base extraída existe, corresponde al archivo .gz actual y su checksum coincide."""
+        db_path = self._cities_dir / CITIES_DB_NAME
+        meta = self._read_cities_meta()
+        if not meta or not db_path.exists():
+            return False
+        firma = self._archive_signature()
+        if any(meta.get(k) != v for k, v in firma.items()):
+            return False
+        if db_path.stat().st_size != meta.get("size"):
+            return False
+        return sha256_file(db_path) == meta.get("sha256")
 
     def _setup_cities_database(self) -> None:
-        """Extrae la base de datos de ciudades desde el archivo .gz si es necesario."""
+        """
+        Extrae la base de datos de ciudades desde el archivo .gz si es necesario.
+        
+        La descompresión es por bloques hacia un archivo temporal que se renombra
+        atómicamente al terminar; un bloqueo de archivo garantiza que un solo worker
+        extraiga mientras los demás esperan y reutilizan el resultado. Junto a la
+        base se guarda su SHA-256, que se verifica antes de usarla.
+        """
         try:
-            self._cities_dir = self._cities_archive_path.parent / "cities"
             self._cities_dir.mkdir(exist_ok=True)
             
-            # Verificar si ya está extraído
-            extracted_files = list(self._cities_dir.glob("*.sqlite3"))
-            if extracted_files:
-                self._cities_available = True
-                Logger.add_to_log("info", f"Base de datos de ciudades disponible: {len(extracted_files)} archivos encontrados")
-                return
-            
-            # Extraer el archivo .gz
-            Logger.add_to_log("info", f"Extrayendo base de datos de ciudades desde: {self._cities_archive_path}")
-            
-            with gzip.open(self._cities_archive_path, 'rb') as f_in:
-                content = f_in.read()
-            
-            # Guardar contenido extraído
-            temp_db = self._cities_dir / "_cities_all.sqlite3"
-            with open(temp_db, 'wb') as f_out:
-                f_out.write(content)
+            with file_lock(self._cities_dir / ".extract.lock"):
+                # Verificar si ya está extraído (por este u otro worker)
+                if self._extracted_db_is_valid():
+                    self._cities_available = True
+                    Logger.add_to_log("info", f"Base de datos de ciudades disponible: {self._cities_dir / CITIES_DB_NAME}")
+                    return
+                
+                Logger.add_to_log("info", f"Extrayendo base de datos de ciudades desde: {self._cities_archive_path}")
+                inicio = time.perf_counter()
+                
+                fd, tmp_name = tempfile.mkstemp(dir=self._cities_dir, prefix=".cities_", suffix=".tmp")
+                tmp_path = Path(tmp_name)
+                try:
+                    h = hashlib.sha256()
+                    size = 0
+                    # gzip valida el CRC del contenido al llegar al final del stream
+                    with gzip.open(self._cities_archive_path, "rb") as f_in, os.fdopen(fd, "wb") as f_out:
+                        for chunk in iter(lambda: f_in.read(EXTRACT_CHUNK_SIZE), b""):
+                            if size == 0 and not chunk.startswith(SQLITE_HEADER):
+                                raise ValueError("El archivo de ciudades no contiene una base SQLite")
+                            f_out.write(chunk)
+                            h.update(chunk)
+                            size += len(chunk)
+                        f_out.flush()
+                        os.fsync(f_out.fileno())
+                    os.chmod(tmp_path, 0o644)
+                    
+                    # Conexiones abiertas (immutable) sobre una versión anterior
+                    self.close()
+                    os.replace(tmp_path, self._cities_dir / CITIES_DB_NAME)
+                finally:
+                    if tmp_path.exists():
+                        tmp_path.unlink()
+                
+                meta = {"sha256": h.hexdigest(), "size": size, **self._archive_signature()}
+                meta_tmp = self._cities_dir / f".{CITIES_META_NAME}.tmp"
+                with open(meta_tmp, "w", encoding="utf-8") as fh:
+                    json.dump(meta, fh)
+                os.replace(meta_tmp, self._cities_dir / CITIES_META_NAME)
             
             self._cities_available = True
-            Logger.add_to_log("info", f"Base de datos de ciudades extraída exitosamente en: {self._cities_dir}")
+            Logger.add_to_log(
+                "info",
+                f"Base de datos de ciudades extraída exitosamente en: {self._cities_dir} "
+                f"({size / 1024 / 1024:.1f} MB en {(time.perf_counter() - inicio):.1f} s)"
+            )
             
         except Exception as e:
             Logger.add_to_log("error", f"Error configurando base de datos de ciudades: {e}")
             self._cities_available = False
 
+    def _load_city_shards(self) -> None:
+        """Carga los shards por país del manifiesto si corresponden a la base extraída."""
+        meta = self._read_cities_meta() or {}
+        self._city_shards = load_shards_manifest(self._cities_dir, meta.get("sha256"))
+        self._shards_manifest_present = (self._cities_dir / SHARDS_MANIFEST_NAME).exists()
+        if self._shards_manifest_present and not self._city_shards:
+            Logger.add_to_log("warn", "Manifiesto de shards de ciudades desactualizado; ejecute flask location build-shards")
+        elif self._city_shards:
+            Logger.add_to_log("info", f"Shards de ciudades disponibles: {len(self._city_shards)} países")
+
+    def build_city_shards(self) -> dict:
+        """
+        Genera cities/<CC>.sqlite3 por país desde la base combinada (ver utils/location_shards.py).
+        Requiere que setup() haya terminado. Retorna el manifiesto.
+        """
+        if not self._cities_available:
+            raise RuntimeError("La base de datos de ciudades no está disponible")
+        
+        all_cities_db = self._cities_dir / CITIES_DB_NAME
+        layout = self._get_layout(all_cities_db)
+        consulta = layout.all_cities_query() if layout else None
+        if not consulta:
+            raise RuntimeError(f"No se encontró una tabla de ciudades con country_code en {all_cities_db}")
+        
+        meta = self._read_cities_meta() or {}
+        with file_lock(self._cities_dir / ".extract.lock"):
+            # Las conexiones abiertas (immutable) apuntan a los shards que se reemplazan
+            self.close()
+            manifest = build_city_shards(all_cities_db, self._cities_dir, consulta, meta.get("sha256"))
+        self._load_city_shards()
+        self._data_version = self._compute_data_version()
+        Logger.add_to_log(
+            "info",
+            f"Shards de ciudades generados: {len(manifest['countries'])} países en {manifest['build_seconds']} s"
+        )
+        return manifest
+
     def _get_cities_db_path(self, country_code: str) -> Optional[Path]:
         """Obtiene la ruta del archivo SQLite de ciudades."""
         if not self._cities_dir or not self._cities_available:
             return None
         
-        # Intentar archivo específico del país
+        # Shard del país generado con flask location build-shards
+        shard = self._city_shards.get(country_code)
+        if shard is not None:
+            return shard
+        
+        # Intentar archivo específico del país (colocado manualmente, sin manifiesto)
         country_db = self._cities_dir / f"{country_code}.sqlite3"
-        if country_db.exists() and self._db_has_tables(country_db):
+        if not self._shards_manifest_present and country_db.exists() and self._db_has_tables(country_db):
             return country_db
         
         # Usar archivo completo
-        all_cities_db = self._cities_dir / "_cities_all.sqlite3"
+        all_cities_db = self._cities_dir / CITIES_DB_NAME
         if all_cities_db.exists():
             return all_cities_db
         
         return None
 
+    def _get_layout(self, db_path: Path) -> Optional[CitiesTableLayout]:
+        """Estructura de tablas del archivo (se consulta sqlite_master una sola vez)."""
+        key = str(db_path)
+        layout = self._layouts.get(key)
+        if layout is not None:
+            return layout
+        with self._layouts_lock:
+            layout = self._layouts.get(key)
+            if layout is None:
+                conn = self._get_sqlite_connection_for_file(db_path)
+                if conn is None:
+                    return None
+                try:
+                    layout = CitiesTableLayout.load(conn)
+                except sqlite3.Error as e:
+                    Logger.add_to_log("error", f"Error leyendo estructura de {db_path}: {e}")
+                    return None
+                self._layouts[key] = layout
+            return layout
+
     def _db_has_tables(self, db_path: Path) -> bool:
         """Verifica si una base de datos tiene tablas."""
-        try:
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            conn.close()
-            return len(tables) > 0
-        except sqlite3.Error:
-            return False
+        layout = self._get_layout(db_path)
+        return layout is not None and layout.has_tables
 
     def _get_sqlite_connection(self) -> Optional[sqlite3.Connection]:
-        """Obtiene una conexión a la base de datos de países."""
+        """Obtiene la conexión (de solo lectura, reutilizada) a la base de datos de países."""
         if not self._sqlite_available or not self._sqlite_db_path:
             return None
-        try:
-            conn = sqlite3.connect(str(self._sqlite_db_path))
-            conn.row_factory = sqlite3.Row
-            return conn
-        except sqlite3.Error as e:
-            Logger.add_to_log("error", f"Error conectando a SQLite: {e}")
-            return None
+        return self._get_sqlite_connection_for_file(self._sqlite_db_path)
 
     def _get_sqlite_connection_for_file(self, db_path: Path) -> Optional[sqlite3.Connection]:
-        """Obtiene una conexión a un archivo SQLite específico."""
+        """Obtiene la conexión (de solo lectura, reutilizada) a un archivo SQLite específico."""
         try:
-            conn = sqlite3.connect(str(db_path))
-            conn.row_factory = sqlite3.Row
-            return conn
+            return self._pool.connection(db_path)
         except sqlite3.Error as e:
             Logger.add_to_log("error", f"Error conectando a {db_path}: {e}")
             return None
 
-    def _get_from_cache(self, key: Tuple[str, ...], ttl: int) -> Optional[List[Dict[str, str]]]:
+    def close(self) -> None:
+        """Cierra las conexiones abiertas y olvida la estructura de tablas resuelta."""
+        self._pool.close_all()
+        with self._layouts_lock:
+            self._layouts.clear()
+
+    def build_search_indexes(self) -> None:
+        """Construye los índices de búsqueda de países y ciudades desde SQLite."""
+        inicio = time.perf_counter()
+        if self._sqlite_available:
+            try:
+                self._countries_index = self._build_countries_index()
+            except (sqlite3.Error, ValueError) as e:
+                Logger.add_to_log("error", f"Error construyendo índice de países: {e}")
+        
+        all_cities_db = self._cities_dir / CITIES_DB_NAME if self._cities_dir else None
+        if self._cities_available and all_cities_db and all_cities_db.exists():
+            try:
+                self._cities_index = self._build_cities_index(all_cities_db)
+            except sqlite3.Error as e:
+                Logger.add_to_log("error", f"Error construyendo índice de ciudades: {e}")
+        
+        Logger.add_to_log(
+            "info",
+            f"Índices de localización construidos en {(time.perf_counter() - inicio) * 1000:.0f} ms: "
+            f"{len(self._countries_index or [])} países, {len(self._cities_index or [])} ciudades"
+        )
+
+    def _build_countries_index(self) -> LocationSearchIndex:
+        conn = self._get_sqlite_connection()
+        entradas = []
+        for row in conn.execute("SELECT iso2, name, native, translations, population FROM countries"):
+            nombres = [row["name"], row["iso2"] or ""]
+            if row["native"]:
+                nombres.append(row["native"])
+            try:
+                traduccion = json.loads(row["translations"] or "{}").get("es")
+            except ValueError:
+                traduccion = None
+            if traduccion:
+                nombres.append(traduccion)
+            entradas.append((nombres, row["population"], None, (row["iso2"], row["name"])))
+        return LocationSearchIndex(entradas, campos=("code", "name"))
+
+    def _build_cities_index(self, db_path: Path) -> Optional[LocationSearchIndex]:
+        layout = self._get_layout(db_path)
+        sql = layout.all_cities_query() if layout else None
+        if not sql:
+            return None
+        conn = self._get_sqlite_connection_for_file(db_path)
+        entradas = (
+            ((name,), population, country_code, (name, state, country_code))
+            for name, state, country_code, population in conn.execute(sql)
+        )
+        return LocationSearchIndex(entradas, campos=("name", "state", "country_code"))
+
+    def _get_from_cache(self, key: Tuple[str, ...]) -> Optional[List[Dict[str, str]]]:
         """Obtiene datos del caché si están disponibles y no han expirado."""
-        with self._cache_lock:
-            if key not in self._cache:
-                return None
-            expires_at, data = self._cache[key]
-            if expires_at < time.time():
-                del self._cache[key]
-                return None
-            return data
+        return self._cache.get(key)
 
     def _store_in_cache(self, key: Tuple[str, ...], data: List[Dict[str, str]], ttl: int) -> None:
         """Almacena datos en el caché con un tiempo de expiración."""
-        with self._cache_lock:
-            self._cache[key] = (time.time() + ttl, data)
+        self._cache.set(key, data, ttl)
 
     def search_countries(self, name_prefix: str, *, limit: int = 20) -> List[Dict[str, str]]:
         """
@@ -186,8 +600,12 @@ class LocationService:
         cache_key = ("countries_search", prefix.lower(), str(safe_limit))
         search_ttl = min(self._cache_ttl_countries, 60 * 60)
         
+        # Índice en memoria (prefijo por palabra, sin tildes, tolerante a errores)
+        if self._countries_index is not None:
+            return self._countries_index.search(prefix, limit=safe_limit)
+
         # Verificar caché
-        cached = self._get_from_cache(cache_key, search_ttl)
+        cached = self._get_from_cache(cache_key)
         if cached is not None:
             return cached
 
@@ -196,22 +614,21 @@ class LocationService:
             try:
                 conn = self._get_sqlite_connection()
                 if conn:
-                    with conn:
-                        cursor = conn.execute(
-                            """
-                            SELECT iso2 as code, name
-                            FROM countries
-                            WHERE LOWER(name) LIKE LOWER(?)
-                               OR LOWER(iso2) LIKE LOWER(?)
-                            ORDER BY name
-                            LIMIT ?
-                            """,
-                            (f"%{prefix}%", f"%{prefix}%", safe_limit)
-                        )
-                        results = [{"code": row["code"], "name": row["name"]} for row in cursor.fetchall()]
-                        self._store_in_cache(cache_key, results, search_ttl)
-                        Logger.add_to_log("info", f"Búsqueda de países '{prefix}': {len(results)} resultados")
-                        return results
+                    cursor = conn.execute(
+                        """
+                        SELECT iso2 as code, name
+                        FROM countries
+                        WHERE LOWER(name) LIKE LOWER(?)
+                           OR LOWER(iso2) LIKE LOWER(?)
+                        ORDER BY name
+                        LIMIT ?
+                        """,
+                        (f"%{prefix}%", f"%{prefix}%", safe_limit)
+                    )
+                    results = [{"code": row["code"], "name": row["name"]} for row in cursor.fetchall()]
+                    self._store_in_cache(cache_key, results, search_ttl)
+                    Logger.add_to_log("info", f"Búsqueda de países '{prefix}': {len(results)} resultados")
+                    return results
             except sqlite3.Error as e:
                 Logger.add_to_log("error", f"Error buscando países en SQLite: {e}")
 
@@ -235,7 +652,7 @@ class LocationService:
         cache_key = ("all_countries",)
         
         # Verificar caché
-        cached = self._get_from_cache(cache_key, self._cache_ttl_countries)
+        cached = self._get_from_cache(cache_key)
         if cached is not None:
             return cached
 
@@ -244,19 +661,18 @@ class LocationService:
             try:
                 conn = self._get_sqlite_connection()
                 if conn:
-                    with conn:
-                        cursor = conn.execute(
-                            """
-                            SELECT iso2 as code, name
-                            FROM countries
-                            ORDER BY name
-                            LIMIT 5000
-                            """
-                        )
-                        results = [{"code": row["code"], "name": row["name"]} for row in cursor.fetchall()]
-                        self._store_in_cache(cache_key, results, self._cache_ttl_countries)
-                        Logger.add_to_log("info", f"SQLite devolvió {len(results)} países")
-                        return results
+                    cursor = conn.execute(
+                        """
+                        SELECT iso2 as code, name
+                        FROM countries
+                        ORDER BY name
+                        LIMIT 5000
+                        """
+                    )
+                    results = [{"code": row["code"], "name": row["name"]} for row in cursor.fetchall()]
+                    self._store_in_cache(cache_key, results, self._cache_ttl_countries)
+                    Logger.add_to_log("info", f"SQLite devolvió {len(results)} países")
+                    return results
             except sqlite3.Error as e:
                 Logger.add_to_log("error", f"Error obteniendo países de SQLite: {e}")
 
@@ -266,6 +682,34 @@ class LocationService:
         Logger.add_to_log("warn", "Usando catálogo de países por defecto")
         return results
 
+    def search_cities(self, query: str, *, country_code: Optional[str] = None, limit: int = 20) -> List[Dict[str, str]]:
+        """
+        Busca ciudades por prefijo de nombre, opcionalmente dentro de un país.
+        
+        Args:
+            query: Texto de búsqueda (sin distinguir tildes ni mayúsculas)
+            country_code: Código ISO2 del país (opcional)
+            limit: Máximo número de resultados
+            
+        Returns:
+            Lista de ciudades (name, state, country_code) ordenadas por relevancia
+        """
+        normalized_code = (country_code or "").upper().strip() or None
+        if self._cities_index is not None:
+            return self._cities_index.search(query, group=normalized_code, limit=limit)
+        
+        # Mientras el índice no está listo: filtrar el listado del país
+        consulta = plegar(query)
+        if not consulta or not normalized_code:
+            return []
+        results = []
+        for city in self.get_cities(normalized_code):
+            if plegar(city["name"]).startswith(consulta):
+                results.append({**city, "country_code": normalized_code})
+                if len(results) >= limit:
+                    break
+        return results
+
     def get_cities(self, country_code: str) -> List[Dict[str, str]]:
         """
         Obtiene todas las ciudades de un país específico.
@@ -283,7 +727,7 @@ class LocationService:
         cache_key = ("cities", normalized_code)
         
         # Verificar caché
-        cached = self._get_from_cache(cache_key, self._cache_ttl_cities)
+        cached = self._get_from_cache(cache_key)
         if cached is not None:
             Logger.add_to_log("info", f"Ciudades de {normalized_code} desde caché: {len(cached)} ciudades")
             return cached
@@ -293,74 +737,33 @@ class LocationService:
             cities_db_path = self._get_cities_db_path(normalized_code)
             if cities_db_path:
                 try:
+                    layout = self._get_layout(cities_db_path)
+                    consulta = layout.query_for(normalized_code) if layout else None
                     conn = self._get_sqlite_connection_for_file(cities_db_path)
-                    if conn:
-                        with conn:
-                            # Verificar qué tablas existen
-                            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                            tables = [row[0] for row in cursor.fetchall()]
-                            
-                            if 'cities' in tables:
-                                # Tabla cities estándar
-                                cursor = conn.execute(
-                                    """
-                                    SELECT DISTINCT name, state_code as state
-                                    FROM cities
-                                    WHERE country_code = ?
-                                    ORDER BY name
-                                    LIMIT 5000
-                                    """,
-                                    (normalized_code,)
-                                )
-                            elif f'cities_{normalized_code}' in tables:
-                                # Tabla específica del país
-                                cursor = conn.execute(
-                                    f"""
-                                    SELECT DISTINCT name, state_code as state
-                                    FROM cities_{normalized_code}
-                                    ORDER BY name
-                                    """
-                                )
-                            else:
-                                # Buscar cualquier tabla de ciudades
-                                cursor = conn.execute(
-                                    "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE '%cit%' LIMIT 1"
-                                )
-                                table_row = cursor.fetchone()
-                                if not table_row:
-                                    raise Exception("No se encontró tabla de ciudades")
-                                
-                                table_name = table_row[0]
-                                cursor = conn.execute(
-                                    f"""
-                                    SELECT DISTINCT name, COALESCE(state_code, state, '') as state
-                                    FROM {table_name}
-                                    WHERE country_code = ?
-                                    ORDER BY name
-                                    LIMIT 5000
-                                    """,
-                                    (normalized_code,)
-                                )
-                            
-                            # Procesar resultados
-                            results = []
-                            for row in cursor.fetchall():
-                                city_data = {"name": row[0]}
-                                if len(row) > 1 and row[1]:
-                                    city_data["state"] = row[1]
-                                results.append(city_data)
-                            
-                            self._store_in_cache(cache_key, results, self._cache_ttl_cities)
-                            Logger.add_to_log("info", f"SQLite devolvió {len(results)} ciudades para {normalized_code}")
-                            return results
-                            
+                    if conn and consulta:
+                        sql, params = consulta
+                        results = []
+                        for row in conn.execute(sql, params):
+                            city_data = {"name": row[0]}
+                            if row[1]:
+                                city_data["state"] = row[1]
+                            results.append(city_data)
+                        
+                        self._store_in_cache(cache_key, results, self._cache_ttl_cities)
+                        Logger.add_to_log("info", f"SQLite devolvió {len(results)} ciudades para {normalized_code}")
+                        return results
+                    if layout and not consulta:
+                        Logger.add_to_log("error", f"No se encontró tabla de ciudades en {cities_db_path}")
+                    
                 except sqlite3.Error as e:
                     Logger.add_to_log("error", f"Error obteniendo ciudades para {normalized_code}: {e}")
 
         # Fallback a datos hardcodeados
         fallback_cities = self._fallback_cities.get(normalized_code, [])
         fallback = [{"name": city} for city in fallback_cities]
-        self._store_in_cache(cache_key, fallback, self._cache_ttl_cities)
+        # Mientras el setup no termina el respaldo es provisional: no se cachea
+        if self._ready.is_set():
+            self._store_in_cache(cache_key, fallback, self._cache_ttl_cities)
         Logger.add_to_log("warn", f"Usando catálogo de ciudades por defecto para {normalized_code}")
         return fallback
 
@@ -376,14 +779,26 @@ def init_location_service(app) -> None:
     cache_ttl_cities = int(app.config.get("LOCATION_CACHE_TTL_CITIES", 60 * 60 * 12))  # 12 horas
     sqlite_db_path = app.config.get("LOCATION_DB_PATH")
     cities_archive_path = app.config.get("LOCATION_CITIES_ARCHIVE_PATH")
+    mmap_size = int(app.config.get("LOCATION_SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    cache_max_size = int(app.config.get("LOCATION_CACHE_MAX_SIZE", 2048))
 
     service = LocationService(
         cache_ttl_countries=cache_ttl_countries,
         cache_ttl_cities=cache_ttl_cities,
         sqlite_db_path=sqlite_db_path,
         cities_archive_path=cities_archive_path,
+        mmap_size=mmap_size,
+        cache_max_size=cache_max_size,
     )
     app.extensions["location_service"] = service
+    # Respuestas HTTP del catálogo pre-renderizadas por versión de datos (routes/public.py)
+    app.extensions["location_responses"] = PrecompressedCache(
+        "location_responses",
+        max_size=int(app.config.get("LOCATION_RESPONSE_CACHE_MAX_SIZE", 512)),
+        ttl=cache_ttl_cities,
+    )
+    # Extracción/verificación de ciudades e índices de búsqueda sin bloquear el arranque
+    service.start_background_setup(build_search_indexes=app.config.get("LOCATION_SEARCH_INDEX", True))
     Logger.add_to_log("info", "LocationService inicializado correctamente")
 
 
@@ -0,0 +1,149 @@
+"""
+Shards de ciudades por país generados desde la base combinada (_cities_all.sqlite3).
+
+Cada país queda en cities/<CC>.sqlite3 con la tabla estándar `cities`, un índice
+que cubre la consulta de LocationService.get_cities y el archivo compactado con
+VACUUM, de modo que una consulta fría solo lee unas pocas páginas del país y no
+la base completa. El manifiesto (cities/manifest.json) lista los shards válidos
+y el SHA-256 de la base de origen: si la base cambia, el manifiesto deja de
+aplicarse hasta regenerarlo (flask location build-shards).
+"""
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+SHARDS_MANIFEST_NAME = "manifest.json"
+SHARDS_MANIFEST_VERSION = 1
+
+_SHARD_SCHEMA = """
+    CREATE TABLE cities (
+        name TEXT NOT NULL,
+        state_code TEXT,
+        country_code TEXT NOT NULL,
+        population INTEGER NOT NULL DEFAULT 0
+    );
+"""
+# Cubre SELECT DISTINCT name, state_code ... WHERE country_code = ? ORDER BY name
+_SHARD_INDEX = "CREATE INDEX idx_cities_country_name ON cities (country_code, name, state_code)"
+
+
+def load_shards_manifest(cities_dir: Path, source_sha256: Optional[str]) -> Dict[str, Path]:
+    """
+    Shards vigentes {CC: ruta} según el manifiesto. Retorna {} si no hay manifiesto,
+    si corresponde a otra base de origen o si algún archivo no coincide en tamaño.
+    """
+    try:
+        with open(cities_dir / SHARDS_MANIFEST_NAME, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get("version") != SHARDS_MANIFEST_VERSION or manifest.get("source_sha256") != source_sha256:
+        return {}
+
+    shards = {}
+    for code, info in (manifest.get("countries") or {}).items():
+        path = cities_dir / info.get("file", "")
+        try:
+            if path.stat().st_size == info.get("size"):
+                shards[code.upper()] = path
+        except OSError:
+            continue
+    return shards
+
+
+def _write_shard(path: Path, country_code: str, rows) -> int:
+    """Escribe un shard en un archivo temporal y lo renombra atómicamente."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(_SHARD_SCHEMA)
+        conn.executemany(
+            "INSERT INTO cities (name, state_code, country_code, population) VALUES (?, ?, ?, ?)",
+            ((name, state or None, country_code, int(population or 0)) for name, state, population in rows),
+        )
+        conn.execute(_SHARD_INDEX)
+        conn.commit()
+        conn.execute("VACUUM")
+        total = conn.execute("SELECT COUNT(*) FROM cities").fetchone()[0]
+    finally:
+        conn.close()
+
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+    return total
+
+
+def build_city_shards(source_db: Path, cities_dir: Path, all_cities_query: str, source_sha256: str) -> dict:
+    """
+    Divide la base combinada en un shard por país y escribe el manifiesto.
+
+    Args:
+        source_db: Ruta de _cities_all.sqlite3
+        cities_dir: Directorio de destino de los shards
+        all_cities_query: Consulta (name, state, country_code, population) de la base
+                          (CitiesTableLayout.all_cities_query)
+        source_sha256: Checksum de la base de origen, para invalidar el manifiesto
+
+    Returns:
+        El manifiesto generado
+    """
+    inicio = time.perf_counter()
+    countries: Dict[str, dict] = {}
+
+    source = sqlite3.connect(f"file:{source_db}?mode=ro", uri=True)
+    try:
+        cursor = source.execute(
+            f"SELECT name, state, UPPER(country_code), population FROM ({all_cities_query}) "
+            "WHERE name IS NOT NULL AND country_code IS NOT NULL AND country_code != '' "
+            "ORDER BY UPPER(country_code), name"
+        )
+
+        actual = None
+        filas = []
+
+        def cerrar_pais():
+            if actual and filas:
+                path = cities_dir / f"{actual}.sqlite3"
+                total = _write_shard(path, actual, filas)
+                countries[actual] = {"file": path.name, "rows": total, "size": path.stat().st_size}
+
+        for name, state, country_code, population in cursor:
+            if country_code != actual:
+                cerrar_pais()
+                actual, filas = country_code, []
+            filas.append((name, state, population))
+        cerrar_pais()
+    finally:
+        source.close()
+
+    # Shards de un manifiesto anterior que ya no existen en la base
+    try:
+        with open(cities_dir / SHARDS_MANIFEST_NAME, "r", encoding="utf-8") as fh:
+            anterior = (json.load(fh).get("countries") or {})
+    except (OSError, ValueError):
+        anterior = {}
+    for code, info in anterior.items():
+        if code not in countries:
+            (cities_dir / info.get("file", "")).unlink(missing_ok=True)
+
+    manifest = {
+        "version": SHARDS_MANIFEST_VERSION,
+        "source_sha256": source_sha256,
+        "generated_at": int(time.time()),
+        "build_seconds": round(time.perf_counter() - inicio, 2),
+        "countries": countries,
+    }
+    manifest_tmp = cities_dir / f".{SHARDS_MANIFEST_NAME}.tmp"
+    with open(manifest_tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(manifest_tmp, cities_dir / SHARDS_MANIFEST_NAME)
+    return manifest
@@ -4,10 +4,30 @@ Cada módulo tiene su propio archivo de log separado
 """
 import logging
 import os
-from datetime import datetime
 from enum import Enum
 from typing import Optional
 
+from utils.log.context import RequestContextFilter
+from utils.log.formatters import JsonFormatter, TextFormatter
+from utils.log.pipeline import get_log_pipeline
+
+
+def nivel_log(nombre: str) -> int:
+    """
+    Nivel configurado para un logger: LOG_LEVEL_<NOMBRE> o, si no existe, LOG_LEVEL
+    (por defecto DEBUG). Ej: LOG_LEVEL=INFO, LOG_LEVEL_SOPORTE=WARNING.
+    """
+    valor = os.environ.get(f"LOG_LEVEL_{nombre.upper()}") or os.environ.get("LOG_LEVEL", "DEBUG")
+    nivel = logging.getLevelName(valor.strip().upper())
+    return nivel if isinstance(nivel, int) else logging.DEBUG
+
+
+def crear_formatter(nombre: str, fmt: str) -> logging.Formatter:
+    """Formatter según LOG_FORMAT: 'text' (por defecto) o 'json'."""
+    if os.environ.get("LOG_FORMAT", "text").lower() == "json":
+        return JsonFormatter(nombre)
+    return TextFormatter(fmt)
+
 
 class LogCategory(Enum):
     """Categorías de logs disponibles"""
@@ -55,7 +75,7 @@ class AppLogger:
         
         if category_name not in cls._loggers:
             logger = logging.getLogger(f"app.{category_name}")
-            logger.setLevel(logging.DEBUG)
+            logger.setLevel(nivel_log(category_name))
             
             # Evitar duplicación de handlers
             if logger.hasHandlers():
@@ -63,16 +83,15 @@ class AppLogger:
             
             # Archivo de log específico para esta categoría
             log_path = os.path.join(cls._get_log_directory(), f"{category_name}.log")
-            file_handler = logging.FileHandler(log_path, encoding='utf-8')
-            file_handler.setLevel(logging.DEBUG)
             
-            # Formato del log
-            formatter = logging.Formatter(
-                '%(asctime)s | %(levelname)-8s | %(message)s',
-                datefmt="%Y-%m-%d %H:%M:%S"
-            )
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            # Formato del log (texto o JSON según LOG_FORMAT)
+            formatter = crear_formatter(category_name, '%(asctime)s | %(levelname)-8s | %(message)s')
+            # Escritura en segundo plano por el pipeline (utils/log/pipeline.py)
+            pipeline = get_log_pipeline()
+            file_handler = pipeline.make_file_handler(log_path, formatter)
+            logger.addHandler(pipeline.attach(file_handler))
+            # request_id, endpoint y empresa_id del request actual
+            logger.addFilter(RequestContextFilter())
             
             # No propagar al logger root
             logger.propagate = False
@@ -82,65 +101,42 @@ class AppLogger:
         return cls._loggers[category_name]
     
     @classmethod
-    def _format_message(cls, message: str, **kwargs) -> str:
-        """Formatea el mensaje con datos adicionales"""
-        if not kwargs:
-            return message
-        
-        # Formatear datos extra como key=value
-        extra_parts = []
-        for key, value in kwargs.items():
-            if key == 'exc':
-                continue  # La excepción se maneja aparte
-            if isinstance(value, dict):
-                extra_parts.append(f"{key}={{{', '.join(f'{k}:{v}' for k, v in value.items())}}}")
-            else:
-                extra_parts.append(f"{key}={value}")
-        
-        if extra_parts:
-            return f"{message} | {' | '.join(extra_parts)}"
-        return message
+    def _log(cls, level: int, category: LogCategory, message: str, exc: Optional[Exception] = None, **kwargs):
+        """
+        Registra el mensaje si el nivel está habilitado. Los datos extra se pasan
+        sin formatear y el formatter los renderiza en el hilo escritor.
+        """
+        logger = cls._get_logger(category)
+        if not logger.isEnabledFor(level):
+            return
+        if exc is not None:
+            kwargs['exception'] = f"{type(exc).__name__}: {str(exc)}"
+        logger.log(level, message, extra={'campos': kwargs})
     
     @classmethod
     def debug(cls, category: LogCategory, message: str, **kwargs):
         """Log nivel DEBUG"""
-        logger = cls._get_logger(category)
-        formatted = cls._format_message(message, **kwargs)
-        logger.debug(formatted)
+        cls._log(logging.DEBUG, category, message, **kwargs)
     
     @classmethod
     def info(cls, category: LogCategory, message: str, **kwargs):
         """Log nivel INFO"""
-        logger = cls._get_logger(category)
-        formatted = cls._format_message(message, **kwargs)
-        logger.info(formatted)
+        cls._log(logging.INFO, category, message, **kwargs)
     
     @classmethod
     def warning(cls, category: LogCategory, message: str, **kwargs):
         """Log nivel WARNING"""
-        logger = cls._get_logger(category)
-        formatted = cls._format_message(message, **kwargs)
-        logger.warning(formatted)
+        cls._log(logging.WARNING, category, message, **kwargs)
     
     @classmethod
     def error(cls, category: LogCategory, message: str, exc: Optional[Exception] = None, **kwargs):
         """Log nivel ERROR, opcionalmente con excepción"""
-        logger = cls._get_logger(category)
-        formatted = cls._format_message(message, **kwargs)
-        if exc:
-            logger.error(f"{formatted} | exception={type(exc).__name__}: {str(exc)}")
-        else:
-            logger.error(formatted)
+        cls._log(logging.ERROR, category, message, exc=exc, **kwargs)
     
     @classmethod
     def critical(cls, category: LogCategory, message: str, exc: Optional[Exception] = None, **kwargs):
         """Log nivel CRITICAL"""
-        logger = cls._get_logger(category)
-        formatted = cls._format_message(message, **kwargs)
-        if exc:
-            logger.critical(f"{formatted} | exception={type(exc).__name__}: {str(exc)}")
-        else:
-            logger.critical(formatted)
+        cls._log(logging.CRITICAL, category, message, exc=exc, **kwargs)
     
     # ============ Métodos de conveniencia por categoría ============
     
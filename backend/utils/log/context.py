@@ -0,0 +1,79 @@
+"""
+Contexto del request para los logs.
+
+- RequestContextFilter agrega a cada registro (en el hilo del request, antes de
+  encolarlo) request_id, method, endpoint y empresa_id si hay un request activo.
+- init_request_logging(app) asigna el request_id (header X-Request-Id o uno nuevo),
+  lo devuelve en la respuesta y, con LOG_REQUESTS=true, registra una línea por
+  request en la categoría api con status, duration_ms y tamaño de la respuesta.
+"""
+import logging
+import time
+import uuid
+
+from flask import has_request_context, request
+
+REQUEST_ID_HEADER = "X-Request-Id"
+
+
+def _request_id_valido(valor: str) -> bool:
+    return 0 < len(valor) <= 64 and all(c.isalnum() or c in "-_." for c in valor)
+
+
+class RequestContextFilter(logging.Filter):
+    """Adjunta el contexto del request actual a los registros (no filtra nada)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if has_request_context():
+            contexto = {
+                "request_id": getattr(request, "request_id", None),
+                "method": request.method,
+                "endpoint": request.endpoint,
+            }
+            empresa_id = getattr(request, "empresa_id", None)
+            if empresa_id is not None:
+                contexto["empresa_id"] = empresa_id
+            record.contexto = contexto
+        return True
+
+
+def duracion_request_ms():
+    """Milisegundos transcurridos desde el inicio del request actual (None fuera de un request)."""
+    if not has_request_context():
+        return None
+    inicio = getattr(request, "inicio_perf", None)
+    return round((time.perf_counter() - inicio) * 1000, 2) if inicio is not None else None
+
+
+def init_request_logging(app) -> None:
+    """
+    Registra los hooks de contexto de logs en la aplicación.
+
+    Args:
+        app: Instancia de Flask
+    """
+    registrar_requests = app.config.get("LOG_REQUESTS", False)
+
+    @app.before_request
+    def _asignar_request_id():
+        request.inicio_perf = time.perf_counter()
+        recibido = request.headers.get(REQUEST_ID_HEADER, "")
+        request.request_id = recibido if _request_id_valido(recibido) else uuid.uuid4().hex
+
+    @app.after_request
+    def _registrar_request(response):
+        request_id = getattr(request, "request_id", None)
+        if request_id:
+            response.headers[REQUEST_ID_HEADER] = request_id
+        if registrar_requests:
+            from utils.log import AppLogger, LogCategory
+
+            AppLogger.info(
+                LogCategory.API,
+                "request",
+                path=request.path,
+                status=response.status_code,
+                duration_ms=duracion_request_ms(),
+                response_bytes=response.calculate_content_length(),
+            )
+        return response
@@ -0,0 +1,66 @@
+"""
+Formatters de los archivos de log.
+
+Los datos extra de AppLogger (kwargs) viajan sin formatear en el registro
+(record.campos) junto con el contexto del request (record.contexto) y se
+renderizan aquí, en el hilo escritor del pipeline, solo para los registros que
+pasaron el nivel configurado.
+
+- TextFormatter: formato histórico "fecha | NIVEL | mensaje | clave=valor | ..."
+- JsonFormatter: un objeto JSON por línea (LOG_FORMAT=json)
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+# Claves del objeto JSON que los datos extra no pueden sobrescribir
+_CLAVES_BASE = ("ts", "level", "category", "msg")
+
+
+def _texto_valor(value: Any) -> str:
+    if isinstance(value, dict):
+        return f"{{{', '.join(f'{k}:{v}' for k, v in value.items())}}}"
+    return str(value)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato de texto con los datos extra como key=value."""
+
+    def __init__(self, fmt: str, datefmt: str = "%Y-%m-%d %H:%M:%S") -> None:
+        super().__init__(fmt, datefmt=datefmt)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        campos = getattr(record, "campos", None)
+        if campos:
+            extra = " | ".join(f"{k}={_texto_valor(v)}" for k, v in campos.items())
+            record.message = f"{record.message} | {extra}"
+        return super().formatMessage(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Un objeto por línea: ts, level, category, msg, el contexto del request
+    (request_id, method, endpoint, empresa_id) y los datos extra del registro.
+    """
+
+    def __init__(self, category: str) -> None:
+        super().__init__()
+        self.category = category
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "category": self.category,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, "contexto", None) or {})
+        for key, value in (getattr(record, "campos", None) or {}).items():
+            if key not in _CLAVES_BASE:
+                data[key] = value
+        if record.exc_info and "exception" not in data:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text and "exception" not in data:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,262 @@
+"""
+Pipeline de logs asíncrono: los loggers (AppLogger y Logger) encolan registros
+con un QueueHandler y un único hilo escritor por proceso los escribe en disco
+por lotes, de modo que el request no espera la E/S de los archivos de log.
+
+- La cola es acotada (LOG_QUEUE_SIZE). Si se llena, los registros por debajo de
+  ERROR se descartan (contados y reportados luego en el mismo archivo) y los de
+  ERROR/CRITICAL esperan hasta LOG_BLOCK_TIMEOUT segundos antes de descartarse.
+- El escritor toma hasta LOG_BATCH_SIZE registros por ciclo y hace un solo
+  flush por archivo al final del lote.
+- Con LOG_ASYNC=false los handlers se usan directamente (escritura síncrona).
+- Los archivos rotan por tamaño (LOG_MAX_BYTES) y por día (LOG_ROTATE_DAILY),
+  se comprimen (LOG_COMPRESS) y se conservan LOG_BACKUP_COUNT rotados
+  (utils/log/rotation.py).
+
+Se configura por variables de entorno porque Logger/AppLogger se usan también
+fuera de la app Flask (scripts, CLI).
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler
+from typing import Dict, List, Optional, Tuple
+
+from utils.log.rotation import RotatingLogFileHandler
+
+_STOP = object()
+
+
+def _env_bool(nombre: str, defecto: bool) -> bool:
+    return os.environ.get(nombre, str(defecto)).lower() in ("true", "1", "yes")
+
+
+class PipelineQueueHandler(QueueHandler):
+    """
+    Encola (handler destino, registro) en la cola compartida del pipeline,
+    aplicando la política de descarte cuando está llena.
+    """
+
+    def __init__(self, pipeline: "LogPipeline", target: logging.Handler) -> None:
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.target = target
+        self.setLevel(target.level)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.pipeline.ensure_writer()
+        cola = self.pipeline.queue
+        item = (self.target, record)
+        try:
+            cola.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.ERROR and self.pipeline.block_timeout > 0:
+            try:
+                cola.put(item, timeout=self.pipeline.block_timeout)
+                return
+            except queue.Full:
+                pass
+        with self.pipeline.lock:
+            self.dropped += 1
+            self.pipeline.dropped += 1
+
+
+class LogPipeline:
+    """Cola acotada y escritor en segundo plano (uno por proceso)."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        queue_size: int = 10000,
+        batch_size: int = 256,
+        block_timeout: float = 0.5,
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_daily: bool = True,
+        backup_count: int = 14,
+        compress: bool = True,
+    ) -> None:
+        self.enabled = enabled
+        self.rotation = {
+            "max_bytes": max_bytes,
+            "daily": rotate_daily,
+            "backup_count": backup_count,
+            "compress": compress,
+        }
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=max(1, queue_size))
+        self.batch_size = max(1, batch_size)
+        self.block_timeout = max(0.0, block_timeout)
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._handlers: List[PipelineQueueHandler] = []
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "LogPipeline":
+        return cls(
+            enabled=_env_bool("LOG_ASYNC", True),
+            queue_size=int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+            batch_size=int(os.environ.get("LOG_BATCH_SIZE", 256)),
+            block_timeout=float(os.environ.get("LOG_BLOCK_TIMEOUT", 0.5)),
+            max_bytes=int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 * 1024)),
+            rotate_daily=_env_bool("LOG_ROTATE_DAILY", True),
+            backup_count=int(os.environ.get("LOG_BACKUP_COUNT", 14)),
+            compress=_env_bool("LOG_COMPRESS", True),
+        )
+
+    def make_file_handler(self, path: str, formatter: logging.Formatter, level: int = logging.DEBUG) -> logging.Handler:
+        """Handler de archivo con rotación (sin flush por registro si es asíncrono)."""
+        handler = RotatingLogFileHandler(path, flush_each=not self.enabled, **self.rotation)
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+        return handler
+
+    def attach(self, handler: logging.Handler) -> logging.Handler:
+        """
+        Retorna el handler a agregar al logger: un QueueHandler que entrega al
+        handler destino desde el hilo escritor, o el mismo handler si es síncrono.
+        """
+        if not self.enabled:
+            return handler
+        queue_handler = PipelineQueueHandler(self, handler)
+        with self.lock:
+            self._handlers.append(queue_handler)
+        return queue_handler
+
+    def _after_fork_in_child(self) -> None:
+        # La cola y el lock heredados pueden estar tomados por el escritor del padre
+        # (que no existe en el hijo) y contener registros que el padre ya escribirá
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.lock = threading.Lock()
+        self._writer = None
+        self._writer_pid = None
+        for handler in self._handlers:
+            handler.queue = self.queue
+            handler.dropped = 0
+            handler.target.createLock()
+
+    def ensure_writer(self) -> None:
+        """Inicia el hilo escritor una vez por proceso (los workers de gunicorn son forks)."""
+        pid = os.getpid()
+        if self._writer_pid == pid:
+            return
+        with self.lock:
+            if self._writer_pid == pid:
+                return
+            self._writer = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._writer.start()
+            self._writer_pid = pid
+
+    def _run(self) -> None:
+        detener = False
+        while not detener:
+            lote: List[Tuple[logging.Handler, logging.LogRecord]] = []
+            item = self.queue.get()
+            while True:
+                if item is _STOP:
+                    detener = True
+                else:
+                    lote.append(item)
+                if detener or len(lote) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(lote)
+
+    def _write_batch(self, lote: List[Tuple[logging.Handler, logging.LogRecord]]) -> None:
+        usados: Dict[int, logging.Handler] = {}
+        for handler, record in lote:
+            try:
+                handler.handle(record)
+            except Exception:  # noqa: BLE001 - el escritor nunca debe morir
+                pass
+            usados[id(handler)] = handler
+        self._report_drops(usados)
+        for handler in usados.values():
+            try:
+                handler.flush()
+            except Exception:  # noqa: BLE001
+                pass
+        with self.lock:
+            self.written += len(lote)
+            self.batches += 1
+
+    def _report_drops(self, usados: Dict[int, logging.Handler]) -> None:
+        """Deja constancia en cada archivo de los registros descartados por cola llena."""
+        with self.lock:
+            pendientes = [(h, h.dropped) for h in self._handlers if h.dropped]
+            for h, _ in pendientes:
+                h.dropped = 0
+        for queue_handler, cantidad in pendientes:
+            record = logging.LogRecord(
+                "log.pipeline", logging.WARNING, __file__, 0,
+                f"Cola de logs llena: se descartaron {cantidad} registros", None, None,
+            )
+            try:
+                queue_handler.target.handle(record)
+            except Exception:  # noqa: BLE001
+                pass
+            usados[id(queue_handler.target)] = queue_handler.target
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Espera a que el escritor vacíe la cola (p. ej. al terminar un script)."""
+        if self._writer_pid != os.getpid() or self._writer is None:
+            return
+        fin = threading.Event()
+        marca = logging.LogRecord("log.pipeline", logging.DEBUG, __file__, 0, "", None, None)
+
+        class _Marca(logging.Handler):
+            def handle(self, record):
+                fin.set()
+
+        try:
+            self.queue.put((_Marca(), marca), timeout=timeout)
+        except queue.Full:
+            return
+        fin.wait(timeout)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Detiene el escritor después de escribir lo pendiente."""
+        if self._writer_pid != os.getpid() or self._writer is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._writer.join(timeout)
+        self._writer_pid = None
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+            }
+
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_log_pipeline() -> LogPipeline:
+    """Pipeline compartido del proceso (configurado desde variables de entorno)."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = LogPipeline.from_env()
+                atexit.register(_pipeline.stop)
+                os.register_at_fork(after_in_child=_pipeline._after_fork_in_child)
+    return _pipeline
@@ -0,0 +1,217 @@
+"""
+Rotación de archivos de log por tamaño y por día, segura entre procesos.
+
+Los 4 workers de gunicorn escriben (en modo append) el mismo archivo. La
+rotación la hace un solo proceso bajo un bloqueo de archivo (<archivo>.lock):
+renombra el archivo actual a <archivo>.<AAAA-MM-DD>.<n> y registra el nuevo
+período en <archivo>.state. Los demás procesos detectan en su siguiente
+verificación que la ruta apunta a otro inodo y reabren el archivo.
+
+Los archivos rotados se comprimen con gzip cuando ya nadie escribe en ellos
+(pasado COMPRESS_DELAY desde su última modificación) y se conservan los
+backup_count más recientes.
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import date
+from typing import List, Optional, Tuple
+
+from utils.file_lock import file_lock
+
+# Cada cuánto (segundos) un handler revisa tamaño, fecha e inodo del archivo
+CHECK_INTERVAL = 1.0
+# Antigüedad mínima de un archivo rotado antes de comprimirlo
+COMPRESS_DELAY = 30.0
+
+
+class RotatingLogFileHandler(logging.FileHandler):
+    """
+    FileHandler con rotación por tamaño (max_bytes) y por día, compresión gzip
+    y retención. Con flush_each=False no hace flush por registro (lo hace el
+    escritor del pipeline al final de cada lote).
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        *,
+        max_bytes: int = 0,
+        daily: bool = True,
+        backup_count: int = 14,
+        compress: bool = True,
+        flush_each: bool = True,
+        encoding: str = "utf-8",
+    ) -> None:
+        super().__init__(filename, encoding=encoding, delay=True)
+        self.max_bytes = max(0, int(max_bytes))
+        self.daily = daily
+        self.backup_count = max(0, int(backup_count))
+        self.compress = compress
+        self.flush_each = flush_each
+        self._lock_path = f"{self.baseFilename}.lock"
+        self._state_path = f"{self.baseFilename}.state"
+        self._rotated_re = re.compile(
+            re.escape(os.path.basename(self.baseFilename)) + r"\.(\d{4}-\d{2}-\d{2})\.(\d+)(\.gz)?$"
+        )
+        self._periodo: Optional[str] = None
+        self._next_check = 0.0
+        self._comprimir_en: Optional[float] = None
+
+    @property
+    def rotation_enabled(self) -> bool:
+        return self.daily or self.max_bytes > 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.rotation_enabled and time.monotonic() >= self._next_check:
+                self._next_check = time.monotonic() + CHECK_INTERVAL
+                self._check_rotation()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            if self.flush_each:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    # ----------------------------------------------------------------- estado
+
+    def _leer_periodo(self) -> Optional[str]:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as fh:
+                return fh.read().strip() or None
+        except OSError:
+            return None
+
+    def _escribir_periodo(self, periodo: str) -> None:
+        tmp = f"{self._state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(periodo)
+        os.replace(tmp, self._state_path)
+        self._periodo = periodo
+
+    def _tamano_actual(self) -> int:
+        try:
+            if self.stream is not None:
+                return os.fstat(self.stream.fileno()).st_size
+            return os.stat(self.baseFilename).st_size
+        except OSError:
+            return 0
+
+    def _reabrir_si_cambio(self) -> None:
+        """Reabre el archivo si otro proceso lo rotó (la ruta apunta a otro inodo)."""
+        if self.stream is None:
+            return
+        try:
+            actual = os.stat(self.baseFilename)
+            abierto = os.fstat(self.stream.fileno())
+            cambio = (actual.st_ino, actual.st_dev) != (abierto.st_ino, abierto.st_dev)
+        except FileNotFoundError:
+            cambio = True
+        if cambio:
+            self.stream.flush()
+            self.stream.close()
+            self.stream = self._open()
+
+    # --------------------------------------------------------------- rotación
+
+    def _check_rotation(self) -> None:
+        hoy = date.today().isoformat()
+        if self._periodo is None:
+            self._periodo = self._leer_periodo()
+
+        por_dia = self.daily and self._periodo != hoy
+        por_tamano = self.max_bytes > 0 and self._tamano_actual() >= self.max_bytes
+        if por_dia or por_tamano:
+            with file_lock(self._lock_path):
+                self._rotar(hoy)
+        elif self._comprimir_en is not None and time.time() >= self._comprimir_en:
+            # Comprimir el archivo que rotó este proceso cuando ya nadie escribe en él
+            with file_lock(self._lock_path, blocking=False) as adquirido:
+                if adquirido:
+                    self._comprimir_en = None
+                    self._comprimir_y_purgar()
+        self._reabrir_si_cambio()
+
+    def _rotar(self, hoy: str) -> None:
+        """Bajo el bloqueo: re-verifica con el estado compartido y rota si corresponde."""
+        periodo = self._leer_periodo()
+        try:
+            tamano = os.stat(self.baseFilename).st_size
+        except FileNotFoundError:
+            tamano = 0
+
+        if periodo is None:
+            # Primera vez: el archivo existente se considera del período actual
+            self._escribir_periodo(hoy)
+            periodo = hoy
+
+        rotar = tamano > 0 and (
+            (self.daily and periodo != hoy) or (self.max_bytes > 0 and tamano >= self.max_bytes)
+        )
+        if rotar:
+            # Windows no permite renombrar un archivo abierto: cerrar el propio
+            # (emit lo reabre en la ruta nueva)
+            if self.stream is not None:
+                self.stream.flush()
+                self.stream.close()
+                self.stream = None
+            try:
+                os.rename(self.baseFilename, self._siguiente_nombre(periodo))
+            except PermissionError:
+                # Otro proceso lo tiene abierto (Windows): se reintenta en el próximo chequeo
+                return
+            self._comprimir_en = time.time() + COMPRESS_DELAY + CHECK_INTERVAL
+        if periodo != hoy or rotar:
+            self._escribir_periodo(hoy)
+        self._periodo = hoy if periodo != hoy or rotar else periodo
+        self._comprimir_y_purgar()
+
+    def _rotados(self) -> List[Tuple[str, int, str]]:
+        """Archivos rotados (período, número, nombre), del más antiguo al más reciente."""
+        directorio = os.path.dirname(self.baseFilename)
+        rotados = []
+        for nombre in os.listdir(directorio):
+            m = self._rotated_re.match(nombre)
+            if m:
+                rotados.append((m.group(1), int(m.group(2)), nombre))
+        rotados.sort()
+        return rotados
+
+    def _siguiente_nombre(self, periodo: str) -> str:
+        numeros = [n for p, n, _ in self._rotados() if p == periodo]
+        return f"{self.baseFilename}.{periodo}.{max(numeros, default=0) + 1}"
+
+    def _comprimir_y_purgar(self) -> None:
+        directorio = os.path.dirname(self.baseFilename)
+        rotados = self._rotados()
+
+        if self.backup_count > 0:
+            for _, _, nombre in rotados[:-self.backup_count]:
+                try:
+                    os.remove(os.path.join(directorio, nombre))
+                except OSError:
+                    pass
+            rotados = rotados[-self.backup_count:]
+
+        if not self.compress:
+            return
+        limite = time.time() - COMPRESS_DELAY
+        for _, _, nombre in rotados:
+            ruta = os.path.join(directorio, nombre)
+            if nombre.endswith(".gz"):
+                continue
+            try:
+                if os.stat(ruta).st_mtime > limite:
+                    continue  # Otro worker pudo escribir en él hace poco
+                tmp = f"{ruta}.gz.tmp"
+                with open(ruta, "rb") as f_in, gzip.open(tmp, "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+                os.replace(tmp, f"{ruta}.gz")
+                os.remove(ruta)
+            except OSError:
+                continue
@@ -1,26 +1,42 @@
 import logging
 import os
+import threading
 import traceback
 
+from utils.log import crear_formatter, nivel_log
+from utils.log.context import RequestContextFilter
+from utils.log.pipeline import get_log_pipeline
+
 
 class Logger:
-    @staticmethod
-    def __set_logger():
-        log_directory = os.path.join(os.path.dirname(__file__), '..', 'logs')
-        if not os.path.exists(log_directory):
-            os.makedirs(log_directory)
-        log_filename = 'app.log'
-        logger = logging.getLogger(__name__)
-        logger.setLevel(logging.DEBUG)
-        log_path = os.path.join(log_directory, log_filename)
-        file_handler = logging.FileHandler(log_path, encoding='utf-8')
-        file_handler.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(message)s', "%Y-%m-%d %H:%M:%S")
-        file_handler.setFormatter(formatter)
-        if logger.hasHandlers():
-            logger.handlers.clear()
-        logger.addHandler(file_handler)
-        return logger
+    _logger = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def __set_logger(cls):
+        # El logger y su handler se crean una sola vez por proceso; la escritura
+        # la hace el pipeline de logs en segundo plano (utils/log/pipeline.py)
+        if cls._logger is not None:
+            return cls._logger
+        with cls._lock:
+            if cls._logger is not None:
+                return cls._logger
+            log_directory = os.path.join(os.path.dirname(__file__), '..', 'logs')
+            if not os.path.exists(log_directory):
+                os.makedirs(log_directory)
+            log_filename = 'app.log'
+            logger = logging.getLogger(__name__)
+            logger.setLevel(nivel_log('app'))
+            log_path = os.path.join(log_directory, log_filename)
+            formatter = crear_formatter('app', '%(asctime)s | %(levelname)s | %(message)s')
+            pipeline = get_log_pipeline()
+            file_handler = pipeline.make_file_handler(log_path, formatter)
+            if logger.hasHandlers():
+                logger.handlers.clear()
+            logger.addHandler(pipeline.attach(file_handler))
+            logger.addFilter(RequestContextFilter())
+            cls._logger = logger
+            return logger
 
     @classmethod
     def add_to_log(cls, level, message):
@@ -36,7 +52,7 @@ class Logger:
             elif level == "info":
                 logger.info(message)
             elif level == "warn":
-                logger.warn(message)
+                logger.warning(message)
         except Exception as ex:
             print(traceback.format_exc())
-            print(ex)
\ No newline at end of file
+            print(ex)
@@ -1,16 +1,19 @@
 """
 Servicio para generar y verificar códigos OTP de un solo uso (por email).
-Estos códigos son temporales y se almacenan en la sesión del usuario.
+Estos códigos son temporales y se guardan hasheados en el almacenamiento
+configurado con OTP_STORE (ver utils/otp_store.py), compartido entre workers.
 """
 import secrets
 import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timedelta
-from typing import Optional, Dict
-from pathlib import Path
+from typing import Optional
+from markupsafe import escape
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.otp_store import get_otp_store
+from utils.email_queue import get_email_queue
+from utils.email_templates import get_email_templates
 
 
 class OTPEmailService:
@@ -19,9 +22,6 @@ class OTPEmailService:
     Almacena códigos temporales con expiración.
     """
     
-    # Almacenamiento temporal en memoria (en producción usar Redis/cache)
-    _active_codes: Dict[str, Dict] = {}
-    
     # Configuración SMTP desde variables de entorno
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
@@ -30,46 +30,6 @@ class OTPEmailService:
     SENDER_EMAIL = os.getenv('SENDER_EMAIL', '')
     SENDER_NAME = os.getenv('SENDER_NAME', 'Tratios Compraventa')
     
-    # Ruta a las plantillas de email
-    TEMPLATES_DIR = Path(__file__).parent.parent / 'templates' / 'emails'
-    
-    @classmethod
-    def _load_email_template(cls, template_name: str) -> str:
-        """
-        Carga una plantilla HTML desde el directorio de templates.
-        
-        Args:
-            template_name: Nombre del archivo de plantilla (ej: 'otp_code.html')
-            
-        Returns:
-            Contenido de la plantilla como string
-        """
-        template_path = cls.TEMPLATES_DIR / template_name
-        
-        if not template_path.exists():
-            raise FileNotFoundError(f"Plantilla de email no encontrada: {template_path}")
-        
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    @classmethod
-    def _render_template(cls, template_content: str, **kwargs) -> str:
-        """
-        Renderiza una plantilla reemplazando variables {{ variable }}.
-        
-        Args:
-            template_content: Contenido de la plantilla
-            **kwargs: Variables a reemplazar en la plantilla
-            
-        Returns:
-            Plantilla renderizada
-        """
-        result = template_content
-        for key, value in kwargs.items():
-            placeholder = f"{{{{ {key} }}}}"
-            result = result.replace(placeholder, str(value))
-        return result
-    
     @classmethod
     def generate_code(cls, email: str, purpose: str = 'password_reset', length: int = 6, expires_minutes: int = 10) -> str:
         """
@@ -90,12 +50,8 @@ class OTPEmailService:
         # Crear clave única
         key = f"{email.lower()}:{purpose}"
         
-        # Almacenar código hasheado con timestamp de expiración
-        cls._active_codes[key] = {
-            'code_hash': generate_password_hash(code),
-            'expires_at': datetime.utcnow() + timedelta(minutes=expires_minutes),
-            'attempts': 0
-        }
+        # Almacenar código hasheado con su expiración
+        get_otp_store().save(key, generate_password_hash(code), expires_minutes * 60)
         
         return code
     
@@ -115,26 +71,14 @@ class OTPEmailService:
         """
         key = f"{email.lower()}:{purpose}"
         
-        if key not in cls._active_codes:
-            return False
-        
-        stored = cls._active_codes[key]
-        
-        # Verificar expiración
-        if datetime.utcnow() > stored['expires_at']:
-            cls._invalidate_code(email, purpose)
-            return False
-        
-        # Verificar intentos
-        if stored['attempts'] >= max_attempts:
-            cls._invalidate_code(email, purpose)
+        # Consumir un intento (atómico entre workers); None si no existe,
+        # expiró o ya agotó los intentos (en esos casos queda invalidado)
+        stored = get_otp_store().register_attempt(key, max_attempts)
+        if stored is None:
             return False
         
-        # Incrementar intentos
-        stored['attempts'] += 1
-        
         # Verificar código
-        is_valid = check_password_hash(stored['code_hash'], code)
+        is_valid = check_password_hash(stored.code_hash, code)
         
         if is_valid:
             # Código válido: invalidar para que no se pueda reutilizar
@@ -145,9 +89,23 @@ class OTPEmailService:
     @classmethod
     def _invalidate_code(cls, email: str, purpose: str) -> None:
         """Invalida un código OTP."""
-        key = f"{email.lower()}:{purpose}"
-        if key in cls._active_codes:
-            del cls._active_codes[key]
+        get_otp_store().delete(f"{email.lower()}:{purpose}")
+    
+    @classmethod
+    def invalidate_after_failed_email(cls, reference: str) -> None:
+        """
+        Hook de la cola de emails (EmailQueue.on_failure('otp', ...)): invalida el
+        código cuyo email terminó 'fallido' para que el usuario pueda pedir otro.
+        
+        Args:
+            reference: '<vence>:<clave>' guardado al encolar; si el código actual
+                vence en otro momento es uno más nuevo y no se toca
+        """
+        vence, _, key = reference.partition(':')
+        store = get_otp_store()
+        stored = store.get(key)
+        if stored is not None and vence.isdigit() and abs(stored.expires_at - int(vence)) < 1:
+            store.delete(key)
     
     @classmethod
     def has_active_code(cls, email: str, purpose: str = 'password_reset') -> bool:
@@ -159,17 +117,8 @@ class OTPEmailService:
         """
         key = f"{email.lower()}:{purpose}"
         
-        if key not in cls._active_codes:
-            return False
-        
-        stored = cls._active_codes[key]
-        
-        # Verificar si expiró
-        if datetime.utcnow() > stored['expires_at']:
-            cls._invalidate_code(email, purpose)
-            return False
-        
-        return True
+        # El store descarta los códigos expirados al leerlos
+        return get_otp_store().get(key) is not None
     
     @classmethod
     def get_remaining_time(cls, email: str, purpose: str = 'password_reset') -> Optional[int]:
@@ -181,23 +130,75 @@ class OTPEmailService:
         """
         key = f"{email.lower()}:{purpose}"
         
-        if key not in cls._active_codes:
+        stored = get_otp_store().get(key)
+        if stored is None:
             return None
         
-        stored = cls._active_codes[key]
-        remaining = (stored['expires_at'] - datetime.utcnow()).total_seconds()
+        return stored.remaining_seconds
+    
+    @classmethod
+    def _build_otp_email(cls, code: str, user_name: str = None, purpose: str = 'password_reset') -> tuple[str, str, str]:
+        """
+        Arma el asunto y los cuerpos (texto y HTML) del email con el código OTP.
         
-        if remaining <= 0:
-            cls._invalidate_code(email, purpose)
-            return None
+        Returns:
+            Tupla (asunto, texto, html)
+        """
+        # Personalizar asunto y contenido según el propósito
+        if purpose == 'password_reset' or purpose == 'password_change':
+            subject = '🔐 Código de verificación para cambio de contraseña'
+            subject_text = 'cambio de contraseña'
+            action_text = 'cambiar tu contraseña'
+        elif purpose == 'email_verification':
+            subject = '✉️ Verifica tu correo electrónico'
+            subject_text = 'verificación de email'
+            action_text = 'verificar tu correo'
+        else:
+            subject = '🔑 Código de verificación'
+            subject_text = 'verificación'
+            action_text = 'completar la verificación'
+        
+        # Saludo personalizado
+        greeting = f"Hola {user_name}," if user_name else "Hola,"
+        
+        # Renderizar las partes HTML y texto desde las plantillas compiladas
+        try:
+            html_content, text_content = get_email_templates().render_email(
+                'otp_code',
+                greeting=greeting,
+                subject_text=subject_text,
+                code=code,
+                action_text=action_text
+            )
+        except Exception as template_error:
+            print(f"⚠️  Error cargando plantilla de email: {template_error}")
+            # Fallback: usar HTML simple si falla la plantilla
+            html_content = f"""
+            <html>
+                <body style="font-family: Arial, sans-serif;">
+                    <p>{escape(greeting)}</p>
+                    <p>Tu código de verificación es: <strong style="font-size: 24px;">{code}</strong></p>
+                    <p>Válido por 10 minutos.</p>
+                </body>
+            </html>
+            """
+            text_content = None
+        
+        if text_content is None:
+            # Texto plano (versión simple para clientes que no soportan HTML)
+            text_content = f"{greeting}\n\nTu código de verificación es: {code}\n\nVálido por 10 minutos.\n"
         
-        return int(remaining)
+        return subject, text_content, html_content
     
     @classmethod
     def send_otp_email(cls, recipient_email: str, code: str, user_name: str = None, purpose: str = 'password_reset') -> bool:
         """
         Envía un código OTP por email usando plantilla HTML externa.
         
+        Con la app activa el email se encola (utils/email_queue.py) y lo envía un
+        hilo en segundo plano con conexiones SMTP reutilizadas; sin app (scripts)
+        se envía directamente.
+        
         Args:
             recipient_email: Email del destinatario
             code: Código OTP a enviar
@@ -205,74 +206,38 @@ class OTPEmailService:
             purpose: Propósito del código ('password_reset', 'email_verification', etc.)
             
         Returns:
-            True si el email se envió correctamente, False en caso contrario
+            True si el email se encoló o envió correctamente, False en caso contrario
         """
+        queue = get_email_queue()
+        if queue is not None:
+            if not queue.configured:
+                print("ERROR: Configuración SMTP incompleta en variables de entorno")
+                return False
+            subject, text_content, html_content = cls._build_otp_email(code, user_name, purpose)
+            # Referencia para invalidar el código si el envío falla definitivamente
+            key = f"{recipient_email.lower()}:{purpose}"
+            stored = get_otp_store().get(key)
+            reference = f"otp:{int(stored.expires_at)}:{key}" if stored is not None else None
+            try:
+                queue.enqueue(recipient_email, subject, text_content, html_content, reference=reference)
+                return True
+            except Exception as e:
+                print(f"❌ Error al encolar el email: {e}")
+                return False
+        
         try:
             # Validar configuración SMTP
             if not cls.SMTP_USERNAME or not cls.SMTP_PASSWORD or not cls.SENDER_EMAIL:
                 print("ERROR: Configuración SMTP incompleta en variables de entorno")
                 return False
             
+            subject, text_content, html_content = cls._build_otp_email(code, user_name, purpose)
+            
             # Crear mensaje
             message = MIMEMultipart('alternative')
             message['From'] = f"{cls.SENDER_NAME} <{cls.SENDER_EMAIL}>"
             message['To'] = recipient_email
-            
-            # Personalizar asunto y contenido según el propósito
-            if purpose == 'password_reset' or purpose == 'password_change':
-                message['Subject'] = '🔐 Código de verificación para cambio de contraseña'
-                subject_text = 'cambio de contraseña'
-                action_text = 'cambiar tu contraseña'
-            elif purpose == 'email_verification':
-                message['Subject'] = '✉️ Verifica tu correo electrónico'
-                subject_text = 'verificación de email'
-                action_text = 'verificar tu correo'
-            else:
-                message['Subject'] = '🔑 Código de verificación'
-                subject_text = 'verificación'
-                action_text = 'completar la verificación'
-            
-            # Saludo personalizado
-            greeting = f"Hola {user_name}," if user_name else "Hola,"
-            
-            # Texto plano (versión simple para clientes que no soportan HTML)
-            text_content = f"""
-{greeting}
-
-Has solicitado un código de verificación para {subject_text} en Tratios Compraventa.
-
-Tu código de verificación es: {code}
-
-Este código es válido por 10 minutos y solo puede usarse una vez.
-
-Si no solicitaste este código, puedes ignorar este mensaje.
-
-Saludos,
-El equipo de Tratios Compraventa
-"""
-            
-            # Cargar y renderizar plantilla HTML
-            try:
-                template = cls._load_email_template('otp_code.html')
-                html_content = cls._render_template(
-                    template,
-                    greeting=greeting,
-                    subject_text=subject_text,
-                    code=code,
-                    action_text=action_text
-                )
-            except Exception as template_error:
-                print(f"⚠️  Error cargando plantilla HTML: {template_error}")
-                # Fallback: usar HTML simple si falla la plantilla
-                html_content = f"""
-                <html>
-                    <body style="font-family: Arial, sans-serif;">
-                        <p>{greeting}</p>
-                        <p>Tu código de verificación es: <strong style="font-size: 24px;">{code}</strong></p>
-                        <p>Válido por 10 minutos.</p>
-                    </body>
-                </html>
-                """
+            message['Subject'] = subject
             
             # Adjuntar ambas versiones (texto y HTML)
             text_part = MIMEText(text_content, 'plain', 'utf-8')
@@ -0,0 +1,341 @@
+"""
+Almacenamiento de los códigos OTP de OTPEmailService.
+
+Con varios workers de gunicorn el código generado en un worker debe poder
+verificarse en cualquier otro, así que el almacenamiento es intercambiable
+(OTP_STORE):
+
+- memory: TTLCache del proceso (un solo worker, scripts y desarrollo)
+- sql:    tabla otp_codes de la base de datos de la app (por defecto)
+- redis:  servidor Redis o compatible (OTP_REDIS_URL)
+
+Todos guardan por clave "<email>:<propósito>" el hash del código, su
+vencimiento y los intentos usados, y ofrecen la misma interfaz:
+
+    save(clave, code_hash, ttl_seconds)
+    get(clave) -> OTPRecord | None          (None si no existe o venció)
+    register_attempt(clave, max_attempts)   (consume un intento de forma atómica)
+    delete(clave)
+    sweep() -> int                          (elimina los vencidos)
+
+Los vencidos se eliminan al leerlos y con un barrido periódico
+(OTP_SWEEP_INTERVAL); el total de códigos está acotado por OTP_MAX_CODES.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from utils.logger import Logger
+from utils.ttl_cache import TTLCache
+
+DEFAULT_MAX_CODES = 10000
+
+
+class OTPRecord:
+    """Código OTP almacenado."""
+
+    def __init__(self, code_hash: str, expires_at: float, attempts: int) -> None:
+        self.code_hash = code_hash
+        self.expires_at = expires_at  # epoch (segundos)
+        self.attempts = attempts
+
+    @property
+    def remaining_seconds(self) -> int:
+        return max(0, int(self.expires_at - time.time()))
+
+
+class MemoryOTPStore:
+    """Códigos en memoria del proceso, acotados en número (desaloja los menos usados)."""
+
+    def __init__(self, *, max_codes: int = DEFAULT_MAX_CODES) -> None:
+        # El TTL real va por entrada; el del caché es solo el máximo por defecto
+        self._cache = TTLCache("otp_codes", max_size=max_codes, ttl=24 * 3600)
+        self._lock = threading.Lock()
+
+    def save(self, clave: str, code_hash: str, ttl_seconds: float) -> None:
+        self._cache.set(clave, OTPRecord(code_hash, time.time() + ttl_seconds, 0), ttl=ttl_seconds)
+
+    def get(self, clave: str) -> Optional[OTPRecord]:
+        record = self._cache.get(clave)
+        if record is not None and record.expires_at <= time.time():
+            self._cache.pop(clave)
+            return None
+        return record
+
+    def register_attempt(self, clave: str, max_attempts: int) -> Optional[OTPRecord]:
+        with self._lock:
+            record = self.get(clave)
+            if record is None:
+                return None
+            if record.attempts >= max_attempts:
+                self._cache.pop(clave)
+                return None
+            record.attempts += 1
+            return OTPRecord(record.code_hash, record.expires_at, record.attempts)
+
+    def delete(self, clave: str) -> None:
+        self._cache.pop(clave)
+
+    def sweep(self) -> int:
+        # El barrido periódico lo hace el TTLCache (CACHE_SWEEP_INTERVAL)
+        return self._cache.sweep()
+
+
+class SQLOTPStore:
+    """
+    Códigos en la tabla otp_codes (SQLite/MySQL). Cada operación corre en su
+    propia transacción, independiente de la sesión del request.
+    """
+
+    def __init__(self, app, *, max_codes: int = DEFAULT_MAX_CODES, sweep_interval: float = 60) -> None:
+        self._app = app
+        self._max_codes = max(1, int(max_codes))
+        self._sweep_interval = float(sweep_interval)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def _tabla(self):
+        from models.otp_code import OTPCode
+
+        return OTPCode.__table__
+
+    @contextmanager
+    def _begin(self):
+        from database.db import db
+
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                yield conn
+
+    def save(self, clave: str, code_hash: str, ttl_seconds: float) -> None:
+        t = self._tabla
+        ahora = datetime.utcnow()
+        valores = {
+            "clave": clave,
+            "code_hash": code_hash,
+            "expires_at": ahora + timedelta(seconds=ttl_seconds),
+            "attempts": 0,
+            "creado_en": ahora,
+        }
+        for intento in range(2):
+            try:
+                with self._begin() as conn:
+                    conn.execute(delete(t).where(t.c.clave == clave))
+                    conn.execute(insert(t).values(**valores))
+                break
+            except IntegrityError:
+                # Otro worker insertó la misma clave entre el DELETE y el INSERT
+                if intento:
+                    raise
+        self._ensure_thread()
+
+    def get(self, clave: str) -> Optional[OTPRecord]:
+        t = self._tabla
+        with self._begin() as conn:
+            fila = conn.execute(
+                select(t.c.code_hash, t.c.expires_at, t.c.attempts).where(t.c.clave == clave)
+            ).first()
+            if fila is None:
+                return None
+            if fila.expires_at <= datetime.utcnow():
+                conn.execute(delete(t).where(t.c.clave == clave, t.c.expires_at <= datetime.utcnow()))
+                return None
+        return _record_desde_fila(fila)
+
+    def register_attempt(self, clave: str, max_attempts: int) -> Optional[OTPRecord]:
+        t = self._tabla
+        with self._begin() as conn:
+            # El UPDATE condicional es atómico: dos verificaciones simultáneas no
+            # pueden usar el mismo intento (la fila queda bloqueada hasta el commit)
+            resultado = conn.execute(
+                update(t)
+                .where(t.c.clave == clave, t.c.expires_at > datetime.utcnow(), t.c.attempts < max_attempts)
+                .values(attempts=t.c.attempts + 1)
+            )
+            if resultado.rowcount == 0:
+                # No existe, venció o agotó los intentos
+                conn.execute(delete(t).where(t.c.clave == clave))
+                return None
+            fila = conn.execute(
+                select(t.c.code_hash, t.c.expires_at, t.c.attempts).where(t.c.clave == clave)
+            ).first()
+        return _record_desde_fila(fila) if fila is not None else None
+
+    def delete(self, clave: str) -> None:
+        t = self._tabla
+        with self._begin() as conn:
+            conn.execute(delete(t).where(t.c.clave == clave))
+
+    def sweep(self) -> int:
+        """Elimina los vencidos y, si se supera max_codes, los más próximos a vencer."""
+        t = self._tabla
+        with self._begin() as conn:
+            eliminados = conn.execute(delete(t).where(t.c.expires_at <= datetime.utcnow())).rowcount
+            total = conn.execute(select(func.count()).select_from(t)).scalar() or 0
+            if total > self._max_codes:
+                limite = conn.execute(
+                    select(t.c.expires_at).order_by(t.c.expires_at.desc()).offset(self._max_codes).limit(1)
+                ).scalar()
+                if limite is not None:
+                    eliminados += conn.execute(delete(t).where(t.c.expires_at <= limite)).rowcount
+        return eliminados
+
+    def _ensure_thread(self) -> None:
+        # Por PID: los workers de gunicorn heredan la instancia vía fork sin el hilo
+        pid = os.getpid()
+        if self._sweep_interval <= 0 or self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="otp-store-sweeper", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:  # noqa: BLE001 - el hilo de barrido no debe morir
+                Logger.add_to_log("error", f"Error al limpiar códigos OTP vencidos: {e}")
+
+
+def _record_desde_fila(fila) -> OTPRecord:
+    # expires_at se guarda en UTC sin zona horaria
+    vence = (fila.expires_at - datetime(1970, 1, 1)).total_seconds()
+    return OTPRecord(fila.code_hash, vence, fila.attempts)
+
+
+def _texto(valor) -> str:
+    return valor.decode() if isinstance(valor, bytes) else str(valor)
+
+
+class RedisOTPStore:
+    """
+    Códigos en un servidor Redis o compatible: un hash por clave
+    (h: hash del código, a: intentos, e: vencimiento) con expiración nativa.
+    El tamaño lo acota la política maxmemory del servidor (volatile-ttl).
+
+    Recibe el cliente ya creado (redis.Redis o cualquier objeto con la misma
+    API, p. ej. un servidor local de pruebas).
+    """
+
+    def __init__(self, client, *, prefix: str = "otp:") -> None:
+        self._client = client
+        self._prefix = prefix
+
+    def _k(self, clave: str) -> str:
+        return f"{self._prefix}{clave}"
+
+    def save(self, clave: str, code_hash: str, ttl_seconds: float) -> None:
+        k = self._k(clave)
+        pipe = self._client.pipeline(transaction=True)
+        pipe.delete(k)
+        pipe.hset(k, mapping={"h": code_hash, "a": 0, "e": time.time() + ttl_seconds})
+        pipe.pexpire(k, max(1, int(ttl_seconds * 1000)))
+        pipe.execute()
+
+    def get(self, clave: str) -> Optional[OTPRecord]:
+        datos = self._client.hgetall(self._k(clave))
+        return self._record(datos)
+
+    def _record(self, datos) -> Optional[OTPRecord]:
+        if not datos:
+            return None
+        datos = {_texto(k): _texto(v) for k, v in datos.items()}
+        record = OTPRecord(datos["h"], float(datos["e"]), int(datos["a"]))
+        return record if record.expires_at > time.time() else None
+
+    def register_attempt(self, clave: str, max_attempts: int) -> Optional[OTPRecord]:
+        from redis.exceptions import WatchError
+
+        k = self._k(clave)
+        with self._client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    # WATCH/MULTI: si otro worker modifica la clave entre la lectura
+                    # y el EXEC, la transacción falla y se reintenta
+                    pipe.watch(k)
+                    record = self._record(pipe.hgetall(k))
+                    pipe.multi()
+                    if record is None or record.attempts >= max_attempts:
+                        pipe.delete(k)
+                        pipe.execute()
+                        return None
+                    pipe.hincrby(k, "a", 1)
+                    pipe.execute()
+                    record.attempts += 1
+                    return record
+                except WatchError:
+                    continue
+
+    def delete(self, clave: str) -> None:
+        self._client.delete(self._k(clave))
+
+    def sweep(self) -> int:
+        # Redis elimina las claves vencidas por sí mismo
+        return 0
+
+
+def init_otp_store(app) -> None:
+    """
+    Inicializa el almacenamiento de códigos OTP según OTP_STORE.
+
+    Args:
+        app: Instancia de Flask
+    """
+    backend = (app.config.get("OTP_STORE") or "memory").lower()
+    max_codes = int(app.config.get("OTP_MAX_CODES", DEFAULT_MAX_CODES))
+    store = None
+    if backend == "sql":
+        store = SQLOTPStore(
+            app,
+            max_codes=max_codes,
+            sweep_interval=float(app.config.get("OTP_SWEEP_INTERVAL", 60)),
+        )
+    elif backend == "redis":
+        url = app.config.get("OTP_REDIS_URL") or "redis://localhost:6379/0"
+        try:
+            import redis
+
+            store = RedisOTPStore(redis.Redis.from_url(url))
+        except ImportError:
+            Logger.add_to_log("warn", "OTP_STORE=redis requiere el paquete 'redis'. Usando memoria.")
+    if store is None:
+        store = MemoryOTPStore(max_codes=max_codes)
+    app.extensions["otp_store"] = store
+
+
+_store_local: Optional[MemoryOTPStore] = None
+_store_local_lock = threading.Lock()
+
+
+def get_otp_store():
+    """
+    Obtiene el almacenamiento de códigos OTP de la app activa.
+
+    Returns:
+        El store configurado, o uno en memoria del proceso si no hay app activa
+        (scripts que usan OTPEmailService sin crear la app)
+    """
+    global _store_local
+    from flask import current_app, has_app_context
+
+    if has_app_context():
+        store = current_app.extensions.get("otp_store")
+        if store is not None:
+            return store
+    if _store_local is None:
+        with _store_local_lock:
+            if _store_local is None:
+                _store_local = MemoryOTPStore()
+    return _store_local
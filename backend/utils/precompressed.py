@@ -0,0 +1,102 @@
+"""
+Respuestas JSON pre-renderizadas y precomprimidas con ETag.
+
+Para catálogos que solo cambian cuando cambian sus datos (países, ciudades por
+país): el cuerpo JSON se serializa una vez por versión de datos junto con sus
+variantes gzip (y brotli si el paquete está instalado), con un ETag fuerte
+derivado del contenido. Servir una respuesta es buscar el render en el caché,
+elegir la variante según Accept-Encoding y escribir los bytes, o responder 304
+si el cliente ya tiene esa versión (If-None-Match).
+"""
+import gzip
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import Response, current_app, request
+
+from utils.ttl_cache import TTLCache
+
+try:  # brotli es opcional: sin el paquete solo se ofrece gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+# Cuerpos más pequeños no se comprimen (el overhead no compensa)
+MIN_COMPRESS_SIZE = 512
+
+
+@dataclass(frozen=True)
+class PrecompressedBody:
+    """Cuerpo JSON y sus variantes comprimidas (encoding -> bytes)."""
+    etag: str
+    variants: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return sum(len(v) for v in self.variants.values())
+
+
+def render_json(payload: Any) -> PrecompressedBody:
+    """Serializa el payload igual que jsonify y genera sus variantes comprimidas."""
+    body = current_app.json.dumps(payload).encode("utf-8")
+    variants = {"identity": body}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        variants["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return PrecompressedBody(etag=hashlib.sha256(body).hexdigest()[:32], variants=variants)
+
+
+def _etag_variante(etag: str, encoding: str) -> str:
+    # Un ETag fuerte identifica la representación: distinto por codificación
+    return etag if encoding == "identity" else f"{etag}-{encoding}"
+
+
+def _elegir_codificacion(rendered: PrecompressedBody) -> str:
+    aceptadas = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in rendered.variants and aceptadas[encoding] > 0:
+            return encoding
+    return "identity"
+
+
+def send_precompressed(rendered: PrecompressedBody, *, max_age: int) -> Response:
+    """
+    Respuesta con la variante adecuada, ETag fuerte, Cache-Control y Vary.
+    Responde 304 si If-None-Match coincide con alguna variante del mismo contenido.
+    """
+    encoding = _elegir_codificacion(rendered)
+    etag = _etag_variante(rendered.etag, encoding)
+    cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+
+    if any(request.if_none_match.contains(_etag_variante(rendered.etag, e)) for e in rendered.variants):
+        response = Response(status=304)
+    else:
+        response = Response(rendered.variants[encoding], mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+class PrecompressedCache:
+    """Renders por clave (incluyendo la versión de datos) en un TTLCache acotado."""
+
+    def __init__(self, name: str, *, max_size: int, ttl: float) -> None:
+        self._cache = TTLCache(name, max_size=max_size, ttl=ttl)
+
+    def get_or_render(self, key: Hashable, build: Callable[[], Any]) -> PrecompressedBody:
+        rendered: Optional[PrecompressedBody] = self._cache.get(key)
+        if rendered is None:
+            rendered = render_json(build())
+            self._cache.set(key, rendered)
+        return rendered
+
+    def clear(self) -> None:
+        self._cache.clear()
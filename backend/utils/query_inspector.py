@@ -0,0 +1,229 @@
+"""
+Inspección de consultas SQL por request (desarrollo y staging).
+
+Con QUERY_INSPECTOR_ENABLED=true, cada consulta terminada (eventos de SQLAlchemy
+instalados por utils/request_metrics.py) se agrupa por su forma normalizada
+(literales y listas IN reemplazados por ?) dentro del request:
+
+- N+1: si una misma forma se repite QUERY_N1_THRESHOLD veces o más en un request
+  se registra una advertencia con el endpoint, la cantidad y la consulta.
+- Consultas lentas: las que tardan QUERY_SLOW_MS o más se registran con el
+  endpoint y, si QUERY_EXPLAIN=true y es un SELECT, la salida de EXPLAIN.
+- Presupuestos: QUERY_BUDGETS fija el máximo de consultas por endpoint
+  (ej: "admin_empresas.listar_empresas=5,admin_usuarios.listar_usuarios=4").
+  Al excederse se registra una advertencia y, con QUERY_BUDGET_STRICT=true o con
+  la app en modo TESTING, se lanza QueryBudgetExceeded (el test falla).
+
+Cada respuesta incluye el header X-Query-Count. Para código fuera de un request
+(scripts, tests de servicios) está el context manager query_budget().
+"""
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from flask import current_app, has_request_context, request
+
+from utils.log import AppLogger, LogCategory
+from utils.request_metrics import registrar_observador_consulta
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+# Largo máximo de SQL / EXPLAIN que se escribe en el log
+MAX_SQL_LOG = 2000
+
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA_IN = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    """Se superó el máximo de consultas SQL permitido."""
+
+    def __init__(self, endpoint: Optional[str], consultas: int, limite: int) -> None:
+        super().__init__(f"{endpoint or 'bloque'}: {consultas} consultas SQL (presupuesto {limite})")
+        self.endpoint = endpoint
+        self.consultas = consultas
+        self.limite = limite
+
+
+@lru_cache(maxsize=2048)
+def normalizar_consulta(statement: str) -> str:
+    """Forma de la consulta sin valores: las que difieren solo en parámetros coinciden."""
+    sql = _RE_ESPACIOS.sub(" ", statement).strip()
+    sql = _RE_CADENAS.sub("?", sql)
+    sql = _RE_NUMEROS.sub("?", sql)
+    return _RE_LISTA_IN.sub("IN (...)", sql)
+
+
+def _recortar(texto: str) -> str:
+    return texto if len(texto) <= MAX_SQL_LOG else texto[:MAX_SQL_LOG] + "..."
+
+
+# ----------------------------------------------------------- query_budget()
+
+_presupuestos = threading.local()
+
+
+def _contar_en_presupuestos(conn, cursor, statement, parameters, executemany, duracion):
+    for contador in getattr(_presupuestos, "activos", ()):
+        contador.append(statement)
+
+
+@contextmanager
+def query_budget(limite: int):
+    """
+    Falla si el bloque ejecuta más de `limite` consultas SQL en este hilo.
+
+    Uso:
+        with query_budget(3) as consultas:
+            servicio.listar(...)
+        # consultas: lista con el SQL ejecutado
+
+    Raises:
+        QueryBudgetExceeded: Si se superó el límite
+    """
+    registrar_observador_consulta(_contar_en_presupuestos)
+    consultas: List[str] = []
+    activos = getattr(_presupuestos, "activos", None)
+    if activos is None:
+        activos = _presupuestos.activos = []
+    activos.append(consultas)
+    try:
+        yield consultas
+    finally:
+        activos.remove(consultas)
+    if len(consultas) > limite:
+        raise QueryBudgetExceeded(None, len(consultas), limite)
+
+
+# ---------------------------------------------------------------- inspector
+
+class QueryInspector:
+    """Agrupa las consultas de cada request y reporta N+1, lentas y presupuestos excedidos."""
+
+    def __init__(
+        self,
+        *,
+        slow_ms: float = 200,
+        n1_threshold: int = 5,
+        explain: bool = True,
+        budgets: Optional[Dict[str, int]] = None,
+        strict: bool = False,
+    ) -> None:
+        self.slow_seconds = slow_ms / 1000.0
+        self.n1_threshold = max(2, n1_threshold)
+        self.explain = explain
+        self.budgets = budgets or {}
+        self.strict = strict
+
+    # Llamado desde el evento after_cursor_execute, en el hilo que ejecutó la consulta
+    def observar(self, conn, cursor, statement, parameters, executemany, duracion) -> None:
+        en_request = has_request_context() and hasattr(request, "consultas_sql")
+        if en_request:
+            forma = normalizar_consulta(statement)
+            conteo = request.consultas_sql.get(forma)
+            if conteo is None:
+                request.consultas_sql[forma] = [1, duracion]
+            else:
+                conteo[0] += 1
+                conteo[1] += duracion
+
+        if duracion >= self.slow_seconds:
+            datos = {
+                "endpoint": request.endpoint if en_request else None,
+                "duration_ms": round(duracion * 1000, 2),
+                "sql": _recortar(_RE_ESPACIOS.sub(" ", statement).strip()),
+            }
+            if self.explain and not executemany:
+                plan = self._explain(conn, statement, parameters)
+                if plan:
+                    datos["explain"] = plan
+            AppLogger.warning(LogCategory.SISTEMA, "Consulta SQL lenta", **datos)
+
+    def _explain(self, conn, statement: str, parameters) -> Optional[str]:
+        """Plan de ejecución de un SELECT con los mismos parámetros (None si no aplica o falla)."""
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return None
+        prefijo = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+        try:
+            # Cursor DBAPI directo: no dispara los eventos de SQLAlchemy ni toca la transacción
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefijo + statement, parameters)
+                filas = cursor.fetchall()
+            finally:
+                cursor.close()
+            return _recortar(" ; ".join(" | ".join(str(v) for v in fila) for fila in filas))
+        except Exception as e:  # noqa: BLE001 - el EXPLAIN es solo diagnóstico
+            return f"(EXPLAIN no disponible: {e})"
+
+    def iniciar_request(self) -> None:
+        request.consultas_sql = {}
+
+    def finalizar_request(self, response):
+        consultas = getattr(request, "consultas_sql", None)
+        if consultas is None:
+            return response
+        total = sum(c for c, _ in consultas.values())
+        response.headers[QUERY_COUNT_HEADER] = str(total)
+        endpoint = request.endpoint
+
+        for forma, (veces, segundos) in consultas.items():
+            if veces >= self.n1_threshold:
+                AppLogger.warning(
+                    LogCategory.SISTEMA,
+                    "Posible N+1: consulta repetida en el request",
+                    endpoint=endpoint,
+                    repeticiones=veces,
+                    total_ms=round(segundos * 1000, 2),
+                    total_consultas=total,
+                    sql=_recortar(forma),
+                )
+
+        limite = self.budgets.get(endpoint) if endpoint else None
+        if limite is not None and total > limite:
+            AppLogger.warning(
+                LogCategory.SISTEMA,
+                "Presupuesto de consultas excedido",
+                endpoint=endpoint,
+                consultas=total,
+                presupuesto=limite,
+            )
+            if self.strict or current_app.testing:
+                raise QueryBudgetExceeded(endpoint, total, limite)
+        return response
+
+
+def _parse_presupuestos(valor: str) -> Dict[str, int]:
+    """Convierte "endpoint=n,endpoint=n" en {endpoint: n}."""
+    presupuestos = {}
+    for regla in (valor or "").split(","):
+        endpoint, _, limite = regla.strip().partition("=")
+        if endpoint and limite:
+            presupuestos[endpoint.strip()] = int(limite)
+    return presupuestos
+
+
+def init_query_inspector(app) -> None:
+    """
+    Registra el inspector de consultas si QUERY_INSPECTOR_ENABLED=true.
+
+    Args:
+        app: Instancia de Flask
+    """
+    if not app.config.get("QUERY_INSPECTOR_ENABLED", False):
+        return
+
+    inspector = QueryInspector(
+        slow_ms=float(app.config.get("QUERY_SLOW_MS", 200)),
+        n1_threshold=int(app.config.get("QUERY_N1_THRESHOLD", 5)),
+        explain=app.config.get("QUERY_EXPLAIN", True),
+        budgets=_parse_presupuestos(app.config.get("QUERY_BUDGETS", "")),
+        strict=app.config.get("QUERY_BUDGET_STRICT", False),
+    )
+    app.extensions["query_inspector"] = inspector
+    registrar_observador_consulta(inspector.observar)
+    app.before_request(inspector.iniciar_request)
+    app.after_request(inspector.finalizar_request)
@@ -0,0 +1,222 @@
+"""
+Rate limiting por token bucket para los endpoints consumidos con API Key.
+
+Cada bucket tiene una capacidad (ráfaga máxima) y una tasa de recarga
+(tokens por segundo) configurables por scope (codigo de la API key).
+Los buckets se guardan en memoria del proceso o, para compartir el límite
+entre los workers de gunicorn del mismo host, en un archivo SQLite.
+
+Configuración (app.config / variables de entorno):
+    RATE_LIMIT_ENABLED      true/false
+    RATE_LIMIT_DEFAULT      "ráfaga:recarga_por_segundo"   ej: "60:1"
+    RATE_LIMIT_RULES        reglas por codigo              ej: "SOPORTE=30:0.5,LICENCIA=120:2"
+    RATE_LIMIT_BACKEND      memory | sqlite
+    RATE_LIMIT_SQLITE_PATH  ruta del archivo SQLite compartido
+"""
+import math
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.logger import Logger
+
+
+def _recargar(tokens: float, actualizado: float, ahora: float, capacidad: float, recarga: float) -> float:
+    """Calcula los tokens disponibles tras el tiempo transcurrido."""
+    transcurrido = max(0.0, ahora - actualizado)
+    return min(capacidad, tokens + transcurrido * recarga)
+
+
+class RateLimitResult:
+    """Resultado de un intento de consumo sobre un bucket."""
+
+    def __init__(self, allowed: bool, remaining: float, retry_after: float) -> None:
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Valor entero para el header Retry-After."""
+        return max(1, math.ceil(self.retry_after))
+
+
+class MemoryTokenBucketStore:
+    """Buckets en memoria del proceso, acotados en número de claves."""
+
+    def __init__(self, *, max_keys: int = 10000) -> None:
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def consume(self, key: str, capacidad: float, recarga: float, costo: float = 1.0) -> RateLimitResult:
+        ahora = time.time()
+        with self._lock:
+            tokens, actualizado = self._buckets.get(key, (capacidad, ahora))
+            tokens = _recargar(tokens, actualizado, ahora, capacidad, recarga)
+            resultado = _aplicar_consumo(tokens, capacidad, recarga, costo)
+            self._buckets[key] = (tokens - costo if resultado.allowed else tokens, ahora)
+            if len(self._buckets) > self._max_keys:
+                self._purgar(ahora, capacidad, recarga)
+            return resultado
+
+    def _purgar(self, ahora: float, capacidad: float, recarga: float) -> None:
+        # Un bucket lleno equivale a uno inexistente: se puede descartar
+        llenos = [
+            k for k, (tokens, actualizado) in self._buckets.items()
+            if _recargar(tokens, actualizado, ahora, capacidad, recarga) >= capacidad
+        ]
+        for k in llenos:
+            del self._buckets[k]
+        # Si aún se excede el límite, descartar los más antiguos
+        exceso = len(self._buckets) - self._max_keys
+        if exceso > 0:
+            for k, _ in sorted(self._buckets.items(), key=lambda item: item[1][1])[:exceso]:
+                del self._buckets[k]
+
+
+class SQLiteTokenBucketStore:
+    """
+    Buckets compartidos entre procesos mediante un archivo SQLite (WAL).
+    Cada consumo es una transacción BEGIN IMMEDIATE, serializada entre workers.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._local = threading.local()
+        conn = self._get_connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                clave TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                actualizado REAL NOT NULL
+            )
+            """
+        )
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key: str, capacidad: float, recarga: float, costo: float = 1.0) -> RateLimitResult:
+        conn = self._get_connection()
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, actualizado FROM rate_limit_buckets WHERE clave = ?", (key,)
+            ).fetchone()
+            tokens = capacidad if row is None else _recargar(row[0], row[1], ahora, capacidad, recarga)
+            resultado = _aplicar_consumo(tokens, capacidad, recarga, costo)
+            conn.execute(
+                """
+                INSERT INTO rate_limit_buckets (clave, tokens, actualizado) VALUES (?, ?, ?)
+                ON CONFLICT(clave) DO UPDATE SET tokens = excluded.tokens, actualizado = excluded.actualizado
+                """,
+                (key, tokens - costo if resultado.allowed else tokens, ahora),
+            )
+            conn.execute("COMMIT")
+            return resultado
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _aplicar_consumo(tokens: float, capacidad: float, recarga: float, costo: float) -> RateLimitResult:
+    if tokens >= costo:
+        return RateLimitResult(True, tokens - costo, 0.0)
+    faltante = costo - tokens
+    retry_after = faltante / recarga if recarga > 0 else 60.0
+    return RateLimitResult(False, tokens, retry_after)
+
+
+def _parse_regla(valor: str) -> Tuple[float, float]:
+    """Convierte "ráfaga:recarga" en (capacidad, recarga_por_segundo)."""
+    rafaga, _, recarga = valor.partition(":")
+    return float(rafaga), float(recarga or 1)
+
+
+class RateLimiter:
+    """
+    Aplica los límites por scope sobre dos tipos de bucket:
+    - empresa: empresa_id + codigo (todas las keys de la empresa en ese scope)
+    - api_key: api_key_id
+    """
+
+    def __init__(self, store, *, default_rule: Tuple[float, float], rules: Optional[Dict[str, Tuple[float, float]]] = None) -> None:
+        self._store = store
+        self._default_rule = default_rule
+        self._rules = {k.upper(): v for k, v in (rules or {}).items()}
+
+    def regla_para(self, codigo: Optional[str]) -> Tuple[float, float]:
+        return self._rules.get((codigo or "").upper(), self._default_rule)
+
+    def _consumir(self, key: str, codigo: Optional[str]) -> RateLimitResult:
+        capacidad, recarga = self.regla_para(codigo)
+        try:
+            return self._store.consume(key, capacidad, recarga)
+        except Exception as e:
+            # Ante fallas del backend no se bloquea el tráfico
+            Logger.add_to_log("error", f"Error en rate limiter ({key}): {e}")
+            return RateLimitResult(True, capacidad, 0.0)
+
+    def consumir_empresa(self, empresa_id: int, codigo: str) -> RateLimitResult:
+        return self._consumir(f"empresa:{empresa_id}:{(codigo or '').upper()}", codigo)
+
+    def consumir_api_key(self, api_key_id: int, codigo: str) -> RateLimitResult:
+        return self._consumir(f"api_key:{api_key_id}", codigo)
+
+
+def init_rate_limiter(app) -> None:
+    """
+    Inicializa el rate limiter con la configuración de la aplicación.
+
+    Args:
+        app: Instancia de Flask
+    """
+    if not app.config.get("RATE_LIMIT_ENABLED", True):
+        return
+
+    backend = (app.config.get("RATE_LIMIT_BACKEND") or "memory").lower()
+    store = None
+    if backend == "sqlite":
+        path = app.config.get("RATE_LIMIT_SQLITE_PATH")
+        try:
+            store = SQLiteTokenBucketStore(path)
+        except sqlite3.Error as e:
+            Logger.add_to_log("warn", f"No se pudo abrir el backend SQLite de rate limit ({path}): {e}. Usando memoria.")
+    if store is None:
+        store = MemoryTokenBucketStore()
+
+    rules = {}
+    for regla in (app.config.get("RATE_LIMIT_RULES") or "").split(","):
+        codigo, _, valor = regla.strip().partition("=")
+        if codigo and valor:
+            rules[codigo.strip()] = _parse_regla(valor.strip())
+
+    app.extensions["rate_limiter"] = RateLimiter(
+        store,
+        default_rule=_parse_regla(app.config.get("RATE_LIMIT_DEFAULT") or "60:1"),
+        rules=rules,
+    )
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Obtiene el rate limiter desde Flask.
+
+    Returns:
+        RateLimiter o None si está deshabilitado o no hay app activa
+    """
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("rate_limiter")
@@ -0,0 +1,361 @@
+"""
+Métricas de requests por endpoint.
+
+Un par de hooks before_request/after_request mide por request el tiempo total,
+el tiempo y número de consultas SQL (eventos before/after_cursor_execute de
+SQLAlchemy) y el tamaño de la respuesta, y los acumula en histogramas en
+memoria con buckets fijos por (endpoint, método).
+
+Cada worker de gunicorn vuelca periódicamente una instantánea de sus
+histogramas a METRICS_DIR/<pid>.json; /metrics suma las instantáneas de todos
+los workers (más el estado en vivo del que responde) y las expone en formato
+de texto de Prometheus, junto con los percentiles p50/p95/p99 estimados a
+partir de los buckets.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.logger import Logger
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Nombre Prometheus -> (buckets, ayuda)
+HISTOGRAMAS = {
+    "http_request_duration_seconds": (DURATION_BUCKETS, "Tiempo total del request"),
+    "http_request_db_seconds": (DURATION_BUCKETS, "Tiempo en consultas SQL por request"),
+    "http_request_queries": (QUERY_BUCKETS, "Consultas SQL por request"),
+    "http_response_size_bytes": (SIZE_BUCKETS, "Tamaño del cuerpo de la respuesta"),
+}
+
+Clave = Tuple[str, str]  # (endpoint, método)
+
+
+class Histogram:
+    """Conteos por bucket (no acumulados; el último es +Inf), suma y total."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts: Iterable[int], total_sum: float, count: int) -> None:
+        for i, c in enumerate(counts):
+            self.counts[i] += c
+        self.sum += total_sum
+        self.count += count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimación por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if self.count == 0:
+            return None
+        objetivo = q * self.count
+        acumulado = 0
+        for i, c in enumerate(self.counts):
+            if acumulado + c >= objetivo and c > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # En +Inf: el límite conocido más alto
+                inferior = self.buckets[i - 1] if i > 0 else 0.0
+                return inferior + (self.buckets[i] - inferior) * (objetivo - acumulado) / c
+            acumulado += c
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class RequestMetrics:
+    """Histogramas por (endpoint, método) y conteo por código de estado de un worker."""
+
+    def __init__(self, *, directory: Optional[str], flush_interval: float, stale_seconds: float = 3600) -> None:
+        self._directory = directory
+        self._flush_interval = float(flush_interval)
+        self._stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._series: Dict[Clave, Dict[str, Histogram]] = {}
+        self._status: Dict[Tuple[str, str, int], int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _nueva_serie(self) -> Dict[str, Histogram]:
+        return {nombre: Histogram(buckets) for nombre, (buckets, _) in HISTOGRAMAS.items()}
+
+    def observe(self, endpoint: str, method: str, status: int, *, duration: float,
+                db_time: float, queries: int, size: Optional[int]) -> None:
+        self._ensure_thread()
+        with self._lock:
+            serie = self._series.get((endpoint, method))
+            if serie is None:
+                serie = self._series[(endpoint, method)] = self._nueva_serie()
+            serie["http_request_duration_seconds"].observe(duration)
+            serie["http_request_db_seconds"].observe(db_time)
+            serie["http_request_queries"].observe(queries)
+            if size is not None:
+                serie["http_response_size_bytes"].observe(size)
+            clave_status = (endpoint, method, status)
+            self._status[clave_status] = self._status.get(clave_status, 0) + 1
+
+    # ------------------------------------------------------- instantáneas
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "series": [
+                    {"endpoint": e, "method": m, "histograms": {n: h.to_dict() for n, h in serie.items()}}
+                    for (e, m), serie in self._series.items()
+                ],
+                "status": [[e, m, s, c] for (e, m, s), c in self._status.items()],
+            }
+
+    def write_snapshot(self) -> None:
+        """Vuelca la instantánea de este worker a METRICS_DIR/<pid>.json (reemplazo atómico)."""
+        if not self._directory:
+            return
+        destino = os.path.join(self._directory, f"{os.getpid()}.json")
+        tmp = f"{destino}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(self.snapshot(), fh)
+            os.replace(tmp, destino)
+        except OSError as e:
+            Logger.add_to_log("error", f"No se pudieron guardar las métricas en {destino}: {e}")
+
+    def _snapshots(self) -> List[dict]:
+        """Instantáneas de todos los workers; la propia se toma en vivo."""
+        propias = [self.snapshot()]
+        if not self._directory:
+            return propias
+        pid = os.getpid()
+        ahora = time.time()
+        for nombre in os.listdir(self._directory):
+            if not nombre.endswith(".json") or nombre == f"{pid}.json":
+                continue
+            ruta = os.path.join(self._directory, nombre)
+            try:
+                if ahora - os.stat(ruta).st_mtime > self._stale_seconds and not _pid_vivo(int(nombre[:-5])):
+                    os.remove(ruta)  # Worker terminado hace tiempo
+                    continue
+                with open(ruta, "r", encoding="utf-8") as fh:
+                    propias.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return propias
+
+    def aggregate(self) -> Tuple[Dict[Clave, Dict[str, Histogram]], Dict[Tuple[str, str, int], int], int]:
+        """Suma de todos los workers: (series, conteo por status, cantidad de workers)."""
+        series: Dict[Clave, Dict[str, Histogram]] = {}
+        status: Dict[Tuple[str, str, int], int] = {}
+        snapshots = self._snapshots()
+        for snap in snapshots:
+            for item in snap.get("series", []):
+                clave = (item["endpoint"], item["method"])
+                destino = series.get(clave)
+                if destino is None:
+                    destino = series[clave] = self._nueva_serie()
+                for nombre, datos in item["histograms"].items():
+                    if nombre in destino:
+                        destino[nombre].merge(datos["counts"], datos["sum"], datos["count"])
+            for endpoint, method, codigo, cantidad in snap.get("status", []):
+                clave_status = (endpoint, method, int(codigo))
+                status[clave_status] = status.get(clave_status, 0) + cantidad
+        return series, status, len(snapshots)
+
+    # --------------------------------------------------------- hilo de volcado
+
+    def _ensure_thread(self) -> None:
+        # Por PID: los workers de gunicorn heredan la instancia vía fork sin el hilo
+        pid = os.getpid()
+        if not self._directory or self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            # Los datos heredados del proceso padre no son de este worker
+            self._series.clear()
+            self._status.clear()
+            self._thread = threading.Thread(target=self._run, name="request-metrics-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._flush_interval)
+            self.write_snapshot()
+
+
+def _pid_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+# ------------------------------------------------------------------ texto
+
+def _etiquetas(**labels) -> str:
+    partes = []
+    for k, v in labels.items():
+        valor = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{k}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def render_prometheus(metrics: RequestMetrics) -> str:
+    """Texto de exposición de Prometheus con los datos agregados de todos los workers."""
+    series, status, workers = metrics.aggregate()
+    lineas = [
+        "# HELP app_metrics_workers Workers con métricas agregadas en esta respuesta",
+        "# TYPE app_metrics_workers gauge",
+        f"app_metrics_workers {workers}",
+        "# HELP http_requests_total Requests por endpoint, método y código de estado",
+        "# TYPE http_requests_total counter",
+    ]
+    for (endpoint, method, codigo), cantidad in sorted(status.items()):
+        lineas.append(f"http_requests_total{_etiquetas(endpoint=endpoint, method=method, status=codigo)} {cantidad}")
+
+    claves = sorted(series)
+    for nombre, (buckets, ayuda) in HISTOGRAMAS.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} histogram")
+        for endpoint, method in claves:
+            h = series[(endpoint, method)][nombre]
+            acumulado = 0
+            for limite, c in zip(list(buckets) + ["+Inf"], h.counts):
+                acumulado += c
+                le = limite if limite == "+Inf" else _numero(limite)
+                lineas.append(f"{nombre}_bucket{_etiquetas(endpoint=endpoint, method=method, le=le)} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(endpoint=endpoint, method=method)} {_numero(h.sum)}")
+            lineas.append(f"{nombre}_count{_etiquetas(endpoint=endpoint, method=method)} {h.count}")
+
+        # Percentiles estimados (gauge aparte: un nombre no puede ser histogram y summary)
+        lineas.append(f"# HELP {nombre}_quantile Percentiles estimados desde los buckets de {nombre}")
+        lineas.append(f"# TYPE {nombre}_quantile gauge")
+        for endpoint, method in claves:
+            h = series[(endpoint, method)][nombre]
+            for q in QUANTILES:
+                valor = h.quantile(q)
+                if valor is not None:
+                    lineas.append(
+                        f"{nombre}_quantile{_etiquetas(endpoint=endpoint, method=method, quantile=q)} {_numero(float(valor))}"
+                    )
+    return "\n".join(lineas) + "\n"
+
+
+# ----------------------------------------------------------------- hooks
+
+# Funciones (conn, cursor, statement, parameters, executemany, duracion) llamadas
+# al terminar cada consulta; las usa p. ej. utils/query_inspector.py
+_observadores_consulta: List[Callable] = []
+
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio_consulta", []).append(time.perf_counter())
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get("metricas_inicio_consulta")
+    if not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    # Solo cuentan las consultas hechas desde el hilo del request
+    if has_request_context() and hasattr(request, "metricas_db_segundos"):
+        request.metricas_db_segundos += duracion
+        request.metricas_consultas += 1
+    for observador in _observadores_consulta:
+        observador(conn, cursor, statement, parameters, executemany, duracion)
+
+
+def instalar_eventos_sql() -> None:
+    """Registra (una sola vez) los eventos de SQLAlchemy que miden cada consulta."""
+    if not event.contains(Engine, "before_cursor_execute", _antes_de_consulta):
+        event.listen(Engine, "before_cursor_execute", _antes_de_consulta)
+        event.listen(Engine, "after_cursor_execute", _despues_de_consulta)
+
+
+def registrar_observador_consulta(observador: Callable) -> None:
+    """Agrega una función que recibe cada consulta terminada con su duración en segundos."""
+    instalar_eventos_sql()
+    if observador not in _observadores_consulta:
+        _observadores_consulta.append(observador)
+
+
+def init_request_metrics(app) -> None:
+    """
+    Registra la instrumentación de requests y consultas SQL.
+
+    Args:
+        app: Instancia de Flask
+    """
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    metrics = RequestMetrics(
+        directory=app.config.get("METRICS_DIR"),
+        flush_interval=float(app.config.get("METRICS_FLUSH_INTERVAL", 15)),
+    )
+    app.extensions["request_metrics"] = metrics
+    atexit.register(metrics.write_snapshot)
+
+    instalar_eventos_sql()
+
+    @app.before_request
+    def _iniciar_metricas():
+        request.metricas_inicio = time.perf_counter()
+        request.metricas_db_segundos = 0.0
+        request.metricas_consultas = 0
+
+    @app.after_request
+    def _registrar_metricas(response):
+        inicio = getattr(request, "metricas_inicio", None)
+        if inicio is not None:
+            metrics.observe(
+                request.endpoint or "sin_endpoint",
+                request.method,
+                response.status_code,
+                duration=time.perf_counter() - inicio,
+                db_time=request.metricas_db_segundos,
+                queries=request.metricas_consultas,
+                size=response.calculate_content_length(),
+            )
+        return response
+
+
+def get_request_metrics() -> Optional[RequestMetrics]:
+    """
+    Obtiene las métricas de requests desde Flask.
+
+    Returns:
+        RequestMetrics o None si no hay app activa o están deshabilitadas
+    """
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("request_metrics")
@@ -0,0 +1,252 @@
+"""
+Autenticación por API Key para los endpoints consumidos por instancias SaaS.
+
+Único punto de validación de los headers X-API-Key / X-Empresa-Id / X-Code-API.
+Resuelve la empresa y sus API keys candidatas en una sola consulta (LEFT JOIN),
+verifica la key (caché + bcrypt) y registra el uso en lote.
+
+Cada autenticación mide el tiempo por etapa (headers, db, verify, total) en ms;
+los tiempos quedan en request.api_key_auth_timings y en el log de acceso.
+
+Si el rate limiter está activo, se consume un token del bucket de la empresa
+antes de bcrypt (frena ráfagas de keys inválidas) y otro del bucket de la key
+una vez verificada. Al agotarse se responde 429 con Retry-After.
+"""
+import time
+from functools import wraps
+from typing import Dict, List, Optional
+
+from flask import jsonify, request
+from sqlalchemy import and_
+
+from database.db import db
+from models.api_key import ApiKey
+from models.empresa import Empresa
+from utils.api_key_cache import buscar_api_key_valida
+from utils.api_key_usage import registrar_uso_api_key
+from utils.log import AppLogger, LogCategory
+from utils.rate_limiter import get_rate_limiter
+
+
+class ApiKeyAuthError(Exception):
+    """Error de autenticación con su código HTTP y datos para el log."""
+
+    def __init__(self, status_code: int, error: str, message: str, log_message: str,
+                 headers: Optional[Dict[str, str]] = None, **log_data) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.error = error
+        self.message = message
+        self.log_message = log_message
+        self.headers = headers or {}
+        self.log_data = log_data
+
+
+class ApiKeyAuthContext:
+    """Resultado de una autenticación exitosa."""
+
+    def __init__(self, empresa: Empresa, api_key: ApiKey, timings: Dict[str, float]) -> None:
+        self.empresa = empresa
+        self.api_key = api_key
+        self.timings = timings
+
+    @property
+    def empresa_id(self) -> int:
+        return self.empresa.id
+
+
+def _ms(inicio: float) -> float:
+    return round((time.perf_counter() - inicio) * 1000, 2)
+
+
+def cargar_empresa_y_api_keys(empresa_id: int, codigo: str):
+    """
+    Obtiene la empresa y sus API keys activas para el código en una sola consulta.
+
+    Returns:
+        tuple[Empresa | None, list[ApiKey]]
+    """
+    filas = (
+        db.session.query(Empresa, ApiKey)
+        .outerjoin(
+            ApiKey,
+            and_(
+                ApiKey.empresa_id == Empresa.id,
+                ApiKey.codigo == codigo,
+                ApiKey.activo.is_(True),
+            ),
+        )
+        .filter(Empresa.id == empresa_id)
+        .all()
+    )
+    if not filas:
+        return None, []
+    empresa = filas[0][0]
+    api_keys: List[ApiKey] = [key for _, key in filas if key is not None]
+    return empresa, api_keys
+
+
+def _verificar_rate_limit(resultado, empresa_id: int, codigo: str, bucket: str) -> None:
+    if resultado.allowed:
+        return
+    raise ApiKeyAuthError(
+        429, 'rate_limited', 'Demasiadas solicitudes. Intente nuevamente más tarde.',
+        'Rate limit excedido', headers={'Retry-After': str(resultado.retry_after_seconds)},
+        empresa_id=empresa_id, codigo_requerido=codigo, bucket=bucket,
+        retry_after=resultado.retry_after_seconds
+    )
+
+
+def autenticar_api_key(api_key: Optional[str], empresa_id_header: Optional[str], codigo: Optional[str]) -> ApiKeyAuthContext:
+    """
+    Valida las credenciales de API Key.
+
+    Raises:
+        ApiKeyAuthError: Si falta algún header, la empresa no existe o la key no es válida
+    """
+    inicio = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    if not api_key:
+        raise ApiKeyAuthError(401, 'missing_api_key', 'X-API-Key header requerido', 'Intento de acceso sin X-API-Key')
+    if not empresa_id_header:
+        raise ApiKeyAuthError(401, 'missing_empresa_id', 'X-Empresa-Id header requerido', 'Intento de acceso sin X-Empresa-Id')
+    if not codigo:
+        raise ApiKeyAuthError(401, 'missing_codigo_key', 'X-Code-API header requerido', 'Intento de acceso sin X-Code-API')
+
+    try:
+        empresa_id = int(empresa_id_header)
+    except ValueError:
+        raise ApiKeyAuthError(
+            400, 'invalid_empresa_id', 'X-Empresa-Id debe ser numérico',
+            'X-Empresa-Id inválido (no numérico)', empresa_id_header=empresa_id_header
+        )
+    timings['headers_ms'] = _ms(inicio)
+
+    etapa = time.perf_counter()
+    empresa, api_keys = cargar_empresa_y_api_keys(empresa_id, codigo)
+    timings['db_ms'] = _ms(etapa)
+
+    if empresa is None:
+        raise ApiKeyAuthError(
+            404, 'empresa_not_found', 'Empresa no encontrada',
+            'Intento de acceso con empresa_id inexistente', empresa_id=empresa_id
+        )
+    if not api_keys:
+        raise ApiKeyAuthError(
+            403, 'no_active_keys', f'No hay API keys activas para el scope "{codigo}"',
+            f'Empresa sin API keys activas para código {codigo}',
+            empresa_id=empresa_id, codigo_requerido=codigo
+        )
+
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        _verificar_rate_limit(limiter.consumir_empresa(empresa_id, codigo), empresa_id, codigo, 'empresa')
+
+    etapa = time.perf_counter()
+    api_key_valida = buscar_api_key_valida(api_key, empresa_id, codigo, api_keys)
+    timings['verify_ms'] = _ms(etapa)
+
+    if api_key_valida is None:
+        raise ApiKeyAuthError(
+            403, 'invalid_api_key', 'API Key inválida o expirada', 'API Key inválida o expirada',
+            empresa_id=empresa_id, codigo_requerido=codigo,
+            api_key_prefix=api_key[:8] if len(api_key) >= 8 else 'corta'
+        )
+
+    if limiter is not None:
+        _verificar_rate_limit(limiter.consumir_api_key(api_key_valida.id, codigo), empresa_id, codigo, 'api_key')
+
+    timings['total_ms'] = _ms(inicio)
+    return ApiKeyAuthContext(empresa, api_key_valida, timings)
+
+
+def autenticar_request(categoria: LogCategory) -> ApiKeyAuthContext:
+    """
+    Autentica el request actual y deja el contexto en request
+    (empresa_id, api_key_id, api_key_codigo, api_key_auth_timings).
+
+    Raises:
+        ApiKeyAuthError: Si la autenticación falla (ya registrada en el log)
+    """
+    try:
+        contexto = autenticar_api_key(
+            request.headers.get('X-API-Key'),
+            request.headers.get('X-Empresa-Id'),
+            request.headers.get('X-Code-API'),
+        )
+    except ApiKeyAuthError as e:
+        AppLogger.warning(
+            categoria,
+            e.log_message,
+            ip=request.remote_addr,
+            endpoint=request.endpoint,
+            **e.log_data
+        )
+        raise
+
+    # Registrar último uso (se persiste en lote, fuera del request)
+    try:
+        registrar_uso_api_key(contexto.api_key.id)
+    except Exception as e:
+        AppLogger.error(
+            categoria,
+            'Error al registrar uso de API key',
+            api_key_id=contexto.api_key.id,
+            exc=e
+        )
+        # No bloqueamos el request por esto
+
+    request.empresa_id = contexto.empresa_id
+    request.api_key_id = contexto.api_key.id
+    request.api_key_codigo = contexto.api_key.codigo
+    request.api_key_auth_timings = contexto.timings
+
+    AppLogger.info(
+        categoria,
+        'Acceso autorizado con API Key',
+        empresa_id=contexto.empresa_id,
+        empresa_nombre=contexto.empresa.nombre,
+        api_key_id=contexto.api_key.id,
+        api_key_nombre=contexto.api_key.nombre,
+        api_key_codigo=contexto.api_key.codigo,
+        endpoint=request.endpoint,
+        ip=request.remote_addr,
+        **contexto.timings
+    )
+    return contexto
+
+
+def respuesta_error_api_key(error: ApiKeyAuthError, *, incluir_success: bool = False):
+    """Construye la respuesta JSON de error de autenticación."""
+    body = {'message': error.message, 'error': error.error}
+    if incluir_success:
+        body = {'success': False, **body}
+    return jsonify(body), error.status_code, error.headers
+
+
+def api_key_required(categoria: LogCategory = LogCategory.API, *, incluir_success: bool = False):
+    """
+    Decorador para validar API Key desde base de datos.
+    Recibe el codigo (scope) desde el header X-Code-API enviado por el cliente.
+
+    Requiere headers:
+    - X-API-Key: API key en texto plano
+    - X-Empresa-Id: ID de la empresa
+    - X-Code-API: Código del scope ('LICENCIA', 'SOPORTE', 'FACTURACION', 'GENERAL')
+
+    Args:
+        categoria: Categoría de log para los eventos de autenticación
+        incluir_success: Agrega 'success': False a las respuestas de error
+                         (formato de la API interna de soporte)
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                autenticar_request(categoria)
+            except ApiKeyAuthError as e:
+                return respuesta_error_api_key(e, incluir_success=incluir_success)
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,174 @@
+"""
+Búsqueda de texto completo sobre tickets de soporte.
+
+En MySQL usa los índices FULLTEXT de soporte_tickets(titulo, descripcion) y
+soporte_tickets_comentarios(comentario) en modo BOOLEAN, con cada término como
+prefijo obligatorio (+term*). En otros motores (SQLite en desarrollo) o cuando
+todos los términos son más cortos que el mínimo indexado, se recurre a LIKE.
+
+También genera fragmentos resaltados (<mark>) para mostrar las coincidencias.
+"""
+import html
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import match
+
+from database.db import db
+from models.soporte_ticket import SoporteTicket, SoporteTicketComentario
+
+# innodb_ft_min_token_size por defecto
+MIN_LONGITUD_TERMINO_FULLTEXT = 3
+MAX_TERMINOS = 8
+
+_TERMINO_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def extraer_terminos(texto: str) -> List[str]:
+    """Separa la búsqueda en términos, descartando operadores y duplicados."""
+    terminos = []
+    for termino in _TERMINO_RE.findall(texto or ""):
+        termino = termino.lower()
+        if termino not in terminos:
+            terminos.append(termino)
+    return terminos[:MAX_TERMINOS]
+
+
+def _usa_fulltext() -> bool:
+    return db.session.get_bind().dialect.name == "mysql"
+
+
+def _consulta_boolean(terminos: List[str]) -> Optional[str]:
+    """Consulta BOOLEAN MODE: todos los términos obligatorios y por prefijo (+fact* +impres*)."""
+    utiles = [t for t in terminos if len(t) >= MIN_LONGITUD_TERMINO_FULLTEXT]
+    if not utiles:
+        return None
+    return " ".join(f"+{t}*" for t in utiles)
+
+
+def _condicion_like(termino: str):
+    patron = f"%{termino}%"
+    en_comentarios = SoporteTicket.id.in_(
+        select(SoporteTicketComentario.ticket_id).where(SoporteTicketComentario.comentario.ilike(patron))
+    )
+    return db.or_(
+        SoporteTicket.titulo.ilike(patron),
+        SoporteTicket.descripcion.ilike(patron),
+        en_comentarios,
+    )
+
+
+def aplicar_busqueda_tickets(query, texto: str):
+    """
+    Filtra la consulta de tickets por el texto de búsqueda
+    (título, descripción y comentarios).
+    """
+    terminos = extraer_terminos(texto)
+    if not terminos:
+        return query
+
+    consulta = _consulta_boolean(terminos) if _usa_fulltext() else None
+    if consulta:
+        en_ticket = match(SoporteTicket.titulo, SoporteTicket.descripcion, against=consulta).in_boolean_mode()
+        en_comentarios = SoporteTicket.id.in_(
+            select(SoporteTicketComentario.ticket_id).where(
+                match(SoporteTicketComentario.comentario, against=consulta).in_boolean_mode()
+            )
+        )
+        return query.filter(db.or_(en_ticket > 0, en_comentarios))
+
+    return query.filter(db.and_(*[_condicion_like(t) for t in terminos]))
+
+
+def puntaje_busqueda_tickets(texto: str):
+    """
+    Expresión de relevancia para ORDER BY (mayor es más relevante).
+    Retorna None si el texto no tiene términos.
+    """
+    terminos = extraer_terminos(texto)
+    if not terminos:
+        return None
+
+    consulta = _consulta_boolean(terminos) if _usa_fulltext() else None
+    if consulta:
+        # Mejor comentario del ticket: una coincidencia solo en comentarios
+        # se ordena por su puntaje igual que una en título/descripción
+        en_comentarios = (
+            select(db.func.max(
+                match(SoporteTicketComentario.comentario, against=consulta).in_boolean_mode()
+            ))
+            .where(SoporteTicketComentario.ticket_id == SoporteTicket.id)
+            .scalar_subquery()
+        )
+        return (
+            match(SoporteTicket.titulo, SoporteTicket.descripcion, against=consulta).in_boolean_mode()
+            + db.func.coalesce(en_comentarios, 0)
+        )
+
+    # Fallback: coincidencias en el título pesan más que en la descripción y los comentarios
+    puntaje = None
+    for termino in terminos:
+        patron = f"%{termino}%"
+        en_comentarios = db.exists().where(
+            SoporteTicketComentario.ticket_id == SoporteTicket.id,
+            SoporteTicketComentario.comentario.ilike(patron),
+        )
+        parcial = (
+            db.case((SoporteTicket.titulo.ilike(patron), 3), else_=0)
+            + db.case((SoporteTicket.descripcion.ilike(patron), 1), else_=0)
+            + db.case((en_comentarios, 1), else_=0)
+        )
+        puntaje = parcial if puntaje is None else puntaje + parcial
+    return puntaje
+
+
+def _plegar(texto: str) -> str:
+    """Minúsculas sin tildes, conservando la longitud (1 carácter -> 1 carácter)."""
+    return "".join(unicodedata.normalize("NFKD", c)[0].lower()[0] for c in texto)
+
+
+def resaltar(texto: Optional[str], terminos: List[str], *, max_len: int = 160) -> Optional[str]:
+    """
+    Fragmento HTML-escapado del texto con las coincidencias envueltas en <mark>.
+    Retorna None si no hay coincidencias.
+    """
+    if not texto or not terminos:
+        return None
+
+    plegado = _plegar(texto)
+    patron = re.compile(
+        r"\b(" + "|".join(re.escape(_plegar(t)) for t in sorted(terminos, key=len, reverse=True)) + r")",
+        re.UNICODE,
+    )
+    coincidencias = list(patron.finditer(plegado))
+    if not coincidencias:
+        return None
+
+    # Ventana alrededor de la primera coincidencia
+    primera = coincidencias[0].start()
+    inicio = max(0, primera - max_len // 3)
+    fin = min(len(texto), inicio + max_len)
+
+    partes = ["…" if inicio > 0 else ""]
+    cursor = inicio
+    for m in coincidencias:
+        if m.start() < cursor or m.end() > fin:
+            continue
+        partes.append(html.escape(texto[cursor:m.start()]))
+        partes.append(f"<mark>{html.escape(texto[m.start():m.end()])}</mark>")
+        cursor = m.end()
+    partes.append(html.escape(texto[cursor:fin]))
+    partes.append("…" if fin < len(texto) else "")
+    return "".join(partes)
+
+
+def resaltar_ticket(ticket_dict: dict, texto: str) -> dict:
+    """Agrega la clave 'resaltado' (titulo/descripcion) al ticket serializado."""
+    terminos = extraer_terminos(texto)
+    ticket_dict["resaltado"] = {
+        "titulo": resaltar(ticket_dict.get("titulo"), terminos, max_len=255),
+        "descripcion": resaltar(ticket_dict.get("descripcion"), terminos),
+    }
+    return ticket_dict
@@ -0,0 +1,773 @@
+"""
+Servicio de tickets de soporte.
+
+Lógica compartida entre el panel admin (routes/admin_soporte_tickets.py) y la
+API interna para instancias SaaS (routes/api_soporte.py): consultas del listado
+(filtros, orden, cursor, estadísticas), creación con validación de
+disponibilidad, detalle, comentarios y archivos adjuntos.
+
+Las funciones no construyen respuestas HTTP: retornan datos o lanzan
+TicketServiceError con el código y mensaje a responder.
+"""
+import base64
+import json
+import os
+from datetime import datetime, timezone, timedelta
+
+from flask import current_app
+
+from database.db import db
+from models.soporte_ticket import SoporteTicket, SoporteTicketComentario
+from models.soporte_suscripcion import SoporteSuscripcion
+from utils.file_handler import (
+    allowed_file, validate_file_size, get_upload_path,
+    generate_unique_filename, get_file_info
+)
+from utils.log import AppLogger, LogCategory
+from utils.ticket_search import aplicar_busqueda_tickets, puntaje_busqueda_tickets, resaltar_ticket
+from utils.ttl_cache import TTLCache
+
+# Zona horaria de Colombia (UTC-5)
+COLOMBIA_TZ = timezone(timedelta(hours=-5))
+
+MAX_ARCHIVOS_POR_CARGA = 10
+
+
+def get_local_now():
+    """Obtiene la fecha/hora actual en zona horaria de Colombia"""
+    return datetime.now(COLOMBIA_TZ)
+
+
+class TicketServiceError(Exception):
+    """Error de negocio con el código HTTP a responder."""
+
+    def __init__(self, status_code: int, message: str, error: str = None, datos: dict = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.error = error
+        self.datos = datos or {}  # Campos adicionales para la respuesta
+
+
+ESTADOS_ACTIVOS_TICKET = ('abierto', 'en_proceso', 'pendiente_respuesta')
+ORDEN_PRIORIDAD_TICKET = {'critica': 1, 'alta': 2, 'media': 3, 'baja': 4}
+
+
+def _grupo_activo_expr():
+    """0 para tickets activos, 1 para cerrados/cancelados."""
+    return db.case((SoporteTicket.estado.in_(ESTADOS_ACTIVOS_TICKET), 0), else_=1)
+
+
+def _rango_prioridad_expr():
+    """Rango numérico de la prioridad (critica=1 ... baja=4, otro=5)."""
+    return db.case(ORDEN_PRIORIDAD_TICKET, value=SoporteTicket.prioridad, else_=5)
+
+
+def orden_tickets():
+    """
+    ORDER BY del listado de tickets: activos primero, luego por prioridad
+    y por fecha de creación descendente (id como desempate estable).
+    """
+    return (
+        _grupo_activo_expr(),
+        _rango_prioridad_expr(),
+        SoporteTicket.fecha_creacion.desc(),
+        SoporteTicket.id.desc(),
+    )
+
+
+def codificar_cursor_ticket(ticket):
+    """Genera el cursor opaco (base64 de JSON) que apunta después de este ticket."""
+    valores = [
+        0 if ticket.estado in ESTADOS_ACTIVOS_TICKET else 1,
+        ORDEN_PRIORIDAD_TICKET.get(ticket.prioridad, 5),
+        ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
+        ticket.id,
+    ]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+
+def aplicar_cursor_tickets(query, cursor):
+    """
+    Filtra la consulta para continuar después del cursor, respetando orden_tickets().
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        grupo, rango, fecha, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        grupo, rango, ticket_id = int(grupo), int(rango), int(ticket_id)
+        fecha = datetime.fromisoformat(fecha) if fecha else None
+    except Exception as e:
+        raise ValueError('cursor inválido') from e
+    
+    grupo_expr = _grupo_activo_expr()
+    rango_expr = _rango_prioridad_expr()
+    mismo_rango = db.and_(grupo_expr == grupo, rango_expr == rango)
+    
+    if fecha is None:
+        # fecha_creacion nula: solo queda desempatar por id
+        despues_en_rango = SoporteTicket.id < ticket_id
+    else:
+        despues_en_rango = db.or_(
+            SoporteTicket.fecha_creacion < fecha,
+            db.and_(SoporteTicket.fecha_creacion == fecha, SoporteTicket.id < ticket_id),
+        )
+    
+    return query.filter(db.or_(
+        grupo_expr > grupo,
+        db.and_(grupo_expr == grupo, rango_expr > rango),
+        db.and_(mismo_rango, despues_en_rango),
+    ))
+
+
+def filtrar_tickets(query, args):
+    """
+    Aplica los filtros comunes del listado/estadísticas de tickets.
+
+    Args:
+        query: Consulta base sobre SoporteTicket
+        args: request.args (o dict equivalente)
+    """
+    empresa_id = args.get('empresa_id', type=int)
+    if empresa_id:
+        query = query.filter(SoporteTicket.empresa_id == empresa_id)
+    
+    estado = args.get('estado')
+    if estado:
+        query = query.filter(SoporteTicket.estado == estado)
+    
+    prioridad = args.get('prioridad')
+    if prioridad:
+        query = query.filter(SoporteTicket.prioridad == prioridad)
+    
+    asignado_a = args.get('asignado_a', type=int)
+    if asignado_a:
+        query = query.filter(SoporteTicket.asignado_a == asignado_a)
+    
+    sin_asignar = args.get('sin_asignar')
+    if sin_asignar and sin_asignar.lower() == 'true':
+        query = query.filter(SoporteTicket.asignado_a.is_(None))
+    
+    # Búsqueda de texto completo en título, descripción y comentarios
+    busqueda = args.get('busqueda')
+    if busqueda:
+        query = aplicar_busqueda_tickets(query, busqueda)
+    
+    return query
+
+
+def calcular_estadisticas_tickets(query):
+    """
+    Conteos por estado/prioridad/asignación sobre la consulta filtrada,
+    en un único SELECT con SUM(CASE ...).
+    """
+    def contar(condicion):
+        return db.func.coalesce(db.func.sum(db.case((condicion, 1), else_=0)), 0)
+    
+    no_finalizado = SoporteTicket.estado.notin_(('cerrado', 'cancelado'))
+    fila = query.order_by(None).with_entities(
+        db.func.count(SoporteTicket.id),
+        contar(SoporteTicket.estado == 'abierto'),
+        contar(SoporteTicket.estado == 'en_proceso'),
+        contar(SoporteTicket.estado == 'pendiente_respuesta'),
+        contar(SoporteTicket.estado == 'cerrado'),
+        contar(SoporteTicket.estado == 'cancelado'),
+        contar(db.and_(SoporteTicket.prioridad == 'critica', no_finalizado)),
+        contar(SoporteTicket.asignado_a.is_(None)),
+        contar(db.and_(SoporteTicket.asignado_a.is_(None), no_finalizado)),
+    ).one()
+    
+    total, abiertos, en_proceso, pendiente, cerrados, cancelados, criticos, sin_asignar, sin_asignar_activos = (int(v or 0) for v in fila)
+    return {
+        'total': total,
+        'abiertos': abiertos,
+        'en_proceso': en_proceso,
+        'pendiente_respuesta': pendiente,
+        'cerrados': cerrados,
+        'cancelados': cancelados,
+        'criticos': criticos,
+        'sin_asignar': sin_asignar,
+        'sin_asignar_activos': sin_asignar_activos,
+        'activos': abiertos + en_proceso + pendiente
+    }
+
+
+# Caché corto de estadísticas para el dashboard admin (consulta constante)
+_ESTADISTICAS_CACHE_MAX = 256
+_estadisticas_cache = TTLCache("ticket_stats", max_size=_ESTADISTICAS_CACHE_MAX, ttl=15)
+
+
+def obtener_estadisticas_tickets(args, usar_cache=False):
+    """
+    Estadísticas de tickets para los filtros dados.
+    Con usar_cache=True reutiliza el resultado durante TICKET_STATS_CACHE_TTL segundos.
+    """
+    ttl = current_app.config.get('TICKET_STATS_CACHE_TTL', 15)
+    clave = tuple(sorted((k, v) for k, v in args.items() if k in (
+        'empresa_id', 'estado', 'prioridad', 'asignado_a', 'sin_asignar', 'busqueda'
+    )))
+    
+    if usar_cache and ttl > 0:
+        estadisticas = _estadisticas_cache.get(clave)
+        if estadisticas is not None:
+            return estadisticas
+    
+    estadisticas = calcular_estadisticas_tickets(filtrar_tickets(SoporteTicket.query, args))
+    
+    if usar_cache and ttl > 0:
+        _estadisticas_cache.set(clave, estadisticas, ttl)
+    
+    return estadisticas
+
+
+def listar_tickets(args, *, usar_cache_estadisticas=False):
+    """
+    Página de tickets con filtros, orden, paginación y estadísticas.
+
+    Args:
+        args: request.args (o MultiDict equivalente) con filtros, page, per_page,
+              cursor, busqueda y orden
+        usar_cache_estadisticas: Reutilizar estadísticas recientes
+
+    Returns:
+        dict: tickets, total, page, per_page, pages, next_cursor, estadisticas
+
+    Raises:
+        TicketServiceError: Cursor inválido o no aplicable
+    """
+    query = filtrar_tickets(SoporteTicket.query, args)
+    
+    # Paginación
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = args.get('per_page', 20, type=int)
+    
+    # Limitar per_page a un máximo razonable
+    per_page = max(min(per_page, 100), 1)
+    
+    # Estadísticas sobre el mismo filtro (un solo agregado en SQL); incluyen el total
+    estadisticas = obtener_estadisticas_tickets(args, usar_cache=usar_cache_estadisticas)
+    if usar_cache_estadisticas:
+        # Del caché solo el desglose: el total debe coincidir con la página, que es fresca
+        total = query.order_by(None).with_entities(db.func.count(SoporteTicket.id)).scalar()
+        estadisticas = {**estadisticas, 'total': total}
+    else:
+        total = estadisticas['total']
+    
+    # Relaciones precargadas para serializar la página sin N+1
+    query = query.options(*SoporteTicket.opciones_carga_relaciones())
+    
+    busqueda = args.get('busqueda')
+    puntaje = None
+    if busqueda and args.get('orden') == 'relevancia':
+        puntaje = puntaje_busqueda_tickets(busqueda)
+    
+    # Orden: activos primero, luego prioridad y los más recientes primero
+    cursor = args.get('cursor')
+    if puntaje is not None:
+        if cursor:
+            raise TicketServiceError(400, 'cursor no disponible con orden=relevancia')
+        tickets_paginados = (
+            query.order_by(puntaje.desc(), SoporteTicket.id.desc())
+            .offset((page - 1) * per_page).limit(per_page + 1).all()
+        )
+    elif cursor:
+        # Paginación por cursor (keyset): costo constante en páginas profundas
+        try:
+            query = aplicar_cursor_tickets(query, cursor)
+        except ValueError:
+            raise TicketServiceError(400, 'cursor inválido')
+        tickets_paginados = query.order_by(*orden_tickets()).limit(per_page + 1).all()
+    else:
+        tickets_paginados = query.order_by(*orden_tickets()).offset((page - 1) * per_page).limit(per_page + 1).all()
+    
+    # Se pide un registro extra para saber si hay página siguiente
+    hay_siguiente = len(tickets_paginados) > per_page
+    tickets_paginados = tickets_paginados[:per_page]
+    
+    tickets = SoporteTicket.to_dict_lista(tickets_paginados)
+    if busqueda:
+        tickets = [resaltar_ticket(t, busqueda) for t in tickets]
+    
+    return {
+        'tickets': tickets,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'next_cursor': (
+            codificar_cursor_ticket(tickets_paginados[-1])
+            if hay_siguiente and tickets_paginados and puntaje is None else None
+        ),
+        'estadisticas': {k: v for k, v in estadisticas.items() if k != 'sin_asignar_activos'}
+    }
+
+
+def calcular_disponibilidad_soporte(suscripcion):
+    """
+    Calcula la disponibilidad de tickets/horas según la modalidad del tipo de soporte.
+    
+    Args:
+        suscripcion: SoporteSuscripcion instance
+    
+    Returns:
+        dict con información de disponibilidad:
+        {
+            'tiene_disponible': bool,
+            'mensaje': str,
+            'consumido': int/float,
+            'maximo': int/float,
+            'disponible': int/float,
+            'modalidad': str,
+            'periodo_inicio': date,
+            'periodo_fin': date,
+            'requiere_horario_laboral': bool,
+            'respuesta_esperada': str
+        }
+    """
+    tipo_soporte = suscripcion.tipo_soporte
+    modalidad = tipo_soporte.modalidad
+    
+    resultado = {
+        'tiene_disponible': True,
+        'mensaje': '',
+        'consumido': 0,
+        'maximo': 0,
+        'disponible': 0,
+        'modalidad': modalidad,
+        'periodo_inicio': suscripcion.fecha_inicio,
+        'periodo_fin': suscripcion.fecha_fin,
+        'requiere_horario_laboral': False,
+        'respuesta_esperada': ''
+    }
+    
+    # Determinar periodo de evaluación basado en modalidad
+    fecha_inicio = suscripcion.fecha_inicio
+    fecha_fin = suscripcion.fecha_fin
+    
+    # Si es mensual o anual, usar el rango de fechas de la suscripción
+    # Ya está definido en fecha_inicio y fecha_fin
+    
+    # Validar si está dentro del periodo
+    ahora = get_local_now().date()
+    if ahora < fecha_inicio or (fecha_fin and ahora > fecha_fin):
+        resultado['tiene_disponible'] = False
+        resultado['mensaje'] = 'La suscripción de soporte no está vigente en este momento'
+        return resultado
+    
+    # Modalidad: por_horas
+    if modalidad == 'por_horas':
+        max_horas = tipo_soporte.max_horas or 0
+        horas_consumidas = float(suscripcion.horas_consumidas or 0)
+        horas_disponibles = max_horas - horas_consumidas
+        
+        resultado['consumido'] = horas_consumidas
+        resultado['maximo'] = max_horas
+        resultado['disponible'] = horas_disponibles
+        
+        if horas_disponibles <= 0:
+            resultado['tiene_disponible'] = False
+            resultado['mensaje'] = f'Ha consumido todas las horas disponibles ({max_horas} horas) para este periodo'
+        else:
+            resultado['mensaje'] = f'Tiene {horas_disponibles:.2f} horas disponibles de {max_horas}'
+    
+    # Modalidad: por_tickets
+    elif modalidad == 'por_tickets':
+        max_tickets = tipo_soporte.max_tickets or 0
+        
+        # Contar tickets NO cancelados en el periodo (incluye abiertos, en_proceso, pendiente_respuesta, cerrados)
+        # Solo excluimos 'cancelado' porque esos no consumen el cupo
+        fecha_inicio_dt = datetime.combine(fecha_inicio, datetime.min.time(), tzinfo=COLOMBIA_TZ)
+        fecha_fin_dt = datetime.combine(fecha_fin or ahora, datetime.max.time(), tzinfo=COLOMBIA_TZ)
+        
+        tickets_activos = SoporteTicket.query.filter(
+            SoporteTicket.soporte_suscripcion_id == suscripcion.id,
+            SoporteTicket.fecha_creacion >= fecha_inicio_dt,
+            SoporteTicket.fecha_creacion <= fecha_fin_dt,
+            SoporteTicket.estado != 'cancelado'  # Solo excluir cancelados
+        ).count()
+        
+        tickets_disponibles = max_tickets - tickets_activos
+        
+        resultado['consumido'] = tickets_activos
+        resultado['maximo'] = max_tickets
+        resultado['disponible'] = tickets_disponibles
+        
+        if tickets_disponibles <= 0:
+            resultado['tiene_disponible'] = False
+            resultado['mensaje'] = f'Ha consumido todos los tickets disponibles ({max_tickets} tickets) para este periodo'
+        else:
+            resultado['mensaje'] = f'Tiene {tickets_disponibles} tickets disponibles de {max_tickets}'
+    
+    # Modalidad: mensual o anual (soporte básico)
+    elif modalidad in ['mensual', 'anual']:
+        # Verificar si es tipo "básico" - requiere horario laboral
+        if 'basico' in tipo_soporte.nombre.lower() or 'básico' in tipo_soporte.nombre.lower():
+            resultado['requiere_horario_laboral'] = True
+            resultado['respuesta_esperada'] = 'Atención por correo y chat, en horario laboral. Respuesta en máximo 24 horas.'
+            
+            # Verificar si estamos en horario laboral (lunes a viernes, 8am-6pm Colombia)
+            ahora = get_local_now()
+            es_dia_laboral = ahora.weekday() < 5  # 0-4 es lunes a viernes
+            hora_actual = ahora.hour
+            es_horario_laboral = 8 <= hora_actual < 18
+            
+            if not es_dia_laboral or not es_horario_laboral:
+                resultado['mensaje'] = '⚠️ Horario laboral: Lunes a Viernes, 8:00 AM - 6:00 PM. Su ticket será atendido en el siguiente horario hábil.'
+            else:
+                resultado['mensaje'] = 'Soporte básico activo. Respuesta en máximo 24 horas hábiles.'
+        
+        # Verificar si es tipo "24/7" o "premium"
+        elif '24' in tipo_soporte.nombre or 'premium' in tipo_soporte.nombre.lower():
+            resultado['respuesta_esperada'] = 'Atención inmediata todos los días del año. Línea prioritaria.'
+            resultado['mensaje'] = '🚀 Soporte prioritario 24/7 activo. Atención inmediata.'
+        else:
+            resultado['mensaje'] = f'Soporte {tipo_soporte.nombre} activo - Sin límite de tickets'
+    
+    return resultado
+
+
+def crear_ticket(data, *, usuario_id, es_api_externa=False):
+    """
+    Valida la suscripción de soporte y su disponibilidad y crea el ticket.
+
+    Args:
+        data: soporte_suscripcion_id, empresa_id, titulo, descripcion?, prioridad?
+        usuario_id: Creador (BD web si es admin, BD SaaS si es API externa)
+        es_api_externa: True si la petición viene de una instancia SaaS (solo para logs)
+
+    Returns:
+        SoporteTicket
+
+    Raises:
+        TicketServiceError: Datos inválidos, suscripción no activa o sin disponibilidad
+    """
+    AppLogger.info(
+        LogCategory.SOPORTE,
+        "Crear ticket - Inicio",
+        usuario_id=usuario_id,
+        es_api_externa=es_api_externa,
+        empresa_id=data.get('empresa_id'),
+        suscripcion_id=data.get('soporte_suscripcion_id')
+    )
+    
+    # Validaciones
+    if not data.get('soporte_suscripcion_id'):
+        raise TicketServiceError(400, 'soporte_suscripcion_id es obligatorio')
+    if not data.get('empresa_id'):
+        raise TicketServiceError(400, 'empresa_id es obligatorio')
+    if not data.get('titulo'):
+        raise TicketServiceError(400, 'titulo es obligatorio')
+    
+    # Validar prioridad
+    prioridad = data.get('prioridad', 'media')
+    if prioridad not in ['baja', 'media', 'alta', 'critica']:
+        raise TicketServiceError(400, 'Prioridad inválida')
+    
+    # Verificar que existe la suscripción de soporte
+    suscripcion = SoporteSuscripcion.query.get(data['soporte_suscripcion_id'])
+    if not suscripcion:
+        AppLogger.warning(
+            LogCategory.SOPORTE, 
+            "Suscripción de soporte no encontrada", 
+            suscripcion_id=data['soporte_suscripcion_id']
+        )
+        raise TicketServiceError(404, 'Suscripción de soporte no encontrada')
+    
+    # Verificar que la suscripción esté activa
+    if suscripcion.estado != 'activo':
+        AppLogger.warning(
+            LogCategory.SOPORTE,
+            "Suscripción de soporte no activa",
+            suscripcion_id=suscripcion.id,
+            estado=suscripcion.estado
+        )
+        raise TicketServiceError(400, 'La suscripción de soporte no está activa')
+    
+    # Verificar que la empresa coincida
+    if suscripcion.empresa_id != int(data['empresa_id']):
+        AppLogger.warning(
+            LogCategory.SOPORTE,
+            "Suscripción no pertenece a la empresa",
+            suscripcion_empresa_id=suscripcion.empresa_id,
+            empresa_id=data['empresa_id']
+        )
+        raise TicketServiceError(400, 'La suscripción no pertenece a la empresa seleccionada')
+    
+    # VALIDAR DISPONIBILIDAD DE SOPORTE
+    disponibilidad = calcular_disponibilidad_soporte(suscripcion)
+    
+    if not disponibilidad['tiene_disponible']:
+        AppLogger.warning(
+            LogCategory.SOPORTE,
+            "Sin disponibilidad de soporte",
+            suscripcion_id=suscripcion.id,
+            modalidad=disponibilidad['modalidad'],
+            consumido=disponibilidad['consumido'],
+            maximo=disponibilidad['maximo']
+        )
+        raise TicketServiceError(400, disponibilidad['mensaje'], datos={'disponibilidad': disponibilidad})
+    
+    nuevo_ticket = SoporteTicket(
+        soporte_suscripcion_id=data['soporte_suscripcion_id'],
+        empresa_id=int(data['empresa_id']),
+        titulo=data['titulo'],
+        descripcion=data.get('descripcion'),
+        prioridad=prioridad,
+        estado='abierto',
+        usuario_creador_id=usuario_id,  # ID del usuario (BD web si es admin, BD SaaS si es API externa)
+        extra_data=None  # Los archivos se asocian a comentarios, no al ticket directamente
+    )
+    
+    db.session.add(nuevo_ticket)
+    db.session.commit()
+    
+    AppLogger.info(
+        LogCategory.SOPORTE,
+        "Ticket creado exitosamente",
+        ticket_id=nuevo_ticket.id,
+        empresa_id=nuevo_ticket.empresa_id,
+        suscripcion_id=nuevo_ticket.soporte_suscripcion_id,
+        titulo=nuevo_ticket.titulo,
+        prioridad=nuevo_ticket.prioridad,
+        creado_por=usuario_id,
+        es_api_externa=es_api_externa
+    )
+    return nuevo_ticket
+
+
+def detalle_ticket(ticket):
+    """Ticket serializado con sus comentarios."""
+    return ticket.to_dict(include_comentarios=True)
+
+
+def datos_comentario_request(req):
+    """
+    Extrae los datos de un comentario del request (JSON o FormData).
+
+    Returns:
+        dict: comentario, usuario_id, archivos (metadata JSON) y files (FileStorage)
+    """
+    if req.content_type and 'multipart/form-data' in req.content_type:
+        return {
+            'comentario': req.form.get('comentario'),
+            'usuario_id': req.form.get('usuario_id'),
+            'archivos': None,
+            'files': req.files.getlist('files') if 'files' in req.files else [],
+        }
+    data = req.get_json(silent=True) or {}
+    return {
+        'comentario': data.get('comentario'),
+        'usuario_id': data.get('usuario_id'),
+        'archivos': data.get('archivos'),
+        'files': [],
+    }
+
+
+def _guardar_archivo(ticket_id, file):
+    """
+    Valida y guarda un archivo adjunto en el directorio del ticket.
+
+    Returns:
+        dict: Información del archivo (incluye nombre_original)
+
+    Raises:
+        TicketServiceError: Tipo o tamaño no permitido
+    """
+    if not allowed_file(file.filename):
+        raise TicketServiceError(400, f'{file.filename}: Tipo de archivo no permitido')
+    
+    # Leer contenido para validar tamaño
+    file.seek(0, os.SEEK_END)
+    file_size = file.tell()
+    file.seek(0)
+    
+    is_valid, error_msg = validate_file_size(file_size)
+    if not is_valid:
+        raise TicketServiceError(400, f'{file.filename}: {error_msg}')
+    
+    # Generar nombre único y guardar
+    upload_path = get_upload_path(ticket_id)
+    unique_filename = generate_unique_filename(file.filename)
+    filepath = os.path.join(upload_path, unique_filename)
+    
+    file.save(filepath)
+    
+    file_info = get_file_info(unique_filename, filepath)
+    file_info['nombre_original'] = file.filename
+    return file_info
+
+
+def crear_comentario(ticket, *, comentario, usuario_id, es_admin, archivos=None, files=None):
+    """
+    Agrega un comentario al ticket (con archivos opcionales) y lo pasa a
+    pendiente_respuesta si estaba abierto o en proceso.
+
+    Args:
+        ticket: SoporteTicket
+        comentario: Texto del comentario
+        usuario_id: Usuario que comenta (admin o usuario de la instancia SaaS)
+        es_admin: True para comentarios del panel admin
+        archivos: Metadata de archivos ya subidos (JSON)
+        files: Archivos (FileStorage) a guardar con el comentario
+
+    Returns:
+        SoporteTicketComentario
+
+    Raises:
+        TicketServiceError: Comentario vacío o archivo inválido
+    """
+    if not comentario:
+        raise TicketServiceError(400, 'El comentario es obligatorio')
+    
+    archivos_metadata = []
+    for file in files or []:
+        if file.filename == '':
+            continue
+        try:
+            file_info = _guardar_archivo(ticket.id, file)
+        except TicketServiceError:
+            raise
+        except Exception as e:
+            AppLogger.error(LogCategory.SOPORTE, f"Error al guardar archivo {file.filename}", exc=e)
+            raise TicketServiceError(500, f'Error al guardar archivo: {str(e)}')
+        archivos_metadata.append(file_info)
+        AppLogger.info(
+            LogCategory.SOPORTE,
+            f"Archivo subido para comentario en ticket {ticket.id}",
+            filename=file.filename,
+            size_mb=file_info['tamano_mb']
+        )
+    
+    nuevo_comentario = SoporteTicketComentario(
+        ticket_id=ticket.id,
+        es_admin=es_admin,
+        admin_id=usuario_id if es_admin else None,
+        usuario_id=usuario_id,
+        comentario=comentario,
+        archivos=archivos_metadata or archivos or None,
+        fecha_creacion=get_local_now()  # Usar zona horaria local
+    )
+    db.session.add(nuevo_comentario)
+    
+    # Cambiar estado a pendiente_respuesta si estaba abierto o en_proceso
+    if ticket.estado in ['abierto', 'en_proceso']:
+        ticket.estado = 'pendiente_respuesta'
+    
+    db.session.commit()
+    return nuevo_comentario
+
+
+def subir_archivos_ticket(ticket, files, comentario_id=None):
+    """
+    Guarda archivos adjuntos en el ticket o en uno de sus comentarios.
+    Los archivos inválidos se reportan en errores sin abortar la carga.
+
+    Returns:
+        tuple[list, list]: (archivos_subidos, errores)
+
+    Raises:
+        TicketServiceError: Comentario inexistente, sin archivos o demasiados archivos
+    """
+    comentario = None
+    if comentario_id:
+        comentario = SoporteTicketComentario.query.filter_by(
+            id=int(comentario_id),
+            ticket_id=ticket.id
+        ).first()
+        if not comentario:
+            raise TicketServiceError(404, 'Comentario no encontrado')
+        
+        AppLogger.info(
+            LogCategory.SOPORTE,
+            'Subiendo archivos para comentario específico',
+            ticket_id=ticket.id,
+            comentario_id=comentario_id
+        )
+    
+    if not files:
+        raise TicketServiceError(400, 'No se enviaron archivos')
+    if all(f.filename == '' for f in files):
+        raise TicketServiceError(400, 'No se seleccionaron archivos')
+    if len(files) > MAX_ARCHIVOS_POR_CARGA:
+        raise TicketServiceError(400, f'Máximo {MAX_ARCHIVOS_POR_CARGA} archivos por carga')
+    
+    # Determinar dónde guardar los archivos
+    if comentario:
+        destino = list(comentario.archivos or [])
+    else:
+        extra_data = dict(ticket.extra_data or {})
+        destino = list(extra_data.get('archivos') or [])
+    
+    archivos_subidos = []
+    errores = []
+    
+    for file in files:
+        if file.filename == '':
+            continue
+        try:
+            file_info = _guardar_archivo(ticket.id, file)
+        except TicketServiceError as e:
+            errores.append(e.message)
+            continue
+        except Exception as e:
+            errores.append(f'{file.filename}: Error al guardar - {str(e)}')
+            continue
+        
+        destino.append(file_info)
+        archivos_subidos.append(file_info)
+        AppLogger.info(
+            LogCategory.SOPORTE,
+            f"Archivo subido para {'comentario ' + str(comentario_id) + ' en ' if comentario else ''}ticket {ticket.id}",
+            filename=file.filename,
+            size_mb=file_info['tamano_mb']
+        )
+    
+    if archivos_subidos:
+        if comentario:
+            comentario.archivos = destino
+        else:
+            extra_data['archivos'] = destino
+            ticket.extra_data = extra_data
+        db.session.commit()
+    
+    return archivos_subidos, errores
+
+
+def buscar_archivo_ticket(ticket, filename):
+    """
+    Localiza un archivo adjunto del ticket o de sus comentarios.
+
+    Returns:
+        tuple[str, str]: (ruta física, nombre original)
+
+    Raises:
+        TicketServiceError: Si el archivo no está registrado o no existe en disco
+    """
+    archivo_encontrado = None
+    
+    # Buscar primero en archivos del ticket (extra_data)
+    if ticket.extra_data and 'archivos' in ticket.extra_data:
+        for archivo in ticket.extra_data['archivos']:
+            if archivo.get('nombre') == filename:
+                archivo_encontrado = archivo
+                break
+    
+    # Si no se encontró, buscar en archivos de comentarios
+    if not archivo_encontrado:
+        for comentario in ticket.comentarios:
+            for archivo in comentario.archivos or []:
+                if archivo.get('nombre') == filename:
+                    archivo_encontrado = archivo
+                    break
+            if archivo_encontrado:
+                break
+    
+    if not archivo_encontrado:
+        raise TicketServiceError(404, 'Archivo no encontrado')
+    
+    filepath = os.path.join(get_upload_path(ticket.id), filename)
+    if not os.path.exists(filepath):
+        raise TicketServiceError(404, 'El archivo físico no existe en el servidor')
+    
+    return filepath, archivo_encontrado.get('nombre_original', filename)
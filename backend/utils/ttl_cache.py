@@ -0,0 +1,184 @@
+"""
+Caché en memoria acotado (LRU) con expiración por TTL y estadísticas.
+
+Pensado para los cachés por worker de la aplicación (ubicaciones, estadísticas
+de tickets, verificación de API keys): el tamaño nunca supera max_size (se
+desaloja la entrada menos usada), las entradas vencidas se eliminan al leerlas
+y además en barridos periódicos de un hilo compartido, y cada caché lleva
+contadores de aciertos/fallos/desalojos consultables en /admin/cache/stats.
+"""
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Intervalo por defecto entre barridos de entradas vencidas (segundos)
+SWEEP_INTERVAL = 60
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché LRU con TTL por entrada, seguro entre hilos.
+
+    Cada entrada: clave -> (expira_en, valor), con expira_en en time.monotonic().
+    """
+
+    def __init__(self, name: str, *, max_size: int, ttl: float, register: bool = True) -> None:
+        """
+        Args:
+            name: Nombre para las estadísticas (debe ser único por proceso)
+            max_size: Máximo de entradas; 0 deshabilita el caché
+            ttl: Tiempo de vida por defecto en segundos; 0 deshabilita el caché
+            register: Incluir en los barridos periódicos y en all_cache_stats()
+        """
+        self.name = name
+        self._max_size = max(0, int(max_size))
+        self._ttl = max(0.0, float(ttl))
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        if register:
+            _register(self)
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0 and self._max_size > 0
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna el valor si existe y no ha expirado (y lo marca como recién usado)."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._misses += 1
+                return default
+            expira_en, value = entry
+            if expira_en <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Guarda el valor, desalojando las entradas menos usadas si se supera max_size."""
+        ttl = self._ttl if ttl is None else float(ttl)
+        if not self.enabled or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        _ensure_sweeper()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def remove_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Elimina las entradas cuyo (clave, valor) cumple el predicado. Retorna cuántas."""
+        with self._lock:
+            claves = [k for k, (_, v) in self._entries.items() if predicate(k, v)]
+            for k in claves:
+                del self._entries[k]
+            return len(claves)
+
+    def sweep(self) -> int:
+        """Elimina las entradas vencidas. Retorna cuántas se eliminaron."""
+        ahora = time.monotonic()
+        with self._lock:
+            vencidas = [k for k, (expira_en, _) in self._entries.items() if expira_en <= ahora]
+            for k in vencidas:
+                del self._entries[k]
+            self._expirations += len(vencidas)
+            return len(vencidas)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del caché en este worker."""
+        with self._lock:
+            consultas = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "ttl": self._ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / consultas, 4) if consultas else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+
+# Registro de cachés del proceso (referencias débiles) y hilo de barrido compartido
+_caches: "weakref.WeakValueDictionary[str, TTLCache]" = weakref.WeakValueDictionary()
+_registry_lock = threading.Lock()
+_sweeper_pid: Optional[int] = None
+_sweep_interval = SWEEP_INTERVAL
+
+
+def _register(cache: TTLCache) -> None:
+    with _registry_lock:
+        _caches[cache.name] = cache
+
+
+def _sweep_loop() -> None:
+    while True:
+        time.sleep(_sweep_interval)
+        for cache in list(_caches.values()):
+            try:
+                cache.sweep()
+            except Exception:
+                pass
+
+
+def _ensure_sweeper() -> None:
+    """Inicia el hilo de barrido una vez por proceso (los workers de gunicorn son forks)."""
+    global _sweeper_pid
+    pid = os.getpid()
+    if _sweeper_pid == pid:
+        return
+    with _registry_lock:
+        if _sweeper_pid == pid:
+            return
+        threading.Thread(target=_sweep_loop, name="ttl-cache-sweeper", daemon=True).start()
+        _sweeper_pid = pid
+
+
+def configure_sweep_interval(seconds: float) -> None:
+    """Ajusta el intervalo entre barridos (se aplica desde el siguiente ciclo)."""
+    global _sweep_interval
+    _sweep_interval = max(1.0, float(seconds))
+
+
+def all_cache_stats() -> List[Dict[str, Any]]:
+    """Estadísticas de todos los cachés registrados en este worker."""
+    with _registry_lock:
+        caches = list(_caches.values())
+    return [c.stats() for c in sorted(caches, key=lambda c: c.name)]
@@ -3,6 +3,8 @@ import { CommonModule } from '@angular/common';
 import { FormBuilder, FormGroup, ReactiveFormsModule, Validators, FormsModule } from '@angular/forms';
 import { toDataURL } from 'qrcode';
 import Swal from 'sweetalert2';
+import { Subject, Subscription, of } from 'rxjs';
+import { catchError, debounceTime, distinctUntilChanged, finalize, switchMap } from 'rxjs/operators';
 import {
   ApiService,
   UsuarioPerfil,
@@ -135,13 +137,12 @@ type SectionKey = 'personal' | 'seguridad' | 'suscripciones' | 'futuro';
                   </label>
                   <label class="city-field">
                     <span>Ciudad</span>
-                    <select *ngIf="ciudades.length > 0" formControlName="ciudad">
-                      <option value="">Selecciona una ciudad</option>
-                      <option *ngFor="let ciudad of ciudades" [value]="ciudad.name">{{ ciudad.name }}</option>
-                    </select>
-                    <input *ngIf="ciudades.length === 0 && paisSeleccionado" type="text" formControlName="ciudad" placeholder="Escribe tu ciudad" />
+                    <input *ngIf="paisSeleccionado" type="text" formControlName="ciudad" placeholder="Escribe tu ciudad" list="ciudades-sugeridas" autocomplete="off" (input)="onCiudadInput($any($event.target).value)" />
+                    <datalist id="ciudades-sugeridas">
+                      <option *ngFor="let ciudad of ciudades" [value]="ciudad.name">{{ ciudad.state || '' }}</option>
+                    </datalist>
                     <input *ngIf="!paisSeleccionado" type="text" formControlName="ciudad" placeholder="Primero selecciona un país" [disabled]="true" />
-                    <small class="helper-text" *ngIf="cargandoCiudades">Cargando ciudades…</small>
+                    <small class="helper-text" *ngIf="cargandoCiudades">Buscando ciudades…</small>
                   </label>
                   <label class="full-row">
                     <span>Dirección</span>
@@ -1629,6 +1630,9 @@ export class AccountComponent implements OnInit, OnDestroy {
   paisSeleccionado: string = '';
   cargandoPaises = false;
   cargandoCiudades = false;
+  readonly minBusquedaCiudad = 2;
+  private busquedaCiudad$ = new Subject<{ q: string; pais: string }>();
+  private busquedaCiudadSub?: Subscription;
 
   readonly sectionMeta: Record<SectionKey, { title: string; description: string }> = {
     personal: {
@@ -1699,10 +1703,11 @@ export class AccountComponent implements OnInit, OnDestroy {
     });
 
     this.bootstrapFromSession();
+    this.iniciarBusquedaCiudades();
   }
 
   ngOnDestroy(): void {
-    // Cleanup si es necesario
+    this.busquedaCiudadSub?.unsubscribe();
   }
 
   get isAdmin(): boolean {
@@ -1803,7 +1808,6 @@ export class AccountComponent implements OnInit, OnDestroy {
           const pais = this.paises.find(p => p.name === paisActual);
           if (pais) {
             this.paisSeleccionado = pais.code;
-            this.cargarCiudades(pais.code);
           }
         }
       },
@@ -1828,36 +1832,39 @@ export class AccountComponent implements OnInit, OnDestroy {
     const pais = this.paises.find(p => p.code === this.paisSeleccionado);
     if (pais) {
       this.profileForm.patchValue({ pais: pais.name });
-      this.cargarCiudades(this.paisSeleccionado);
     }
   }
 
-  cargarCiudades(countryCode: string): void {
-    if (!countryCode) {
-      this.ciudades = [];
-      return;
-    }
-
-    this.cargandoCiudades = true;
-    this.api.obtenerCiudades(countryCode).subscribe({
-      next: (response: any) => {
-        this.ciudades = response.cities || [];
-        this.cargandoCiudades = false;
-        
-        // Si hay una ciudad en el formulario, mantenerla seleccionada
-        const ciudadActual = this.profileForm.value.ciudad;
-        if (ciudadActual && this.ciudades.some(c => c.name === ciudadActual)) {
-          this.profileForm.patchValue({ ciudad: ciudadActual });
+  /**
+   * Autocompletado de ciudades: busca en el servidor mientras se escribe
+   * (con espera y longitud mínima) en lugar de descargar todas las del país.
+   */
+  private iniciarBusquedaCiudades(): void {
+    this.busquedaCiudadSub = this.busquedaCiudad$.pipe(
+      debounceTime(300),
+      distinctUntilChanged((a, b) => a.q === b.q && a.pais === b.pais),
+      switchMap(({ q, pais }) => {
+        if (q.length < this.minBusquedaCiudad) {
+          return of({ cities: [] });
         }
-      },
-      error: (error: any) => {
-        console.error('Error al cargar ciudades:', error);
-        this.cargandoCiudades = false;
-        this.ciudades = [];
-      }
+        this.cargandoCiudades = true;
+        return this.api.buscarCiudades(q, pais).pipe(
+          catchError((error: any) => {
+            console.error('Error al buscar ciudades:', error);
+            return of({ cities: [] });
+          }),
+          finalize(() => { this.cargandoCiudades = false; })
+        );
+      })
+    ).subscribe((response: any) => {
+      this.ciudades = response.cities || [];
     });
   }
 
+  onCiudadInput(valor: string): void {
+    this.busquedaCiudad$.next({ q: (valor || '').trim(), pais: this.paisSeleccionado });
+  }
+
   private patchProfileForm(usuario: UsuarioPerfil): void {
     this.profileForm.patchValue({
       nombre: usuario.nombre || '',
@@ -1868,14 +1875,11 @@ export class AccountComponent implements OnInit, OnDestroy {
       fecha_nacimiento: usuario.fecha_nacimiento ? usuario.fecha_nacimiento.substring(0, 10) : ''
     });
     
-    // Si hay un país guardado, seleccionarlo y cargar ciudades
+    // Si hay un país guardado, seleccionarlo (las ciudades se buscan al escribir)
     if (usuario.pais) {
       const pais = this.paises.find(p => p.name === usuario.pais);
       if (pais) {
         this.paisSeleccionado = pais.code;
-        if (this.paises.length > 0) {
-          this.cargarCiudades(pais.code);
-        }
       }
     }
   }
@@ -1,4 +1,4 @@
-import { Component, OnInit } from '@angular/core';
+import { Component, OnInit, OnDestroy } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { RouterLink, RouterLinkActive } from '@angular/router';
@@ -6,6 +6,8 @@ import { AdminUsuariosService, Usuario, CrearUsuarioDto, ActualizarUsuarioDto }
 import { AdminEmpresasService, Empresa } from '../../../services/admin-empresas.service';
 import { ApiService } from '../../../services/api.service';
 import Swal from 'sweetalert2';
+import { Subject, Subscription, of } from 'rxjs';
+import { catchError, debounceTime, distinctUntilChanged, finalize, switchMap } from 'rxjs/operators';
 
 @Component({
   selector: 'app-admin-usuarios',
@@ -14,7 +16,7 @@ import Swal from 'sweetalert2';
   templateUrl: './admin-usuarios.component.html',
   styleUrl: './admin-usuarios.component.css'
 })
-export class AdminUsuariosComponent implements OnInit {
+export class AdminUsuariosComponent implements OnInit, OnDestroy {
   usuarios: Usuario[] = [];
   empresas: Empresa[] = [];
   cargando = false;
@@ -68,6 +70,9 @@ export class AdminUsuariosComponent implements OnInit {
   cargandoPaises = false;
   cargandoCiudades = false;
   busquedaPais = '';
+  readonly minBusquedaCiudad = 2;
+  private busquedaCiudad$ = new Subject<{ q: string; pais: string }>();
+  private busquedaCiudadSub?: Subscription;
 
   constructor(
     private adminUsuariosService: AdminUsuariosService,
@@ -78,6 +83,7 @@ export class AdminUsuariosComponent implements OnInit {
   ngOnInit(): void {
     this.cargarUsuarios();
     this.cargarEmpresas();
+    this.iniciarBusquedaCiudades();
     this.cargarPaises();
   }
 
@@ -214,12 +220,12 @@ export class AdminUsuariosComponent implements OnInit {
       pais: usuario.pais
     };
     
-    // Si el usuario tiene un país, buscar su código y cargar ciudades
+    // Si el usuario tiene un país, seleccionarlo (las ciudades se buscan al escribir)
+    this.ciudades = [];
     if (usuario.pais) {
       const paisEncontrado = this.paises.find(p => p.name === usuario.pais);
       if (paisEncontrado) {
         this.paisSeleccionado = paisEncontrado.code;
-        this.cargarCiudades(paisEncontrado.code);
       }
     }
     
@@ -1111,27 +1117,40 @@ export class AdminUsuariosComponent implements OnInit {
     const pais = this.paises.find(p => p.code === this.paisSeleccionado);
     if (pais) {
       this.formularioUsuario.pais = pais.name;
-      this.cargarCiudades(this.paisSeleccionado);
     }
   }
 
-  cargarCiudades(countryCode: string): void {
-    this.cargandoCiudades = true;
-    this.apiService.obtenerCiudades(countryCode).subscribe({
-      next: (response: any) => {
-        this.ciudades = response.cities || [];
-        this.cargandoCiudades = false;
-      },
-      error: (error: any) => {
-        console.error('Error al cargar ciudades:', error);
-        this.cargandoCiudades = false;
-        Swal.fire('Aviso', 'No se pudieron cargar las ciudades. Puedes escribirla manualmente.', 'info');
-      }
+  /**
+   * Autocompletado de ciudades: busca en el servidor mientras se escribe
+   * (con espera y longitud mínima) en lugar de descargar todas las del país.
+   */
+  private iniciarBusquedaCiudades(): void {
+    this.busquedaCiudadSub = this.busquedaCiudad$.pipe(
+      debounceTime(300),
+      distinctUntilChanged((a, b) => a.q === b.q && a.pais === b.pais),
+      switchMap(({ q, pais }) => {
+        if (q.length < this.minBusquedaCiudad) {
+          return of({ cities: [] });
+        }
+        this.cargandoCiudades = true;
+        return this.apiService.buscarCiudades(q, pais).pipe(
+          catchError((error: any) => {
+            console.error('Error al buscar ciudades:', error);
+            return of({ cities: [] });
+          }),
+          finalize(() => { this.cargandoCiudades = false; })
+        );
+      })
+    ).subscribe((response: any) => {
+      this.ciudades = response.cities || [];
     });
   }
 
-  onCiudadChange(event: Event): void {
-    const select = event.target as HTMLSelectElement;
-    this.formularioUsuario.ciudad = select.value;
+  onCiudadInput(valor: string): void {
+    this.busquedaCiudad$.next({ q: (valor || '').trim(), pais: this.paisSeleccionado });
+  }
+
+  ngOnDestroy(): void {
+    this.busquedaCiudadSub?.unsubscribe();
   }
 }
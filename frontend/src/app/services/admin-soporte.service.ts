@@ -476,7 +476,9 @@ export class AdminSoporteService {
   // ============ ESTADÍSTICAS ============
 
   obtenerEstadisticasTickets(): Observable<EstadisticasSoporte> {
-    return this.http.get<EstadisticasSoporte>(`${this.apiUrl}/admin/soporte-tickets/estadisticas`);
+    // cache=true: el backend reutiliza el resultado reciente (el dashboard consulta con frecuencia)
+    const params = new HttpParams().set('cache', 'true');
+    return this.http.get<EstadisticasSoporte>(`${this.apiUrl}/admin/soporte-tickets/estadisticas`, { params });
   }
 
   // ============ USUARIOS ============
@@ -287,6 +287,20 @@ export class ApiService {
     );
   }
 
+  buscarCiudades(query: string, countryCode?: string, limit = 20) {
+    const params: Record<string, string> = { q: query };
+    if (countryCode) {
+      params['country'] = countryCode;
+    }
+    if (limit) {
+      params['limit'] = String(limit);
+    }
+    return this.http.get<{ cities: Array<{ name: string; state?: string; country_code: string }> }>(
+      this.buildUrl('/public/location/cities/search'),
+      { params }
+    );
+  }
+
   /**
    * Obtiene las suscripciones (con plan) de la empresa del usuario autenticado
    */